@@ -0,0 +1,116 @@
+import logging
+from typing import TYPE_CHECKING
+
+from discord import Embed, Interaction, app_commands
+from discord.ext import commands
+
+from functions.tool._audio_engine import get_audio_engine
+from functions.tool._cache import get_stream_url_cache, get_suggestion_cache
+from functions.tool._http import get_http_client
+from functions.tool._track_cache import get_track_cache
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+logger = logging.getLogger(__name__)
+
+
+def format_stats(stats: dict) -> str:
+    """Render a stats dict on one line, e.g. `hits=3 avg_ms=12.5 queued={high=0 low=2}`."""
+    parts = []
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            value = f"{{{format_stats(value)}}}" if value else "-"
+        elif isinstance(value, float):
+            value = f"{value:.1f}"
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+
+def _timing(summary: dict) -> dict:
+    """A latency summary without its histogram buckets, which do not fit an embed field."""
+    return {key: value for key, value in summary.items() if key != "buckets"}
+
+
+async def is_bot_owner(interaction: Interaction) -> bool:
+    """App command check for the bot's owner, as the stats cover every guild the bot is in."""
+    return await interaction.client.is_owner(interaction.user)
+
+
+class StatsCog(commands.Cog):
+    """Cog for the runtime metrics of playback, extraction, caches and HTTP, for the bot owner."""
+    def __init__(self, bot: "Sakamoto"):
+        self.bot = bot
+
+    @app_commands.command(
+        name="stats",
+        description="Show playback, cache and HTTP metrics."
+    )
+    @app_commands.check(is_bot_owner)
+    async def stats(self, interaction: Interaction) -> None:
+        await interaction.response.send_message(embed=self.create_embed(interaction.guild_id), ephemeral=True)
+
+    @stats.error
+    async def on_stats_error(self, interaction: Interaction, error: app_commands.AppCommandError) -> None:
+        if isinstance(error, app_commands.errors.CheckFailure):
+            await interaction.response.send_message(
+                ":x: Only the bot owner can view the bot's stats.",
+                ephemeral=True
+            )
+        else:
+            logger.error("Unexpected error in stats command: %s", error)
+
+    def create_embed(self, guild_id: int | None) -> Embed:
+        embed = Embed(title=":bar_chart: Runtime Stats", color=self.bot.color)
+        for name, value in self.fields(guild_id):
+            embed.add_field(name=name, value=value[:1024] or "-", inline=False)
+        return embed
+
+    def fields(self, guild_id: int | None) -> list[tuple[str, str]]:
+        engine = get_audio_engine(self.bot)
+        state = engine.state_stats()
+        connections = engine.connection_stats()
+        track_cache = get_track_cache(self.bot)
+        pools = getattr(self.bot, "_extractor_pools", None) or {}
+        autocomplete = {
+            name: cog.autocomplete.stats()
+            for name in ("MusicCog", "RadioCog")
+            if (cog := self.bot.get_cog(name)) is not None and hasattr(cog, "autocomplete")
+        }
+        hosts = sorted(get_http_client(self.bot).stats().items(), key=lambda item: -item[1]["requests"])[:5]
+        return [
+            (
+                "Playback",
+                f"{format_stats({'states': state['states'], 'pending_events': state['pending_events']})}\n"
+                f"event lag {format_stats(state['event_lag'])}\n"
+                f"recoveries {format_stats(engine.recoveries)}\n"
+                f"transition gap here {format_stats(engine.transition_gap_stats(guild_id))}",
+            ),
+            (
+                "Voice",
+                f"{format_stats({k: v for k, v in connections.items() if k != 'latency'})}\n"
+                + "\n".join(
+                    f"{kind} connect {format_stats(_timing(summary))}"
+                    for kind, summary in connections["latency"].items()
+                ),
+            ),
+            (
+                "Extraction",
+                f"scheduler {format_stats(engine.extractor.stats())}\n"
+                + "\n".join(f"{name} pool {format_stats(pool.stats())}" for name, pool in pools.items()),
+            ),
+            ("Autocomplete", "\n".join(f"{name} {format_stats(stats)}" for name, stats in autocomplete.items())),
+            (
+                "Caches",
+                f"suggestions {format_stats(get_suggestion_cache(self.bot).stats())}\n"
+                f"stream URLs {format_stats(get_stream_url_cache(self.bot).stats())}\n"
+                f"tracks {format_stats({'hits': track_cache.hits, 'misses': track_cache.misses})}\n"
+                f"loudness {format_stats(engine.loudness.stats())}",
+            ),
+            ("HTTP", "\n".join(f"{host} {format_stats(_timing(stats))}" for host, stats in hosts)),
+        ]
+
+
+async def setup(bot: "Sakamoto"):
+    """Add the StatsCog to the bot."""
+    await bot.add_cog(StatsCog(bot))
@@ -1,18 +1,116 @@
 import logging
-from asyncio import run_coroutine_threadsafe
+from asyncio import (
+    AbstractEventLoop,
+    CancelledError,
+    Queue,
+    Task,
+    TimerHandle,
+    create_task,
+    get_running_loop,
+    sleep,
+)
 from collections import deque
 from collections.abc import Awaitable, Callable
-from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from dataclasses import dataclass, field, replace
+from os import environ
+from time import perf_counter, time
+from typing import TYPE_CHECKING, NamedTuple
+from urllib.parse import urlparse
 
-from discord import FFmpegPCMAudio, Interaction, Member, VoiceChannel, VoiceClient, VoiceState
+from discord import AudioSource, FFmpegOpusAudio, FFmpegPCMAudio, Interaction, Member, VoiceChannel, VoiceClient, VoiceState
+
+from ._audio_sources import BufferedAudio
+from ._broadcast import BroadcastHub
+from ._extraction_scheduler import ExtractionScheduler
+from ._loudness import get_loudness_cache
+from ._music_settings import get_music_settings
+from ._session_store import Checkpoint, SavedTrack, get_session_store
+from ._playback_state import TRANSITIONS, Histogram, PlaybackEvent, PlaybackState, Timing
+from ._track_cache import get_track_cache, stream_expiry
+from ._track_queue import TrackQueue
 
 if TYPE_CHECKING:
     from main import Sakamoto
 
 logger = logging.getLogger(__name__)
 
-StreamResolver = Callable[[str], Awaitable[str | None]]
+
+
+class ResolvedStream(NamedTuple):
+    url: str | None
+    # Codec of the stream at `url`; a refreshed URL may serve a different format than the one it replaces.
+    acodec: str | None = None
+
+
+StreamResolver = Callable[[str], Awaitable[ResolvedStream | None]]
+
+# Signed stream URLs are re-resolved when they expire within this many seconds.
+STREAM_REFRESH_MARGIN = 60.0
+# Prefetched URLs without an embedded expiry are only trusted for this long.
+UNSIGNED_STREAM_TTL = 1800.0
+# yt-dlp `acodec` values that can be sent to Discord without decoding to PCM.
+PASSTHROUGH_CODECS = {"opus"}
+YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com", "youtu.be"}
+FFMPEG_PROFILES: dict[str, dict[str, str]] = {
+    # googlevideo DASH audio is a single well-formed stream, so a tiny probe is enough.
+    "youtube": {
+        "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_on_network_error 1 -reconnect_delay_max 5 "
+        "-probesize 128k -analyzeduration 500k",
+        "options": "-vn",
+    },
+    # Radio streams are MP3/AAC over ICY and should never end, so reconnect at EOF as well.
+    "live": {
+        "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_at_eof 1 -reconnect_delay_max 10 "
+        "-probesize 64k -analyzeduration 1M",
+        "options": "-vn",
+    },
+    "generic": {
+        "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -analyzeduration 10M -probesize 10M",
+        "options": "-vn",
+    },
+}
+# A finite track that stops more than this many seconds before its duration ended early, not naturally.
+EARLY_END_TOLERANCE = 5.0
+# Playback that lasted this long after a recovery counts as stable again, so the retry budget resets.
+RECOVERY_STABLE_AFTER = 30.0
+
+
+def stream_url_is_stale(stream_url: str | None, resolved_at: float | None = None) -> bool:
+    if not stream_url:
+        return True
+    if (expires_at := stream_expiry(stream_url)) is not None:
+        return expires_at - time() <= STREAM_REFRESH_MARGIN
+    return resolved_at is not None and time() - resolved_at > UNSIGNED_STREAM_TTL
+
+
+def source_profile(source_url: str, duration: str) -> str:
+    """Pick the FFmpeg profile for a track from where it came from."""
+    if duration == "LIVE":
+        return "live"
+    if urlparse(source_url).netloc.lower() in YOUTUBE_HOSTS:
+        return "youtube"
+    return "generic"
+
+
+def parse_duration(duration: str) -> float | None:
+    """Convert a yt-dlp `duration_string` such as `1:02:03` to seconds; None for LIVE/unknown."""
+    try:
+        parts = [int(part) for part in duration.split(":")]
+    except (AttributeError, ValueError):
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return float(seconds)
+
+
+def format_duration(seconds: float | None) -> str:
+    """Inverse of `parse_duration` for flat playlist entries, which only carry seconds."""
+    if seconds is None:
+        return "N/A"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{secs:02}" if hours else f"{minutes}:{secs:02}"
 
 
 @dataclass
@@ -22,20 +120,155 @@ class QueueItem:
     duration: str
     stream_url: str | None = None
     refresh_stream: StreamResolver | None = None
+    resolved_at: float | None = None
+    acodec: str | None = None
+    # Seconds into the track to start from (seek, resume after restart).
+    start_at: float = 0.0
+
+    def needs_prefetch(self) -> bool:
+        if self.refresh_stream is None or self.duration == "LIVE":
+            return False
+        return stream_url_is_stale(self.stream_url, self.resolved_at)
+
+
+@dataclass(eq=False)
+class PlaybackSession:
+    """Playback state of one guild. Only the event loop mutates it; other threads go through `post`."""
+
+    guild_id: int
+    loop: AbstractEventLoop
+    events: Queue
+    state: PlaybackState = PlaybackState.IDLE
+    state_since: float = field(default_factory=perf_counter)
+    voice_client: VoiceClient | None = None
+    queue: TrackQueue[QueueItem] = field(default_factory=TrackQueue)
+    current: QueueItem | None = None
+    source: BufferedAudio | None = None
+    command_channel: object | None = None
+    prefetch_task: Task | None = None
+    prewarm_handle: TimerHandle | None = None
+    prewarm_task: Task | None = None
+    prewarmed: tuple[QueueItem, BufferedAudio] | None = None
+    track_ended_at: float | None = None
+    transition_gaps: deque[float] = field(default_factory=lambda: deque(maxlen=50))
+    # Set when the player is stopped on purpose (skip, seek), so the ended track is not treated as a failure.
+    stop_requested: bool = False
+    recovery_attempts: int = 0
+    recovering: bool = False
+    recovery_handle: TimerHandle | None = None
+    volume: float = 1.0
+    # Pending disconnect while the voice client idles with an empty queue.
+    idle_handle: TimerHandle | None = None
+    reconnect_task: Task | None = None
+    closed: bool = False
+
+    def elapsed(self) -> float:
+        return self.source.elapsed() if self.source is not None else 0.0
+
+    def post(self, event: PlaybackEvent, *args) -> None:
+        """Queue an event for the engine's dispatcher; safe to call from the voice player thread."""
+        if self.closed:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.events.put_nowait, (self, event, args, perf_counter()))
+        except RuntimeError:
+            # The loop was closed during shutdown.
+            pass
 
 
 class AudioEngine:
-    """Shared playback state and voice/queue helpers."""
+    """Shared voice/queue helpers over per-guild playback sessions owned by the event loop."""
 
     def __init__(self, bot: "Sakamoto"):
         self.bot = bot
-        self.voice_clients: dict[int, VoiceClient] = {}
-        self.queues: dict[int, deque[QueueItem]] = {}
-        self.currently_playing: dict[int, tuple[str, str, str]] = {}
-        self.command_channels: dict[int, object] = {}
-        self.ffmpeg_opts = {
-            "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -analyzeduration 10M -probesize 10M",
-            "options": "-vn",
+        self.sessions: dict[int, PlaybackSession] = {}
+        self.extractor = ExtractionScheduler()
+        self.settings = get_music_settings(bot)
+        self.loudness = get_loudness_cache(bot)
+        self.normalize = environ.get("AUDIO_NORMALIZE", "true").lower() in {"1", "true", "yes"}
+        self.checkpoints = get_session_store(bot)
+        self.checkpoints.snapshot = self._checkpoint
+        self.checkpoints.position = self._position
+        self.checkpoints.active = self._playing_guilds
+        # Stream resolvers by name, so checkpointed tracks can be re-resolved after a restart or reload.
+        self.resolvers: dict[str, StreamResolver] = {}
+        self.prewarm_enabled = environ.get("AUDIO_PREWARM", "false").lower() in {"1", "true", "yes"}
+        # Seconds before the current track ends at which the next track's FFmpeg process is started.
+        self.prewarm_lead = 15.0
+        self.ffmpeg_profiles = {name: dict(opts) for name, opts in FFMPEG_PROFILES.items()}
+        self.broadcasts = BroadcastHub(self._broadcast_source)
+        self._tasks: set[Task] = set()
+        self.events: Queue[tuple[PlaybackSession, PlaybackEvent, tuple, float]] = Queue()
+        self._dispatcher: Task | None = None
+        self._handlers: dict[PlaybackEvent, Callable[..., None]] = {
+            PlaybackEvent.FIRST_FRAME: self._on_first_frame,
+            PlaybackEvent.TRACK_ENDED: self._on_track_ended,
+        }
+        self.state_timings: dict[tuple[PlaybackState, PlaybackState], Timing] = {}
+        self.event_lag = Timing()
+        # Mid-stream failures are retried from the last position with exponential backoff.
+        self.max_recoveries = 3
+        self.recovery_backoff = 1.0
+        self.recoveries = {"attempts": 0, "recovered": 0, "dropped": 0}
+        # Seconds the voice client stays connected after the queue runs out, so the next /play skips the handshake.
+        self.idle_timeout = float(environ.get("AUDIO_IDLE_TIMEOUT", "60"))
+        # Seconds discord.py gets to restore a dropped voice connection on its own before the channel is rejoined.
+        self.reconnect_timeout = 10.0
+        self.connect_latency = {"cold": Histogram(), "reconnect": Histogram()}
+        self.connections = {"cold": 0, "warm": 0, "reconnected": 0, "lost": 0}
+
+    def session(self, guild_id: int) -> PlaybackSession:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = create_task(self._dispatch_events())
+        if (session := self.sessions.get(guild_id)) is None:
+            session = self.sessions[guild_id] = PlaybackSession(guild_id, get_running_loop(), self.events)
+        return session
+
+    def voice_client(self, guild_id: int) -> VoiceClient | None:
+        return session.voice_client if (session := self.sessions.get(guild_id)) is not None else None
+
+    def _spawn(self, coro) -> Task:
+        task = create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _dispatch_events(self):
+        """Single consumer of every guild's playback events, applied in the order they were posted."""
+        while True:
+            session, event, args, posted_at = await self.events.get()
+            self.event_lag.add(perf_counter() - posted_at)
+            if self.sessions.get(session.guild_id) is not session:
+                # The guild was cleaned up (and possibly reconnected) since the event was posted.
+                continue
+            try:
+                self._handlers[event](session, *args)
+            except Exception as e:
+                logger.error("Failed to handle %s in guild %s: %s", event.value, session.guild_id, e)
+
+    def _transition(self, session: PlaybackSession, state: PlaybackState) -> bool:
+        if state is session.state:
+            return True
+        if state not in TRANSITIONS[session.state]:
+            logger.debug("Ignoring %s -> %s in guild %s", session.state.value, state.value, session.guild_id)
+            return False
+        now = perf_counter()
+        if (timing := self.state_timings.get(edge := (session.state, state))) is None:
+            timing = self.state_timings[edge] = Timing()
+        timing.add(now - session.state_since)
+        session.state = state
+        session.state_since = now
+        return True
+
+    def state_stats(self) -> dict[str, object]:
+        states: dict[str, int] = {}
+        for session in self.sessions.values():
+            states[session.state.value] = states.get(session.state.value, 0) + 1
+        return {
+            "states": states,
+            "transitions": {f"{a.value}->{b.value}": timing.summary() for (a, b), timing in self.state_timings.items()},
+            "event_lag": self.event_lag.summary(),
+            "pending_events": self.events.qsize(),
         }
 
     async def enqueue_or_play(
@@ -50,46 +283,128 @@ class AudioEngine:
         now_playing_message: str | None = None,
         queue_message: str | None = None,
         refresh_stream: StreamResolver | None = None,
+        acodec: str | None = None,
     ) -> None:
-        vc = self.voice_clients.get(guild_id)
+        vc = self.voice_client(guild_id)
         if vc is None or not vc.is_connected():
             await followup(":x: The bot is not connected to a voice channel.", ephemeral=True)
             return
 
-        self.queues.setdefault(guild_id, deque())
-        if vc.is_playing() or vc.is_paused() or self.queues[guild_id]:
-            if len(self.queues[guild_id]) >= 25:
-                await followup(":x: Queue is full (25 items).", ephemeral=True)
+        session = self.sessions[guild_id]
+        if session.state is not PlaybackState.IDLE or session.queue:
+            if len(session.queue) >= (limit := self.settings.queue_limit(guild_id)):
+                await followup(f":x: Queue is full ({limit} items).", ephemeral=True)
                 return
             queued_stream_url = stream_url if duration == "LIVE" else None
-            self.queues[guild_id].append(
-                QueueItem(source_url, title, duration, queued_stream_url, refresh_stream)
-            )
+            session.queue.append(QueueItem(source_url, title, duration, queued_stream_url, refresh_stream, acodec=acodec))
+            self.queue_changed(guild_id)
             await followup(queue_message or f":ballot_box_with_check: Added to queue: **{title}** [{duration}]")
             return
 
-        started = await self.play_song(guild_id, source_url, stream_url, title, duration, refresh_stream)
+        started = await self.play_song(guild_id, source_url, stream_url, title, duration, refresh_stream, acodec)
         if started:
             await followup(now_playing_message or f":notes: Now playing: **{title}** [{duration}]")
         else:
             await followup(":x: Failed to start playback.", ephemeral=True)
 
+    def enqueue_many(self, guild_id: int, items: list[QueueItem]) -> int:
+        """Bulk-append to a guild's queue up to its limit; returns how many items were accepted."""
+        if (session := self.sessions.get(guild_id)) is None or session.closed:
+            return 0
+        accepted = items[: max(0, self.settings.queue_limit(guild_id) - len(session.queue))]
+        if accepted:
+            session.queue.extend(accepted)
+            self.queue_changed(guild_id)
+        return len(accepted)
+
+    def queue_changed(self, guild_id: int):
+        """Call after adding, removing or reordering queued tracks."""
+        self.schedule_prefetch(guild_id)
+        self.checkpoints.mark(guild_id)
+
+    def _checkpoint(self, guild_id: int) -> Checkpoint | None:
+        if (session := self.sessions.get(guild_id)) is None or (session.current is None and not session.queue):
+            return None
+        current = self._saved_track(session.current) if session.current is not None else None
+        return Checkpoint(guild_id, current, session.elapsed(), [self._saved_track(item) for item in session.queue])
+
+    def _position(self, guild_id: int) -> float | None:
+        if (session := self.sessions.get(guild_id)) is None or session.current is None:
+            return None
+        return session.elapsed()
+
+    def _playing_guilds(self) -> list[int]:
+        return [guild_id for guild_id, session in self.sessions.items() if session.state is PlaybackState.PLAYING]
+
+    def _saved_track(self, item: QueueItem) -> SavedTrack:
+        resolver = next((name for name, fn in self.resolvers.items() if fn == item.refresh_stream), None)
+        # Only live streams keep their URL; signed track URLs will have expired by the time they are restored.
+        stream_url = item.stream_url if item.duration == "LIVE" else None
+        return SavedTrack(item.source_url, item.title, item.duration, resolver, stream_url, item.acodec)
+
+    async def restore_session(self, guild_id: int) -> int:
+        """Put a checkpointed queue back in front of the guild's queue and start it; returns the tracks restored."""
+        if (checkpoint := await self.checkpoints.restore(guild_id)) is None:
+            return 0
+        saved = ([checkpoint.current] if checkpoint.current is not None else []) + checkpoint.queue
+        items = []
+        for track in saved:
+            resolver = self.resolvers.get(track.resolver) if track.resolver else None
+            if track.resolver and resolver is None:
+                continue
+            # The interrupted track resumes where it was checkpointed.
+            start_at = checkpoint.offset if track is checkpoint.current and track.duration != "LIVE" else 0.0
+            items.append(
+                QueueItem(
+                    track.source_url,
+                    track.title,
+                    track.duration,
+                    track.stream_url,
+                    resolver,
+                    acodec=track.acodec,
+                    start_at=start_at,
+                )
+            )
+        if not items:
+            return 0
+        session = self.session(guild_id)
+        session.queue.insert_many(0, items)
+        self.queue_changed(guild_id)
+        if session.state is PlaybackState.IDLE:
+            self.play_next(guild_id)
+        logger.info("Restored %s tracks in guild %s", len(items), guild_id)
+        return len(items)
+
     async def get_or_connect_voice_client(
         self, guild_id: int, user_voice_channel: VoiceChannel, interaction: Interaction
     ) -> VoiceClient | None:
-        vc = self.voice_clients.get(guild_id)
+        vc = self.voice_client(guild_id)
         if vc is None or not vc.is_connected():
             try:
+                started = perf_counter()
                 vc = await user_voice_channel.connect(self_deaf=True)
-                self.voice_clients[guild_id] = vc
+                self.connect_latency["cold"].add(perf_counter() - started)
+                self.connections["cold"] += 1
+                self.session(guild_id).voice_client = vc
             except Exception as e:
                 await interaction.followup.send(f":x: Failed to connect to the voice channel. Error: {e}", ephemeral=True)
                 return None
+            if restored := await self.restore_session(guild_id):
+                await interaction.followup.send(f":recycle: Restored {restored} tracks from the previous session.")
         elif vc.channel and vc.channel != user_voice_channel:
             await interaction.followup.send(":x: I am already playing in another voice channel.", ephemeral=True)
             return None
+        elif (session := self.sessions.get(guild_id)) is not None and session.idle_handle is not None:
+            self.connections["warm"] += 1
         return vc
 
+    def connection_stats(self) -> dict[str, object]:
+        return {
+            **self.connections,
+            "idle": sum(1 for session in self.sessions.values() if session.idle_handle is not None),
+            "latency": {kind: histogram.summary() for kind, histogram in self.connect_latency.items()},
+        }
+
     async def play_next_track_and_announce(
         self,
         guild_id: int,
@@ -98,11 +413,14 @@ class AudioEngine:
         duration: str,
         stream_url: str | None,
         refresh_stream: StreamResolver | None,
+        acodec: str | None = None,
+        start_at: float = 0.0,
     ):
-        started = await self.play_song(guild_id, source_url, stream_url, title, duration, refresh_stream)
-        if not started:
+        started = await self.play_song(guild_id, source_url, stream_url, title, duration, refresh_stream, acodec, start_at)
+        if not started or start_at:
+            # A track resumed at an offset was already announced when it first started.
             return
-        if guild_id in self.command_channels and (channel := self.command_channels[guild_id]):
+        if (session := self.sessions.get(guild_id)) is not None and (channel := session.command_channel):
             try:
                 if duration == "LIVE":
                     await channel.send(f":radio: Playing **{title}** on Radio Garden")
@@ -119,7 +437,7 @@ class AudioEngine:
             await interaction.response.send_message(":x: You need to be in a voice channel to use this command.", ephemeral=True)
             return None
 
-        vc = self.voice_clients.get(guild_id)
+        vc = self.voice_client(guild_id)
         if vc is None or not vc.is_connected() or vc.channel is None:
             await interaction.response.send_message(":x: The bot is not connected to a voice channel.", ephemeral=True)
             return None
@@ -139,93 +457,515 @@ class AudioEngine:
         title: str,
         duration: str,
         refresh_stream: StreamResolver | None = None,
+        acodec: str | None = None,
+        start_at: float = 0.0,
     ) -> bool:
-        if not stream_url and refresh_stream is not None:
+        if (session := self.sessions.get(guild_id)) is None:
+            logger.warning("No playback session for guild %s", guild_id)
+            return False
+        item = QueueItem(source_url, title, duration, stream_url, refresh_stream, acodec=acodec, start_at=start_at)
+        if refresh_stream is not None and (not stream_url or stream_url_is_stale(stream_url)):
+            self._transition(session, PlaybackState.RESOLVING)
             try:
-                stream_url = await refresh_stream(source_url)
+                stream_url, acodec = await refresh_stream(source_url) or (None, None)
             except Exception as e:
                 logger.error("Could not refresh URL for %s: %s", title, e)
-                self.play_next(guild_id)
+                self._start_failed(session, item, e)
                 return False
 
         if not stream_url:
             logger.error("No playable stream URL found for %s", title)
-            self.play_next(guild_id)
+            self._start_failed(session, item)
             return False
 
-        vc = self.voice_clients.get(guild_id)
+        vc = self.voice_client(guild_id)
         if vc is None or not vc.is_connected():
             logger.warning("Voice client disappeared before playback in guild %s", guild_id)
+            self._voice_lost(session, item)
             return False
 
-        self.currently_playing[guild_id] = (source_url, title, duration)
+        self._cancel_idle(session)
+        session.current = replace(item, stream_url=stream_url, acodec=acodec, start_at=0.0)
+        session.stop_requested = False
         try:
-            vc.play(
-                FFmpegPCMAudio(
-                    stream_url,
-                    before_options=self.ffmpeg_opts["before_options"],
-                    options=self.ffmpeg_opts["options"],
-                ),
-                after=lambda e: self.play_next(guild_id, e),
-            )
+            prewarmed = None if start_at or session.recovering else self._take_prewarmed(session, source_url, stream_url)
+            source = prewarmed or self.source_for(guild_id, source_url, stream_url, duration, acodec, start_at)
+            # /volume may have changed while the pre-warmed source was waiting.
+            source.set_volume(session.volume)
+            # `after` runs on the voice player thread, so it only posts the event back to the loop.
+            vc.play(source, after=lambda e: session.post(PlaybackEvent.TRACK_ENDED, e, perf_counter()))
+            session.source = source
+            self._transition(session, PlaybackState.BUFFERING)
+            self.queue_changed(guild_id)
+            self.schedule_prewarm(guild_id, duration, start_at)
+            if self.normalize and duration != "LIVE":
+                profile = self.ffmpeg_profiles[source_profile(source_url, duration)]
+                self.loudness.analyse(source_url, stream_url, profile["before_options"])
             return True
         except Exception as e:
             logger.error("Playback failed to start in guild %s: %s", guild_id, e)
-            self.play_next(guild_id, e)
+            self._start_failed(session, item, e)
             return False
 
-    async def disconnect_and_cleanup(self, guild_id: int):
-        if (vc := self.voice_clients.pop(guild_id, None)) and vc.is_connected():
+    def _start_failed(self, session: PlaybackSession, item: QueueItem, error: Exception | None = None):
+        # A failed resume spends another retry; anything else moves on to the next track.
+        if session.recovering:
+            self._recover(session, item, error)
+        elif error is None:
+            self.play_next(session.guild_id)
+        else:
+            self.play_next(session.guild_id, error)
+
+    def create_source(
+        self,
+        guild_id: int,
+        stream_url: str,
+        acodec: str | None = None,
+        profile: str = "generic",
+        shared_key: str | None = None,
+        start_at: float = 0.0,
+        gain: float | None = None,
+    ) -> BufferedAudio:
+        opts = dict(self.ffmpeg_profiles.get(profile) or self.ffmpeg_profiles["generic"])
+        session = self.sessions.get(guild_id)
+        volume = session.volume if session is not None else 1.0
+        if gain is not None:
+            # Measured once in the background, so each play only pays for a plain gain filter.
+            opts["options"] = f"{opts['options']} -af volume={gain:.2f}dB"
+        if start_at > 0 and shared_key is None:
+            # Input seeking: FFmpeg asks the server for the byte range instead of decoding up to the offset.
+            opts["before_options"] = f"{opts['before_options']} -ss {start_at:.2f}"
+        else:
+            start_at = 0.0
+        source: AudioSource
+        if shared_key is not None:
+            # Every guild on the same station shares one FFmpeg process and upstream connection.
+            source = self.broadcasts.listen(shared_key, stream_url, guild_id)
+        elif acodec is not None and acodec.lower() in PASSTHROUGH_CODECS and gain is None and volume == 1.0:
+            # Already Opus: FFmpeg only remuxes to Ogg and discord.py sends the packets as-is.
+            source = FFmpegOpusAudio(
+                stream_url, codec="copy", before_options=opts["before_options"], options=opts["options"]
+            )
+        else:
+            source = FFmpegPCMAudio(stream_url, before_options=opts["before_options"], options=opts["options"])
+        volume = volume if shared_key is None else None
+        if session is None:
+            return BufferedAudio(source, start_at=start_at, volume=volume)
+        return BufferedAudio(
+            source,
+            on_first_frame=lambda: session.post(PlaybackEvent.FIRST_FRAME, perf_counter()),
+            start_at=start_at,
+            volume=volume,
+        )
+
+    def _broadcast_source(self, stream_url: str) -> AudioSource:
+        opts = self.ffmpeg_profiles["live"]
+        return FFmpegOpusAudio(stream_url, before_options=opts["before_options"], options=opts["options"])
+
+    def source_for(
+        self, guild_id: int, source_url: str, stream_url: str, duration: str, acodec: str | None, start_at: float = 0.0
+    ) -> BufferedAudio:
+        profile = source_profile(source_url, duration)
+        shared_key = source_url if profile == "live" else None
+        gain = self.loudness.gain(source_url) if self.normalize and shared_key is None else None
+        return self.create_source(guild_id, stream_url, acodec, profile, shared_key, start_at, gain)
+
+    def _on_first_frame(self, session: PlaybackSession, started_at: float):
+        if session.track_ended_at is not None:
+            session.transition_gaps.append(started_at - session.track_ended_at)
+            session.track_ended_at = None
+        if session.recovering:
+            session.recovering = False
+            self.recoveries["recovered"] += 1
+            logger.info("Recovered playback in guild %s at %.1fs", session.guild_id, session.elapsed())
+        if session.state is PlaybackState.BUFFERING:
+            self._transition(session, PlaybackState.PLAYING)
+            # Playing guilds keep being checkpointed, so a crash resumes close to where playback was.
+            self.checkpoints.mark(session.guild_id)
+
+    def _on_track_ended(self, session: PlaybackSession, error: Exception | None, ended_at: float):
+        session.track_ended_at = ended_at
+        if (current := session.current) is not None and self.track_failed(session, error):
+            if (source := session.source) is not None and source.elapsed() - source.start_at >= RECOVERY_STABLE_AFTER:
+                session.recovery_attempts = 0
+            start_at = 0.0 if current.duration == "LIVE" else session.elapsed()
+            self._recover(session, replace(current, start_at=start_at), error)
+            return
+        session.recovery_attempts = 0
+        self.play_next(session.guild_id, error)
+
+    def track_failed(self, session: PlaybackSession, error: Exception | None) -> bool:
+        """Whether the track that just ended was cut off, as opposed to finishing or being stopped on purpose."""
+        if session.stop_requested or session.current is None:
+            return False
+        if error is not None or session.current.duration == "LIVE":
+            # Live streams never end on their own.
+            return True
+        if (length := parse_duration(session.current.duration)) is None:
+            return False
+        # An expired or dropped stream URL usually shows up as FFmpeg hitting EOF early rather than as an error.
+        return session.elapsed() < length - EARLY_END_TOLERANCE
+
+    def _recover(self, session: PlaybackSession, item: QueueItem, error: Exception | None = None):
+        guild_id = session.guild_id
+        if session.recovery_attempts >= self.max_recoveries:
+            session.recovering = False
+            session.recovery_attempts = 0
+            self.recoveries["dropped"] += 1
+            logger.warning("Giving up on %s in guild %s after %s retries", item.title, guild_id, self.max_recoveries)
+            self.play_next(guild_id, error)
+            return
+        delay = self.recovery_backoff * 2**session.recovery_attempts
+        session.recovery_attempts += 1
+        session.recovering = True
+        self.recoveries["attempts"] += 1
+        logger.warning(
+            "Stream of %s failed in guild %s (%s); resuming at %.1fs in %.1fs",
+            item.title, guild_id, error or "ended early", item.start_at, delay,
+        )
+        self._transition(session, PlaybackState.DRAINING)
+        session.recovery_handle = session.loop.call_later(delay, self._resume, session, item)
+
+    def _resume(self, session: PlaybackSession, item: QueueItem):
+        session.recovery_handle = None
+        if self.sessions.get(session.guild_id) is not session:
+            return
+        stream_url = item.stream_url
+        if item.refresh_stream is not None:
+            # The failed URL may still look fresh to the cache, so force a new extraction.
+            get_track_cache(self.bot).invalidate(item.source_url)
+            stream_url = None
+        self._spawn(
+            self.play_song(
+                session.guild_id,
+                item.source_url,
+                stream_url,
+                item.title,
+                item.duration,
+                item.refresh_stream,
+                item.acodec,
+                item.start_at,
+            )
+        )
+
+    def transition_gap_stats(self, guild_id: int) -> dict[str, float]:
+        if (session := self.sessions.get(guild_id)) is None or not (gaps := session.transition_gaps):
+            return {"samples": 0}
+        return {
+            "samples": len(gaps),
+            "last_ms": gaps[-1] * 1000,
+            "avg_ms": sum(gaps) / len(gaps) * 1000,
+            "max_ms": max(gaps) * 1000,
+        }
+
+    def schedule_prewarm(self, guild_id: int, duration: str, start_at: float = 0.0):
+        """Start the next track's FFmpeg process shortly before the current track, played from `start_at`, ends."""
+        if (session := self.sessions.get(guild_id)) is None:
+            return
+        if session.prewarm_handle is not None:
+            session.prewarm_handle.cancel()
+            session.prewarm_handle = None
+        if not self.prewarm_enabled or (seconds := parse_duration(duration)) is None:
+            return
+        delay = max(0.0, seconds - start_at - self.prewarm_lead)
+        session.prewarm_handle = session.loop.call_later(delay, self._start_prewarm, guild_id)
+
+    def _start_prewarm(self, guild_id: int):
+        if (session := self.sessions.get(guild_id)) is None:
+            return
+        session.prewarm_handle = None
+        if not session.queue:
+            return
+        if session.prewarmed is not None and session.prewarmed[0] is session.queue[0]:
+            return
+        self._discard_prewarmed(session)
+        session.prewarm_task = create_task(self._prewarm(session, session.queue[0]))
+
+    async def _prewarm(self, session: PlaybackSession, item: QueueItem):
+        if item.needs_prefetch() and not await self._prefetch(session.guild_id, item):
+            return
+        if not item.stream_url:
+            return
+        source = self.source_for(session.guild_id, item.source_url, item.stream_url, item.duration, item.acodec)
+        try:
+            frames = await get_running_loop().run_in_executor(None, source.warm)
+        except CancelledError:
+            source.cleanup()
+            raise
+        except Exception as e:
+            logger.warning("Failed to pre-warm %s in guild %s: %s", item.title, session.guild_id, e)
+            source.cleanup()
+            return
+        if not frames or session.closed or not session.queue or session.queue[0] is not item:
+            source.cleanup()
+            return
+        session.prewarmed = (item, source)
+
+    def _take_prewarmed(self, session: PlaybackSession, source_url: str, stream_url: str) -> BufferedAudio | None:
+        session.prewarm_task = None
+        if (entry := session.prewarmed) is None:
+            return None
+        session.prewarmed = None
+        item, source = entry
+        if item.source_url == source_url and item.stream_url == stream_url:
+            return source
+        source.cleanup()
+        return None
+
+    def _discard_prewarmed(self, session: PlaybackSession):
+        if session.prewarm_task is not None:
+            session.prewarm_task.cancel()
+            session.prewarm_task = None
+        if session.prewarmed is not None:
+            session.prewarmed[1].cleanup()
+            session.prewarmed = None
+
+    def schedule_prefetch(self, guild_id: int):
+        """Resolve the stream URL of the next queued track in the background while the current one plays."""
+        if (session := self.sessions.get(guild_id)) is None:
+            return
+        queue = session.queue
+        if session.prewarmed is not None and (not queue or session.prewarmed[0] is not queue[0]):
+            # The queue head changed (shuffle, removal): re-warm the new head instead.
+            self._discard_prewarmed(session)
+            if session.prewarm_handle is None:
+                self._start_prewarm(guild_id)
+        if not queue or not queue[0].needs_prefetch():
+            return
+        if session.prefetch_task is not None and not session.prefetch_task.done():
+            return
+        task = create_task(self._prefetch(guild_id, queue[0]))
+        session.prefetch_task = task
+        task.add_done_callback(lambda done: self._prefetch_done(session, done))
+
+    async def _prefetch(self, guild_id: int, item: QueueItem) -> bool:
+        if (resolver := item.refresh_stream) is None:
+            return False
+        try:
+            resolved = await resolver(item.source_url)
+        except Exception as e:
+            logger.warning("Failed to prefetch stream URL for %s in guild %s: %s", item.title, guild_id, e)
+            return False
+        if resolved is None or not resolved.url:
+            return False
+        item.stream_url, item.acodec = resolved
+        item.resolved_at = time()
+        return True
+
+    def _prefetch_done(self, session: PlaybackSession, task: Task):
+        if session.prefetch_task is task:
+            session.prefetch_task = None
+        # The head may have changed (skip, shuffle) while the previous one was resolving.
+        if not task.cancelled() and task.result() and not session.closed:
+            self.schedule_prefetch(session.guild_id)
+
+    async def disconnect_and_cleanup(self, guild_id: int, *, keep_checkpoint: bool = False):
+        if keep_checkpoint:
+            self.checkpoints.forget(guild_id)
+        else:
+            await self.checkpoints.delete(guild_id)
+        if (session := self.sessions.pop(guild_id, None)) is None:
+            return
+        # Closing first turns the `after` callback fired by `vc.stop()` into a no-op.
+        session.closed = True
+        self._transition(session, PlaybackState.IDLE)
+        if (vc := session.voice_client) and vc.is_connected():
             try:
                 vc.stop()
                 await vc.disconnect()
             except Exception as e:
                 logger.error("Error during disconnect for guild %s: %s", guild_id, e)
-        self.queues.pop(guild_id, None)
-        self.command_channels.pop(guild_id, None)
-        self.currently_playing.pop(guild_id, None)
+        if session.prefetch_task is not None:
+            session.prefetch_task.cancel()
+        if session.prewarm_handle is not None:
+            session.prewarm_handle.cancel()
+        if session.recovery_handle is not None:
+            session.recovery_handle.cancel()
+        self._cancel_idle(session)
+        self._discard_prewarmed(session)
 
     def play_next(self, guild_id: int, error=None):
+        """Start the next queued track, or disconnect when the queue is empty. Must run on the event loop."""
         if error:
             logger.error("Player error for guild %s: %s", guild_id, error)
-        vc = self.voice_clients.get(guild_id)
+        if (session := self.sessions.get(guild_id)) is None:
+            return
+        vc = session.voice_client
         if vc is None or not vc.is_connected():
-            run_coroutine_threadsafe(self.disconnect_and_cleanup(guild_id), self.bot.loop)
+            self._voice_lost(session)
             return
 
-        queue = self.queues.get(guild_id)
-        if queue:
-            item = queue.popleft()
-            coro = self.play_next_track_and_announce(
-                guild_id,
-                item.source_url,
-                item.title,
-                item.duration,
-                item.stream_url,
-                item.refresh_stream,
+        if session.queue:
+            self._transition(session, PlaybackState.DRAINING)
+            item = session.queue.popleft()
+            if item.needs_prefetch():
+                item.stream_url = None
+            self._spawn(
+                self.play_next_track_and_announce(
+                    guild_id,
+                    item.source_url,
+                    item.title,
+                    item.duration,
+                    item.stream_url,
+                    item.refresh_stream,
+                    item.acodec,
+                    item.start_at,
+                )
             )
-            run_coroutine_threadsafe(coro, self.bot.loop)
             return
 
-        self.currently_playing.pop(guild_id, None)
-        run_coroutine_threadsafe(self.disconnect_and_cleanup(guild_id), self.bot.loop)
+        session.current = None
+        session.source = None
+        self._transition(session, PlaybackState.IDLE)
+        if self.idle_timeout <= 0:
+            self._spawn(self.disconnect_and_cleanup(guild_id))
+            return
+        # Stay connected but silent for a while; playing anything in the meantime cancels the disconnect.
+        self.checkpoints.mark(guild_id)
+        self._cancel_idle(session)
+        session.idle_handle = session.loop.call_later(self.idle_timeout, self._idle_expired, session)
+
+    def _idle_expired(self, session: PlaybackSession):
+        session.idle_handle = None
+        if self.sessions.get(session.guild_id) is session and session.state is PlaybackState.IDLE and not session.queue:
+            self._spawn(self.disconnect_and_cleanup(session.guild_id))
+
+    def _cancel_idle(self, session: PlaybackSession):
+        if session.idle_handle is not None:
+            session.idle_handle.cancel()
+            session.idle_handle = None
+
+    def _voice_lost(self, session: PlaybackSession, item: QueueItem | None = None):
+        """Keep the session through a dropped voice connection; `item` is resumed once it is back."""
+        if item is not None:
+            session.queue.insert_many(0, [item])
+        # A start that was cut short must not leave the session stuck mid-start, or the rejoin never resumes it.
+        if session.state in {PlaybackState.RESOLVING, PlaybackState.BUFFERING}:
+            self._transition(session, PlaybackState.DRAINING)
+        if not self._reconnecting(session):
+            self.connections["lost"] += 1
+            session.reconnect_task = self._spawn(self._reconnect(session))
+
+    @staticmethod
+    def _reconnecting(session: PlaybackSession) -> bool:
+        return session.reconnect_task is not None and not session.reconnect_task.done()
+
+    async def _reconnect(self, session: PlaybackSession):
+        guild_id = session.guild_id
+        old = session.voice_client
+        if (channel := old and old.channel) is None:
+            await self.disconnect_and_cleanup(guild_id)
+            return
+        # discord.py resumes transient voice websocket drops itself; only rejoin when that gives up.
+        waited = 0.0
+        while waited < self.reconnect_timeout and not old.is_connected() and not session.closed:
+            await sleep(0.5)
+            waited += 0.5
+        if session.closed:
+            return
+        if not old.is_connected():
+            try:
+                await old.disconnect(force=True)
+                started = perf_counter()
+                session.voice_client = await channel.connect(self_deaf=True)
+                self.connect_latency["reconnect"].add(perf_counter() - started)
+            except Exception as e:
+                logger.warning("Could not rejoin voice in guild %s: %s", guild_id, e)
+                # The checkpoint is kept so the next /play picks the queue back up.
+                await self.disconnect_and_cleanup(guild_id, keep_checkpoint=True)
+                return
+        self.connections["reconnected"] += 1
+        logger.info("Voice connection restored in guild %s after %.1fs", guild_id, waited)
+        if session.state in {PlaybackState.IDLE, PlaybackState.DRAINING} and session.queue:
+            self.play_next(guild_id)
+
+    def pause(self, guild_id: int) -> bool:
+        session = self.sessions.get(guild_id)
+        if session is None or session.state not in {PlaybackState.BUFFERING, PlaybackState.PLAYING}:
+            return False
+        session.voice_client.pause()
+        return self._transition(session, PlaybackState.PAUSED)
+
+    def resume(self, guild_id: int) -> bool:
+        if (session := self.sessions.get(guild_id)) is None or session.state is not PlaybackState.PAUSED:
+            return False
+        session.voice_client.resume()
+        return self._transition(session, PlaybackState.PLAYING)
+
+    def seek(self, guild_id: int, seconds: float) -> bool:
+        session = self.sessions.get(guild_id)
+        if seconds < 0 or session is None or (current := session.current) is None or current.duration == "LIVE":
+            return False
+        if session.state not in {PlaybackState.BUFFERING, PlaybackState.PLAYING, PlaybackState.PAUSED}:
+            return False
+        if (length := parse_duration(current.duration)) is not None and seconds >= length:
+            return False
+        self.restart_current(session, seconds)
+        return True
+
+    def restart_current(self, session: PlaybackSession, start_at: float):
+        """Replay the current track from `start_at` seconds: it goes back to the queue head and the player is stopped."""
+        session.queue.insert_many(0, [replace(session.current, start_at=start_at)])
+        self.queue_changed(session.guild_id)
+        # TRACK_ENDED from the stopped player pops it again, re-resolving the stream URL first if it expired.
+        session.stop_requested = True
+        session.voice_client.stop()
+
+    def set_volume(self, guild_id: int, volume: float) -> bool:
+        """Set the guild's volume; returns whether the current track picked it up immediately."""
+        if (session := self.sessions.get(guild_id)) is None:
+            return False
+        session.volume = volume
+        if session.source is not None and session.source.set_volume(volume):
+            return True
+        current = session.current
+        playing = session.state in {PlaybackState.BUFFERING, PlaybackState.PLAYING}
+        if current is not None and current.duration != "LIVE" and playing:
+            # Opus passthrough has no PCM to scale, so the track restarts once on the PCM path.
+            self.restart_current(session, session.elapsed())
+            return True
+        return False
+
+    def skip(self, guild_id: int) -> bool:
+        session = self.sessions.get(guild_id)
+        if session is None or session.state not in {PlaybackState.BUFFERING, PlaybackState.PLAYING, PlaybackState.PAUSED}:
+            return False
+        # The player thread's `after` callback posts TRACK_ENDED, which advances the queue.
+        session.stop_requested = True
+        session.voice_client.stop()
+        return True
 
-    def unload(self):
-        for guild_id in list(self.voice_clients):
-            run_coroutine_threadsafe(self.disconnect_and_cleanup(guild_id), self.bot.loop)
+    async def shutdown(self):
+        """Checkpoint every guild, then disconnect without clearing the checkpoints, for reloads and restarts."""
+        self.checkpoints.dirty.update(self.sessions)
+        await self.checkpoints.flush()
+        for guild_id in list(self.sessions):
+            await self.disconnect_and_cleanup(guild_id, keep_checkpoint=True)
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
 
     async def handle_voice_state_update(self, member: Member, before: VoiceState, after: VoiceState):
+        guild_id = member.guild.id
         if member.bot:
+            # The bot itself leaving a channel means it was disconnected on purpose, not a dropped connection,
+            # unless it is _reconnect dropping the dead client before rejoining.
+            user = self.bot.user
+            if user is None or member.id != user.id or after.channel is not None:
+                return
+            if (session := self.sessions.get(guild_id)) is not None and not self._reconnecting(session):
+                await self.disconnect_and_cleanup(guild_id)
             return
 
-        guild_id = member.guild.id
-        vc = self.voice_clients.get(guild_id)
+        vc = self.voice_client(guild_id)
         if vc is None:
             return
 
-        if not vc.is_connected() or not vc.channel:
+        if not vc.channel:
             await self.disconnect_and_cleanup(guild_id)
             return
+        if not vc.is_connected():
+            self._voice_lost(self.sessions[guild_id])
+            return
 
         if before.channel == vc.channel and after.channel != vc.channel:
             if len(vc.channel.members) == 1 and vc.channel.members[0] == self.bot.user:
@@ -0,0 +1,64 @@
+from collections import deque
+from collections.abc import Callable
+
+from discord import AudioSource, PCMVolumeTransformer
+
+# discord.py sends one 20ms frame per read().
+FRAME_SECONDS = 0.02
+
+
+class BufferedAudio(AudioSource):
+    """Wraps an audio source so frames can be read ahead of playback and the first played frame is reported."""
+
+    def __init__(
+        self,
+        original: AudioSource,
+        on_first_frame: Callable[[], None] | None = None,
+        start_at: float = 0.0,
+        volume: float | None = None,
+    ):
+        self.original = original
+        self.on_first_frame = on_first_frame
+        self.start_at = start_at
+        # PCM sources get a volume stage so /volume applies without restarting FFmpeg.
+        self.volume = PCMVolumeTransformer(original, volume) if volume is not None and not original.is_opus() else None
+        self._reader = self.volume or original
+        # Only the player thread writes this; the loop just reads it.
+        self.frames = 0
+        self._buffer: deque[bytes] = deque()
+        self._started = False
+
+    def warm(self, frames: int = 25) -> int:
+        """Blocking: pull up to `frames` frames (20ms each) so FFmpeg start-up and probing happen now."""
+        while len(self._buffer) < frames:
+            if not (data := self._reader.read()):
+                break
+            self._buffer.append(data)
+        return len(self._buffer)
+
+    def read(self) -> bytes:
+        data = self._buffer.popleft() if self._buffer else self._reader.read()
+        if data:
+            self.frames += 1
+        if not self._started:
+            self._started = True
+            if self.on_first_frame is not None:
+                self.on_first_frame()
+        return data
+
+    def set_volume(self, volume: float) -> bool:
+        """Change the volume in place; False for Opus sources, which have no PCM to scale."""
+        if self.volume is None:
+            return False
+        self.volume.volume = volume
+        return True
+
+    def elapsed(self) -> float:
+        """Position in the track from the frames handed to the player plus the seek offset."""
+        return self.start_at + self.frames * FRAME_SECONDS
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def cleanup(self):
+        self.original.cleanup()
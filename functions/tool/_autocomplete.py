@@ -0,0 +1,97 @@
+from asyncio import CancelledError, Task, create_task, current_task, sleep
+from collections.abc import Awaitable, Callable, Hashable
+from time import monotonic
+
+from discord import app_commands
+
+from ._cache import MISSING, TTLCache, normalise_query
+
+ChoiceFetcher = Callable[[str], Awaitable[list[app_commands.Choice[str]]]]
+
+
+class AutocompleteDebouncer:
+    """Per-user debounce for autocomplete that cancels superseded searches and reuses prefix results."""
+
+    def __init__(
+        self,
+        delay: float = 0.3,
+        reuse_window: float = 30.0,
+        *,
+        cache: TTLCache | None = None,
+        namespace: str = "",
+    ):
+        self.delay = delay
+        self.reuse_window = reuse_window
+        self.cache = cache
+        self.namespace = namespace
+        self._inflight: dict[Hashable, Task] = {}
+        self._last: dict[Hashable, tuple[str, list[app_commands.Choice[str]], float]] = {}
+        self.upstream_searches = 0
+        self.searches_saved = 0
+
+    async def complete(self, key: Hashable, query: str, fetch: ChoiceFetcher) -> list[app_commands.Choice[str]]:
+        if (previous := self._inflight.get(key)) is not None and not previous.done():
+            previous.cancel()
+        if (reused := self._from_previous(key, query)) is not None:
+            self.searches_saved += 1
+            return reused
+        cache_key = (self.namespace, normalise_query(query))
+        if self.cache is not None and (cached := self.cache.get(cache_key)) is not MISSING:
+            self.searches_saved += 1
+            self._remember(key, query, cached)
+            return list(cached)
+
+        started: list[bool] = []
+        task = create_task(self._debounced(query, fetch, started))
+        self._inflight[key] = task
+        try:
+            choices = await task
+        except CancelledError:
+            if (this_task := current_task()) is not None and this_task.cancelling():
+                raise
+            # Superseded by a newer keystroke from the same user.
+            if not started:
+                self.searches_saved += 1
+            return []
+        except Exception:
+            return []
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+        if self.cache is not None:
+            self.cache.set(cache_key, list(choices))
+        self._remember(key, query, choices)
+        return choices
+
+    def _remember(self, key: Hashable, query: str, choices: list[app_commands.Choice[str]]):
+        now = monotonic()
+        if len(self._last) >= 1024:
+            self._last = {k: v for k, v in self._last.items() if now - v[2] <= self.reuse_window}
+        self._last[key] = (query, choices, now)
+
+    async def _debounced(self, query: str, fetch: ChoiceFetcher, started: list[bool]) -> list[app_commands.Choice[str]]:
+        if self.delay > 0:
+            await sleep(self.delay)
+        started.append(True)
+        self.upstream_searches += 1
+        return await fetch(query)
+
+    def _from_previous(self, key: Hashable, query: str) -> list[app_commands.Choice[str]] | None:
+        if (last := self._last.get(key)) is None:
+            return None
+        previous_query, choices, answered_at = last
+        if monotonic() - answered_at > self.reuse_window:
+            self._last.pop(key, None)
+            return None
+        lowered = query.casefold()
+        if not choices or not lowered.startswith(previous_query.casefold()):
+            return None
+        if lowered == previous_query.casefold():
+            return list(choices)
+        tokens = lowered.split()
+        narrowed = [choice for choice in choices if all(token in choice.name.casefold() for token in tokens)]
+        return narrowed or None
+
+    def stats(self) -> dict[str, int]:
+        return {"upstream_searches": self.upstream_searches, "searches_saved": self.searches_saved}
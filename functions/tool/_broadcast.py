@@ -0,0 +1,143 @@
+import logging
+from collections.abc import Callable
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+
+from discord import AudioSource
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastListener(AudioSource):
+    """One guild's view of a shared station broadcast; frames are already Opus-encoded."""
+
+    def __init__(self, broadcast: "StationBroadcast", guild_id: int, buffer_frames: int = 50, stall_timeout: float = 10.0):
+        self.broadcast = broadcast
+        self.guild_id = guild_id
+        self.stall_timeout = stall_timeout
+        self._frames: Queue[bytes | None] = Queue(maxsize=buffer_frames)
+        self._closed = False
+
+    def push(self, frame: bytes | None):
+        # A slow listener drops its oldest frame rather than holding back the whole station.
+        while True:
+            try:
+                self._frames.put_nowait(frame)
+                return
+            except Full:
+                try:
+                    self._frames.get_nowait()
+                except Empty:
+                    pass
+
+    def read(self) -> bytes:
+        try:
+            return self._frames.get(timeout=self.stall_timeout) or b""
+        except Empty:
+            logger.warning("Broadcast of %s stalled for guild %s", self.broadcast.key, self.guild_id)
+            return b""
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        if not self._closed:
+            self._closed = True
+            self.broadcast.unsubscribe(self)
+
+
+class StationBroadcast:
+    """Single FFmpeg decode/encode of a live stream whose Opus frames are copied to every subscribed guild."""
+
+    def __init__(self, key: str, source: AudioSource, on_close: Callable[["StationBroadcast"], None]):
+        self.key = key
+        self._source = source
+        self._on_close = on_close
+        self._listeners: list[BroadcastListener] = []
+        self._lock = Lock()
+        self.closed = False
+        self._shut_down = False
+        self.frames = 0
+        self._thread = Thread(target=self._pump, name=f"broadcast-{key[-16:]}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def listener_count(self) -> int:
+        return len(self._listeners)
+
+    def subscribe(self, guild_id: int) -> BroadcastListener | None:
+        listener = BroadcastListener(self, guild_id)
+        with self._lock:
+            if self.closed:
+                return None
+            self._listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener: BroadcastListener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+            if self._listeners or self.closed:
+                return
+            self.closed = True
+        self._shutdown()
+
+    def _pump(self):
+        try:
+            while not self.closed and (frame := self._source.read()):
+                self.frames += 1
+                with self._lock:
+                    listeners = tuple(self._listeners)
+                for listener in listeners:
+                    listener.push(frame)
+        except Exception as e:
+            logger.error("Broadcast of %s failed: %s", self.key, e)
+        with self._lock:
+            self.closed = True
+            listeners = tuple(self._listeners)
+        for listener in listeners:
+            listener.push(None)
+        self._shutdown()
+
+    def _shutdown(self):
+        with self._lock:
+            if self._shut_down:
+                return
+            self._shut_down = True
+        try:
+            self._source.cleanup()
+        finally:
+            self._on_close(self)
+
+
+class BroadcastHub:
+    """Reference-counted registry of live station broadcasts keyed by source URL."""
+
+    def __init__(self, source_factory: Callable[[str], AudioSource]):
+        self.source_factory = source_factory
+        self.broadcasts: dict[str, StationBroadcast] = {}
+        self._lock = Lock()
+
+    def listen(self, key: str, stream_url: str, guild_id: int) -> BroadcastListener:
+        with self._lock:
+            if (broadcast := self.broadcasts.get(key)) is not None and (listener := broadcast.subscribe(guild_id)):
+                return listener
+            broadcast = StationBroadcast(key, self.source_factory(stream_url), self._forget)
+            listener = BroadcastListener(broadcast, guild_id)
+            broadcast._listeners.append(listener)
+            self.broadcasts[key] = broadcast
+            broadcast.start()
+            logger.info("Started shared broadcast for %s", key)
+            return listener
+
+    def _forget(self, broadcast: StationBroadcast):
+        with self._lock:
+            if self.broadcasts.get(broadcast.key) is broadcast:
+                del self.broadcasts[broadcast.key]
+                logger.info("Stopped shared broadcast for %s", broadcast.key)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {key: broadcast.listener_count for key, broadcast in self.broadcasts.items()}
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+MISSING: Any = object()
+
+
+class TTLCache:
+    """Size-bounded LRU cache with per-entry TTL and shorter negative caching for empty values."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600.0, negative_ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        if (entry := self._data.get(key)) is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if monotonic() >= expires_at:
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        if ttl is None:
+            ttl = self.ttl if value else self.negative_ttl
+        self._data[key] = (value, monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def normalise_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def get_suggestion_cache(bot: "Sakamoto") -> TTLCache:
+    cache = getattr(bot, "_suggestion_cache", None)
+    if cache is None:
+        cache = TTLCache(maxsize=4096, ttl=900.0, negative_ttl=120.0)
+        setattr(bot, "_suggestion_cache", cache)
+    return cache
+
+
+def get_stream_url_cache(bot: "Sakamoto") -> TTLCache:
+    cache = getattr(bot, "_stream_url_cache", None)
+    if cache is None:
+        cache = TTLCache(maxsize=1024, ttl=3600.0)
+        setattr(bot, "_stream_url_cache", cache)
+    return cache
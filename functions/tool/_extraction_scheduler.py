@@ -0,0 +1,128 @@
+from asyncio import Future, get_running_loop
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import IntEnum
+from heapq import heappop, heappush
+from itertools import count
+from time import perf_counter
+from typing import Any
+
+
+class Priority(IntEnum):
+    PLAYBACK = 0
+    PLAY = 1
+    AUTOCOMPLETE = 2
+
+
+@dataclass
+class _Job:
+    fn: Callable[..., Any]
+    args: tuple
+    priority: Priority
+    guild_id: int | None
+    future: Future
+    queued_at: float = field(default_factory=perf_counter)
+
+
+class ExtractionScheduler:
+    """Dedicated worker pool for blocking yt-dlp calls with priorities and per-guild caps."""
+
+    def __init__(self, max_workers: int = 4, per_guild_limit: int = 2):
+        self.max_workers = max_workers
+        self.per_guild_limit = per_guild_limit
+        # Autocomplete never occupies every worker, so a playback refresh always has a free slot.
+        self.autocomplete_limit = max(1, max_workers - 1)
+        # Nor do other jobs together, long playlist listings included, whenever there is a worker to spare.
+        self.playback_reserve = 1 if max_workers > 1 else 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extractor")
+        self._pending: list[tuple[int, int, _Job]] = []
+        self._seq = count()
+        self._running = 0
+        self._running_by_priority: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self._running_by_guild: dict[int, int] = {}
+        self.started: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self.completed: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self.cancelled: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self.wait_time: dict[Priority, float] = dict.fromkeys(Priority, 0.0)
+
+    async def run(self, fn: Callable[..., Any], *args, priority: Priority = Priority.PLAY, guild_id: int | None = None):
+        job = _Job(fn, args, priority, guild_id, get_running_loop().create_future())
+        heappush(self._pending, (priority, next(self._seq), job))
+        self._dispatch()
+        return await job.future
+
+    def _eligible(self, job: _Job) -> bool:
+        if job.priority is not Priority.PLAYBACK:
+            if self._running - self._running_by_priority[Priority.PLAYBACK] >= self.max_workers - self.playback_reserve:
+                return False
+        if job.priority is Priority.AUTOCOMPLETE and self._running_by_priority[job.priority] >= self.autocomplete_limit:
+            return False
+        if job.guild_id is not None and self._running_by_guild.get(job.guild_id, 0) >= self.per_guild_limit:
+            return False
+        return True
+
+    def _dispatch(self):
+        skipped: list[tuple[int, int, _Job]] = []
+        while self._pending and self._running < self.max_workers:
+            entry = heappop(self._pending)
+            job = entry[2]
+            if job.future.done():
+                self.cancelled[job.priority] += 1
+                continue
+            if not self._eligible(job):
+                skipped.append(entry)
+                continue
+            self._start(job)
+        for entry in skipped:
+            heappush(self._pending, entry)
+
+    def _start(self, job: _Job):
+        self._running += 1
+        self._running_by_priority[job.priority] += 1
+        if job.guild_id is not None:
+            self._running_by_guild[job.guild_id] = self._running_by_guild.get(job.guild_id, 0) + 1
+        self.started[job.priority] += 1
+        self.wait_time[job.priority] += perf_counter() - job.queued_at
+        work = get_running_loop().run_in_executor(self._executor, job.fn, *job.args)
+        work.add_done_callback(lambda done: self._finish(job, done))
+
+    def _finish(self, job: _Job, done: Future):
+        self._running -= 1
+        self._running_by_priority[job.priority] -= 1
+        if job.guild_id is not None:
+            if (remaining := self._running_by_guild[job.guild_id] - 1) > 0:
+                self._running_by_guild[job.guild_id] = remaining
+            else:
+                self._running_by_guild.pop(job.guild_id, None)
+        self.completed[job.priority] += 1
+        if not job.future.done():
+            if done.cancelled():
+                job.future.cancel()
+            elif (error := done.exception()) is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(done.result())
+        self._dispatch()
+
+    def queue_depth(self) -> dict[str, int]:
+        depth = {priority.name.lower(): 0 for priority in Priority}
+        for _, _, job in self._pending:
+            if not job.future.done():
+                depth[job.priority.name.lower()] += 1
+        return depth
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._running,
+            "queued": self.queue_depth(),
+            "completed": {priority.name.lower(): total for priority, total in self.completed.items()},
+            "cancelled": {priority.name.lower(): total for priority, total in self.cancelled.items()},
+            "avg_wait_ms": {
+                priority.name.lower(): (self.wait_time[priority] / started * 1000) if (started := self.started[priority]) else 0.0
+                for priority in Priority
+            },
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,86 @@
+import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+from threading import Lock
+from typing import TYPE_CHECKING
+
+from yt_dlp import YoutubeDL
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractorPool:
+    """Bounded set of long-lived YoutubeDL instances checked out one request at a time."""
+
+    def __init__(self, opts: dict, size: int = 4):
+        self.opts = dict(opts)
+        self.size = size
+        self._idle: LifoQueue[YoutubeDL] = LifoQueue(maxsize=size)
+        self._lock = Lock()
+        self._created = 0
+        self._closed = False
+
+    @contextmanager
+    def checkout(self) -> Iterator[YoutubeDL]:
+        ydl = self._acquire()
+        try:
+            yield ydl
+        finally:
+            self._release(ydl)
+
+    def extract_info(self, url: str, **kwargs):
+        with self.checkout() as ydl:
+            return ydl.extract_info(url, download=False, **kwargs)
+
+    def _acquire(self) -> YoutubeDL:
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return YoutubeDL(dict(self.opts))
+        # Every instance is checked out: wait for one to come back.
+        return self._idle.get()
+
+    def _release(self, ydl: YoutubeDL):
+        if self._closed:
+            self._close_instance(ydl)
+            return
+        self._idle.put_nowait(ydl)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                ydl = self._idle.get_nowait()
+            except Empty:
+                break
+            self._close_instance(ydl)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": self.size, "created": self._created, "idle": self._idle.qsize()}
+
+    @staticmethod
+    def _close_instance(ydl: YoutubeDL):
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.warning("Failed to close extractor instance: %s", e)
+
+
+def get_extractor_pool(bot: "Sakamoto", name: str, opts: dict, size: int = 4) -> ExtractorPool:
+    pools: dict[str, ExtractorPool] = getattr(bot, "_extractor_pools", None) or {}
+    setattr(bot, "_extractor_pools", pools)
+    pool = pools.get(name)
+    if pool is None or pool.opts != opts or pool.size != size:
+        if pool is not None:
+            pool.close()
+        pool = ExtractorPool(opts, size)
+        pools[name] = pool
+    return pool
@@ -0,0 +1,104 @@
+import logging
+from asyncio import sleep
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from random import uniform
+from time import perf_counter
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+from aiohttp import ClientError, ClientResponse, ClientSession, ClientTimeout, TCPConnector
+
+from ._playback_state import Histogram
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt: rate limits and gateways that are briefly unavailable.
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+def create_session(
+    *,
+    limit: int = 100,
+    limit_per_host: int = 10,
+    keepalive: float = 30.0,
+    dns_ttl: int = 300,
+    timeout: float = 10.0,
+    connect_timeout: float = 5.0,
+) -> ClientSession:
+    """The bot-wide aiohttp session: pooled and kept alive per host, with cached DNS and one timeout policy."""
+    connector = TCPConnector(
+        limit=limit, limit_per_host=limit_per_host, keepalive_timeout=keepalive, ttl_dns_cache=dns_ttl
+    )
+    return ClientSession(connector=connector, timeout=ClientTimeout(total=timeout, connect=connect_timeout))
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+
+
+class HttpClient:
+    """GETs through the bot's session with jittered retries for transient failures and per-host metrics."""
+
+    def __init__(self, bot: "Sakamoto", *, retries: int = 2, backoff: float = 0.25):
+        self.bot = bot
+        self.retries = retries
+        self.backoff = backoff
+        self.hosts: dict[str, HostStats] = {}
+
+    @asynccontextmanager
+    async def get(
+        self, url: str, *, params: dict | None = None, retries: int | None = None, **kwargs
+    ) -> AsyncIterator[ClientResponse]:
+        """Yield the response of a GET, retrying network errors and RETRY_STATUSES before handing it over."""
+        if (session := self.bot.session) is None:
+            raise RuntimeError("HTTP session is not available.")
+        host = self.hosts.setdefault(urlparse(url).netloc, HostStats())
+        attempts = (self.retries if retries is None else retries) + 1
+        yielded = False
+        for attempt in range(attempts):
+            last = attempt + 1 == attempts
+            started = perf_counter()
+            host.requests += 1
+            try:
+                async with session.get(url, params=params, **kwargs) as response:
+                    host.latency.add(perf_counter() - started)
+                    if response.status >= 500 or response.status == 429:
+                        host.errors += 1
+                    if last or response.status not in RETRY_STATUSES:
+                        yielded = True
+                        yield response
+                        return
+                    logger.debug("GET %s returned %s, retrying", url, response.status)
+            except (ClientError, TimeoutError) as e:
+                # Errors raised while the caller reads the response are theirs to handle.
+                if yielded:
+                    raise
+                host.errors += 1
+                if last:
+                    raise
+                logger.debug("GET %s failed (%s), retrying", url, e)
+            host.retries += 1
+            await sleep(self.backoff * 2**attempt * uniform(0.5, 1.5))
+
+    def stats(self) -> dict[str, dict[str, object]]:
+        return {
+            name: {"requests": host.requests, "errors": host.errors, "retries": host.retries, **host.latency.summary()}
+            for name, host in self.hosts.items()
+        }
+
+
+def get_http_client(bot: "Sakamoto") -> HttpClient:
+    client = getattr(bot, "_http_client", None)
+    if client is None:
+        client = HttpClient(bot)
+        setattr(bot, "_http_client", client)
+    return client
@@ -0,0 +1,184 @@
+import json
+import logging
+import subprocess
+from asyncio import Task, get_running_loop
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from os import makedirs, path
+from time import perf_counter, time
+from typing import TYPE_CHECKING
+
+from aiosqlite import connect
+
+from ._cache import TTLCache
+from ._track_cache import stream_expiry
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+logger = logging.getLogger(__name__)
+
+TARGET_LUFS = -16.0
+TRUE_PEAK_LIMIT = -1.5
+MAX_BOOST_DB = 12.0
+# Gains below this are inaudible, so those tracks keep the cheaper Opus passthrough path.
+MIN_GAIN_DB = 1.0
+# The opening ten minutes are enough to level a track; long mixes would otherwise hold a worker for minutes.
+ANALYSIS_SECONDS = 600
+ANALYSIS_TIMEOUT = 300
+
+
+def measure_loudness(stream_url: str, before_options: str = "") -> dict[str, float]:
+    """Blocking: run FFmpeg's loudnorm in measurement mode over the stream and return its report."""
+    command = ["ffmpeg", "-hide_banner", "-nostats", *before_options.split(), "-t", str(ANALYSIS_SECONDS), "-i", stream_url]
+    command += ["-vn", "-af", f"loudnorm=I={TARGET_LUFS}:TP={TRUE_PEAK_LIMIT}:LRA=11:print_format=json", "-f", "null", "-"]
+    result = subprocess.run(command, capture_output=True, text=True, timeout=ANALYSIS_TIMEOUT)
+    # The JSON report is the last brace-delimited block on stderr.
+    start, end = result.stderr.rfind("{"), result.stderr.rfind("}")
+    if result.returncode != 0 or start < 0 or end < start:
+        raise RuntimeError(f"loudnorm analysis failed (exit {result.returncode})")
+    report = json.loads(result.stderr[start:end + 1])
+    return {"integrated": float(report["input_i"]), "true_peak": float(report["input_tp"])}
+
+
+def gain_for(integrated: float, true_peak: float) -> float:
+    """Gain in dB that brings a track to the target loudness without pushing its peaks past the limit."""
+    if integrated == float("-inf"):
+        return 0.0
+    gain = TARGET_LUFS - integrated
+    return round(min(gain, TRUE_PEAK_LIMIT - true_peak, MAX_BOOST_DB), 2)
+
+
+class LoudnessCache:
+    """Per-track normalisation gain, measured once in the background and persisted to SQLite.
+
+    At most `max_pending` tracks wait for a measurement; past that the oldest are dropped, and tracks that
+    waited longer than `max_wait` or whose signed URL would expire mid-measurement are skipped. Either way
+    they are simply queued again the next time they play.
+    """
+
+    def __init__(
+        self,
+        db_path: str | None,
+        max_workers: int = 1,
+        max_pending: int = 32,
+        max_wait: float = 600.0,
+        failed_ttl: float = 86400.0,
+    ):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.gains: dict[str, float] = {}
+        # Waiting tracks, oldest first: webpage URL -> (stream URL, FFmpeg before_options, queued at).
+        self._queue: OrderedDict[str, tuple[str, str, float]] = OrderedDict()
+        self._pending: set[str] = set()
+        # Tracks FFmpeg could not measure are not retried for a day.
+        self._failed = TTLCache(maxsize=1024, ttl=failed_ttl)
+        self._tasks: set[Task] = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="loudness")
+        self._loaded = False
+        self.analysed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.analysis_time = 0.0
+
+    async def load(self):
+        if self._loaded or not self.db_path:
+            return
+        self._loaded = True
+        makedirs(path.dirname(self.db_path), exist_ok=True)
+        async with connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS track_loudness (
+                    webpage_url TEXT PRIMARY KEY,
+                    integrated REAL NOT NULL,
+                    true_peak REAL NOT NULL,
+                    gain REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            await db.commit()
+            async with db.execute("SELECT webpage_url, gain FROM track_loudness") as cursor:
+                self.gains = {row[0]: row[1] async for row in cursor}
+        logger.info("Loaded loudness for %s tracks", len(self.gains))
+
+    def gain(self, webpage_url: str) -> float | None:
+        """The gain to apply to a track, or None when it is unmeasured or too small to matter."""
+        gain = self.gains.get(webpage_url)
+        return gain if gain is not None and abs(gain) >= MIN_GAIN_DB else None
+
+    def analyse(self, webpage_url: str, stream_url: str, before_options: str = ""):
+        """Queue a measurement of a track that has not been analysed yet; a no-op without a database."""
+        if not self._loaded or webpage_url in self.gains or webpage_url in self._pending or webpage_url in self._queue:
+            return
+        if self._failed.get(webpage_url, None) is not None:
+            return
+        self._queue[webpage_url] = (stream_url, before_options, time())
+        while len(self._queue) > self.max_pending:
+            self._queue.popitem(last=False)
+            self.dropped += 1
+        if len(self._tasks) < self.max_workers:
+            task = get_running_loop().create_task(self._work())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _work(self):
+        while self._queue:
+            webpage_url, (stream_url, before_options, queued_at) = self._queue.popitem(last=False)
+            if self._stale(stream_url, queued_at):
+                self.skipped += 1
+                continue
+            await self._analyse(webpage_url, stream_url, before_options)
+
+    def _stale(self, stream_url: str, queued_at: float) -> bool:
+        now = time()
+        if now - queued_at > self.max_wait:
+            return True
+        # A signed URL has to outlive the whole measurement.
+        return (expires_at := stream_expiry(stream_url)) is not None and expires_at - now < ANALYSIS_TIMEOUT
+
+    async def _analyse(self, webpage_url: str, stream_url: str, before_options: str):
+        self._pending.add(webpage_url)
+        started = perf_counter()
+        try:
+            measured = await get_running_loop().run_in_executor(
+                self._executor, measure_loudness, stream_url, before_options
+            )
+            gain = gain_for(measured["integrated"], measured["true_peak"])
+            self.gains[webpage_url] = gain
+            async with connect(self.db_path) as db:
+                await db.execute(
+                    "INSERT OR REPLACE INTO track_loudness (webpage_url, integrated, true_peak, gain, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (webpage_url, measured["integrated"], measured["true_peak"], gain, time()),
+                )
+                await db.commit()
+            self.analysed += 1
+        except Exception as e:
+            self.failed += 1
+            self._failed.set(webpage_url, True)
+            logger.warning("Failed to measure loudness of %s: %s", webpage_url, e)
+        finally:
+            self._pending.discard(webpage_url)
+            self.analysis_time += perf_counter() - started
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "tracks": len(self.gains),
+            "pending": len(self._pending) + len(self._queue),
+            "analysed": self.analysed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "avg_analysis_s": self.analysis_time / self.analysed if self.analysed else 0.0,
+        }
+
+
+def get_loudness_cache(bot: "Sakamoto") -> LoudnessCache:
+    cache = getattr(bot, "_loudness_cache", None)
+    if cache is None:
+        cache = LoudnessCache(getattr(bot, "db_path", None))
+        setattr(bot, "_loudness_cache", cache)
+    return cache
@@ -0,0 +1,58 @@
+import logging
+from os import makedirs, path
+from typing import TYPE_CHECKING
+
+from aiosqlite import connect
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_LIMIT = 1000
+MAX_QUEUE_LIMIT = 10000
+
+
+class MusicSettings:
+    """Per-guild music settings, persisted to SQLite and served from memory."""
+
+    def __init__(self, db_path: str | None):
+        self.db_path = db_path
+        self.queue_limits: dict[int, int] = {}
+        self._loaded = False
+
+    async def load(self):
+        if self._loaded or not self.db_path:
+            return
+        self._loaded = True
+        makedirs(path.dirname(self.db_path), exist_ok=True)
+        async with connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS music_settings (
+                    guild_id INTEGER PRIMARY KEY,
+                    queue_limit INTEGER NOT NULL
+                )
+            """)
+            await db.commit()
+            async with db.execute("SELECT guild_id, queue_limit FROM music_settings") as cursor:
+                self.queue_limits = {row[0]: row[1] async for row in cursor}
+
+    def queue_limit(self, guild_id: int) -> int:
+        return self.queue_limits.get(guild_id, DEFAULT_QUEUE_LIMIT)
+
+    async def set_queue_limit(self, guild_id: int, limit: int):
+        self.queue_limits[guild_id] = limit
+        if self._loaded and self.db_path:
+            async with connect(self.db_path) as db:
+                await db.execute(
+                    "INSERT OR REPLACE INTO music_settings (guild_id, queue_limit) VALUES (?, ?)", (guild_id, limit)
+                )
+                await db.commit()
+
+
+def get_music_settings(bot: "Sakamoto") -> MusicSettings:
+    settings = getattr(bot, "_music_settings", None)
+    if settings is None:
+        settings = MusicSettings(getattr(bot, "db_path", None))
+        setattr(bot, "_music_settings", settings)
+    return settings
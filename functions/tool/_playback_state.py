@@ -0,0 +1,73 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from enum import Enum
+
+
+class PlaybackState(Enum):
+    IDLE = "idle"
+    RESOLVING = "resolving"
+    BUFFERING = "buffering"
+    PLAYING = "playing"
+    PAUSED = "paused"
+    DRAINING = "draining"
+
+
+class PlaybackEvent(Enum):
+    FIRST_FRAME = "first_frame"
+    TRACK_ENDED = "track_ended"
+
+
+_S = PlaybackState
+# Allowed target states per state; anything can fall back to IDLE on disconnect.
+TRANSITIONS: dict[PlaybackState, frozenset[PlaybackState]] = {
+    _S.IDLE: frozenset({_S.RESOLVING, _S.BUFFERING, _S.DRAINING}),
+    _S.RESOLVING: frozenset({_S.BUFFERING, _S.DRAINING, _S.IDLE}),
+    _S.BUFFERING: frozenset({_S.PLAYING, _S.PAUSED, _S.DRAINING, _S.IDLE}),
+    _S.PLAYING: frozenset({_S.PAUSED, _S.DRAINING, _S.IDLE}),
+    _S.PAUSED: frozenset({_S.PLAYING, _S.DRAINING, _S.IDLE}),
+    _S.DRAINING: frozenset({_S.RESOLVING, _S.BUFFERING, _S.IDLE}),
+}
+
+
+@dataclass
+class Timing:
+    """Running count/total/max of a duration, cheap enough to update on every transition."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+@dataclass
+class Histogram:
+    """Fixed-bucket latency histogram; `bounds` are the upper edges of the buckets, in seconds."""
+
+    bounds: tuple[float, ...] = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    counts: list[int] = field(default_factory=list)
+    timing: Timing = field(default_factory=Timing)
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.bounds) + 1)
+
+    def add(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.timing.add(seconds)
+
+    def summary(self) -> dict[str, object]:
+        buckets = {f"<={bound * 1000:.0f}ms": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["+inf"] = self.counts[-1]
+        return {**self.timing.summary(), "buckets": buckets}
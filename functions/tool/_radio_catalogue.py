@@ -0,0 +1,302 @@
+import logging
+from array import array
+from asyncio import Semaphore, gather, get_running_loop, sleep
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from heapq import nsmallest
+from os import environ, makedirs, path
+from random import choice
+from time import perf_counter, time
+from typing import TYPE_CHECKING
+from unicodedata import combining, normalize
+
+from aiosqlite import connect
+
+from ._cache import normalise_query
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+logger = logging.getLogger(__name__)
+
+PlaceLister = Callable[[], Awaitable[list[dict]]]
+StationLister = Callable[[str], Awaitable[list[tuple[str, str]]]]
+
+# How /radio balloon spreads its picks: every place equally (like the Radio Garden globe), every country
+# equally, or every station equally.
+PICK_MODES = ("place", "country", "station")
+
+
+@dataclass
+class Place:
+    place_id: str
+    title: str
+    country: str
+    size: int = 0
+    refreshed_at: float = 0.0
+
+
+@dataclass
+class Station:
+    channel_id: str
+    title: str
+    place_id: str
+    subtitle: str = ""
+    country: str = ""
+
+
+def fold(text: str) -> str:
+    """Case- and accent-insensitive search key, so `mataro radio` finds `Mataró Ràdio`."""
+    return "".join(char for char in normalize("NFKD", normalise_query(text)) if not combining(char))
+
+
+class StationIndex:
+    """Read-only search index over stations: word prefixes through a sorted list, substrings through trigrams."""
+
+    def __init__(self, stations: list[Station]):
+        self.stations = stations
+        self._labels = [fold(f"{s.title} {s.subtitle}") for s in stations]
+        self._titles = [fold(s.title) for s in stations]
+        words = sorted({(word, i) for i, label in enumerate(self._labels) for word in label.split()})
+        self._words = [word for word, _ in words]
+        self._word_ids = array("I", (i for _, i in words))
+        trigrams: dict[str, array] = {}
+        for i, label in enumerate(self._labels):
+            for gram in {label[j:j + 3] for j in range(len(label) - 2)}:
+                if (postings := trigrams.get(gram)) is None:
+                    postings = trigrams[gram] = array("I")
+                postings.append(i)
+        self._trigrams = trigrams
+        # Random picks are two O(1) draws: a group (place, country or everything), then a station in it.
+        groups: dict[str, dict[str, array]] = {mode: {} for mode in PICK_MODES}
+        for i, station in enumerate(stations):
+            for mode, key in (("place", station.place_id), ("country", station.country), ("station", "")):
+                if (members := groups[mode].get(key)) is None:
+                    members = groups[mode][key] = array("I")
+                members.append(i)
+        self._groups = {mode: list(by_key.values()) for mode, by_key in groups.items()}
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def search(self, query: str, limit: int = 5) -> list[Station]:
+        if not (q := fold(query)):
+            return []
+        if len(q) < 3:
+            lo = bisect_left(self._words, q)
+            hi = bisect_left(self._words, q + "\uffff")
+            candidates = set(self._word_ids[lo:hi])
+        else:
+            postings = sorted((self._trigrams.get(q[j:j + 3]) or array("I") for j in range(len(q) - 2)), key=len)
+            if not postings[0]:
+                return []
+            candidates = {i for i in set(postings[0]).intersection(*postings[1:]) if q in self._labels[i]}
+        # Title prefix first, then any word starting with the query, then plain substring matches.
+        padded = f" {q}"
+
+        def rank(i: int) -> tuple[int, int]:
+            if self._titles[i].startswith(q):
+                return 0, len(self._titles[i])
+            return (1 if padded in f" {self._labels[i]}" else 2), len(self._titles[i])
+
+        return [self.stations[i] for i in nsmallest(limit, candidates, key=rank)]
+
+    def pick(self, mode: str = "place") -> Station | None:
+        if not (groups := self._groups.get(mode)):
+            return None
+        return self.stations[choice(choice(groups))]
+
+
+class RadioCatalogue:
+    """Local snapshot of Radio Garden places and their stations, persisted to SQLite and refreshed incrementally.
+
+    Each refresh re-lists the places (one request) and then crawls the channel pages of at most
+    `batch` places that were never crawled or are older than `place_ttl`, so the API is only hit
+    for what changed.
+    """
+
+    def __init__(
+        self,
+        db_path: str | None,
+        *,
+        place_ttl: float = 7 * 86400,
+        batch: int = 200,
+        concurrency: int = 4,
+        interval: float = 3600.0,
+        fill_interval: float = 30.0,
+    ):
+        self.db_path = db_path
+        self.place_ttl = place_ttl
+        self.batch = batch
+        self.concurrency = concurrency
+        self.interval = interval
+        self.pick_mode = environ.get("RADIO_BALLOON_MODE", "place").lower()
+        if self.pick_mode not in PICK_MODES:
+            logger.warning("Unknown RADIO_BALLOON_MODE %r, using 'place'", self.pick_mode)
+            self.pick_mode = "place"
+        # While places are still uncrawled the catalogue fills in quicker cycles.
+        self.fill_interval = fill_interval
+        self.places: dict[str, Place] = {}
+        self.stations: dict[str, Station] = {}
+        self._by_place: dict[str, list[str]] = {}
+        self.index = StationIndex([])
+        self._loaded = False
+        self.refreshes = 0
+        self.requests = 0
+        self.last_refresh_s = 0.0
+
+    @property
+    def complete(self) -> bool:
+        """Whether every known place has been crawled at least once."""
+        return bool(self.places) and all(place.refreshed_at for place in self.places.values())
+
+    async def load(self):
+        if self._loaded or not self.db_path:
+            return
+        self._loaded = True
+        makedirs(path.dirname(self.db_path), exist_ok=True)
+        async with connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS radio_places (
+                    place_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    country TEXT NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    refreshed_at REAL NOT NULL DEFAULT 0
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS radio_stations (
+                    channel_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    place_id TEXT NOT NULL
+                )
+            """)
+            await db.commit()
+            async with db.execute("SELECT place_id, title, country, size, refreshed_at FROM radio_places") as cursor:
+                self.places = {row[0]: Place(*row) async for row in cursor}
+            async with db.execute("SELECT channel_id, title, place_id FROM radio_stations") as cursor:
+                stations = [row async for row in cursor]
+        for channel_id, title, place_id in stations:
+            self._add_station(channel_id, title, place_id)
+        await self._rebuild()
+        logger.info("Loaded %s radio stations in %s places", len(self.stations), len(self.places))
+
+    def search(self, query: str, limit: int = 5) -> list[Station]:
+        return self.index.search(query, limit)
+
+    def get(self, channel_id: str) -> Station | None:
+        return self.stations.get(channel_id)
+
+    def pick(self) -> Station | None:
+        """A random station, or None while the catalogue is still empty."""
+        return self.index.pick(self.pick_mode)
+
+    async def run(self, list_places: PlaceLister, list_stations: StationLister):
+        """Refresh forever; meant to run as a background task owned by the radio cog."""
+        while True:
+            try:
+                await self.refresh(list_places, list_stations)
+            except Exception as e:
+                logger.warning("Radio catalogue refresh failed: %s", e)
+            await sleep(self.interval if self.complete else self.fill_interval)
+
+    async def refresh(self, list_places: PlaceLister, list_stations: StationLister):
+        started = perf_counter()
+        self.requests += 1
+        for raw in await list_places():
+            if not (place_id := raw.get("id")):
+                continue
+            title, country, size = str(raw.get("title") or ""), str(raw.get("country") or ""), int(raw.get("size") or 0)
+            if (place := self.places.get(place_id)) is None:
+                self.places[place_id] = Place(place_id, title, country, size)
+            else:
+                place.title, place.country, place.size = title, country, size
+
+        now = time()
+        due = sorted(
+            (place for place in self.places.values() if now - place.refreshed_at > self.place_ttl),
+            key=lambda place: place.refreshed_at,
+        )[: self.batch]
+        semaphore = Semaphore(self.concurrency)
+
+        async def crawl(place: Place) -> list[tuple[str, str]] | None:
+            async with semaphore:
+                self.requests += 1
+                try:
+                    return await list_stations(place.place_id)
+                except Exception as e:
+                    logger.debug("Failed to list stations of place %s: %s", place.place_id, e)
+                    return None
+
+        crawled = []
+        for place, found in zip(due, await gather(*(crawl(place) for place in due))):
+            if found is None:
+                continue
+            for channel_id in self._by_place.pop(place.place_id, []):
+                self.stations.pop(channel_id, None)
+            for channel_id, title in found:
+                self._add_station(channel_id, title, place.place_id)
+            place.refreshed_at = now
+            crawled.append(place)
+        if crawled:
+            await self._rebuild()
+        await self._persist(crawled)
+        self.refreshes += 1
+        self.last_refresh_s = perf_counter() - started
+        logger.info(
+            "Radio catalogue refreshed %s places in %.1fs (%s stations, %s places)",
+            len(crawled), self.last_refresh_s, len(self.stations), len(self.places),
+        )
+
+    def _add_station(self, channel_id: str, title: str, place_id: str):
+        if (previous := self.stations.get(channel_id)) is not None:
+            if previous.place_id == place_id:
+                previous.title = title
+                return
+            # Stations listed under several places keep the most recent one.
+            if (ids := self._by_place.get(previous.place_id)) is not None and channel_id in ids:
+                ids.remove(channel_id)
+        self.stations[channel_id] = Station(channel_id, title, place_id)
+        self._by_place.setdefault(place_id, []).append(channel_id)
+
+    async def _rebuild(self):
+        for station in self.stations.values():
+            if (place := self.places.get(station.place_id)) is not None:
+                station.subtitle = ", ".join(part for part in (place.title, place.country) if part)
+                station.country = place.country
+        # Indexing tens of thousands of stations takes about a second, so it is built off the event loop.
+        self.index = await get_running_loop().run_in_executor(None, StationIndex, list(self.stations.values()))
+
+    async def _persist(self, crawled: list[Place]):
+        if not self._loaded or not self.db_path:
+            return
+        try:
+            async with connect(self.db_path) as db:
+                await db.executemany(
+                    "INSERT INTO radio_places (place_id, title, country, size, refreshed_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(place_id) DO UPDATE SET title = excluded.title, country = excluded.country, "
+                    "size = excluded.size, refreshed_at = excluded.refreshed_at",
+                    [(p.place_id, p.title, p.country, p.size, p.refreshed_at) for p in self.places.values()],
+                )
+                for place in crawled:
+                    await db.execute("DELETE FROM radio_stations WHERE place_id = ?", (place.place_id,))
+                    await db.executemany(
+                        "INSERT OR REPLACE INTO radio_stations (channel_id, title, place_id) VALUES (?, ?, ?)",
+                        [
+                            (channel_id, self.stations[channel_id].title, place.place_id)
+                            for channel_id in self._by_place.get(place.place_id, [])
+                        ],
+                    )
+                await db.commit()
+        except Exception as e:
+            logger.warning("Failed to persist the radio catalogue: %s", e)
+
+
+def get_radio_catalogue(bot: "Sakamoto") -> RadioCatalogue:
+    catalogue = getattr(bot, "_radio_catalogue", None)
+    if catalogue is None:
+        catalogue = RadioCatalogue(getattr(bot, "db_path", None))
+        setattr(bot, "_radio_catalogue", catalogue)
+    return catalogue
@@ -0,0 +1,245 @@
+import logging
+from asyncio import Lock, Task, create_task, sleep
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from os import makedirs, path
+from time import time
+from typing import TYPE_CHECKING
+
+from aiosqlite import connect
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SavedTrack:
+    source_url: str
+    title: str
+    duration: str
+    # Name of the registered stream resolver (see AudioEngine.resolvers); None for live streams.
+    resolver: str | None = None
+    stream_url: str | None = None
+    acodec: str | None = None
+
+
+@dataclass
+class Checkpoint:
+    guild_id: int
+    current: SavedTrack | None = None
+    offset: float = 0.0
+    queue: list[SavedTrack] = field(default_factory=list)
+    updated_at: float = field(default_factory=time)
+
+
+class SessionStore:
+    """Batched SQLite checkpoints of guild playback sessions, restored lazily per guild."""
+
+    def __init__(self, db_path: str | None, flush_interval: float = 5.0, max_age: float = 6 * 3600):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        # Older checkpoints are dropped instead of restored; nobody is waiting in that channel any more.
+        self.max_age = max_age
+        self.snapshot: Callable[[int], Checkpoint | None] | None = None
+        self.position: Callable[[int], float | None] | None = None
+        # Guilds whose playback offset goes stale on its own; their offset is refreshed after every flush.
+        self.active: Callable[[], Iterable[int]] | None = None
+        self.dirty: set[int] = set()
+        # Guilds whose queue is unchanged and only need their offset updated.
+        self.moved: set[int] = set()
+        self._loaded = False
+        self._timer: Task | None = None
+        # Serialises writes, so a delete can never be overwritten by a flush that snapshotted the guild earlier.
+        self._lock = Lock()
+        self.flushes = 0
+        self.rows_written = 0
+
+    async def load(self):
+        if self._loaded or not self.db_path:
+            return
+        self._loaded = True
+        makedirs(path.dirname(self.db_path), exist_ok=True)
+        async with connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS playback_sessions (
+                    guild_id INTEGER PRIMARY KEY,
+                    source_url TEXT,
+                    title TEXT,
+                    duration TEXT,
+                    resolver TEXT,
+                    stream_url TEXT,
+                    offset REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    acodec TEXT
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS playback_queue (
+                    guild_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    source_url TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    duration TEXT NOT NULL,
+                    resolver TEXT,
+                    stream_url TEXT,
+                    acodec TEXT,
+                    PRIMARY KEY (guild_id, position)
+                )
+            """)
+            for table in ("playback_sessions", "playback_queue"):
+                async with db.execute(f"PRAGMA table_info({table})") as cursor:
+                    if "acodec" not in {row[1] for row in await cursor.fetchall()}:
+                        await db.execute(f"ALTER TABLE {table} ADD COLUMN acodec TEXT")
+            await db.commit()
+
+    def mark(self, guild_id: int):
+        """Schedule a checkpoint of the guild; every guild marked within one interval is written together."""
+        if not self._loaded:
+            return
+        self.dirty.add(guild_id)
+        self._schedule()
+
+    def mark_position(self, guild_id: int):
+        """Schedule an update of just the guild's playback offset, leaving its stored queue alone."""
+        if not self._loaded:
+            return
+        self.moved.add(guild_id)
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is None or self._timer.done():
+            self._timer = create_task(self._flush_later())
+
+    def forget(self, guild_id: int):
+        """Drop a pending checkpoint so whatever is already stored is kept as-is."""
+        self.dirty.discard(guild_id)
+        self.moved.discard(guild_id)
+
+    async def delete(self, guild_id: int):
+        """Drop the guild's checkpoint right away, so a /play straight after /stop cannot restore it."""
+        self.forget(guild_id)
+        if not self._loaded or not self.db_path:
+            return
+        try:
+            async with self._lock, connect(self.db_path) as db:
+                await db.execute("DELETE FROM playback_queue WHERE guild_id = ?", (guild_id,))
+                await db.execute("DELETE FROM playback_sessions WHERE guild_id = ?", (guild_id,))
+                await db.commit()
+        except Exception as e:
+            logger.warning("Failed to delete the checkpoint of guild %s: %s", guild_id, e)
+
+    async def _flush_later(self):
+        await sleep(self.flush_interval)
+        await self.flush()
+        self._timer = None
+        if self.active is not None:
+            for guild_id in self.active():
+                self.mark_position(guild_id)
+        if self.dirty or self.moved:
+            self._schedule()
+
+    async def flush(self):
+        if not (self.dirty or self.moved) or self.snapshot is None or not self.db_path:
+            return
+        async with self._lock:
+            await self._write()
+
+    async def _write(self):
+        guild_ids, self.dirty = self.dirty, set()
+        moved, self.moved = self.moved - guild_ids, set()
+        # Snapshots are taken synchronously on the loop, so each guild is written in a consistent state.
+        snapshots = [(guild_id, self.snapshot(guild_id)) for guild_id in guild_ids]
+        positions = [
+            (guild_id, offset)
+            for guild_id in moved
+            if self.position is not None and (offset := self.position(guild_id)) is not None
+        ]
+        try:
+            async with connect(self.db_path) as db:
+                for guild_id, checkpoint in snapshots:
+                    await db.execute("DELETE FROM playback_queue WHERE guild_id = ?", (guild_id,))
+                    if checkpoint is None:
+                        await db.execute("DELETE FROM playback_sessions WHERE guild_id = ?", (guild_id,))
+                        continue
+                    current = checkpoint.current
+                    await db.execute(
+                        "INSERT OR REPLACE INTO playback_sessions "
+                        "(guild_id, source_url, title, duration, resolver, stream_url, acodec, offset, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            guild_id,
+                            current and current.source_url,
+                            current and current.title,
+                            current and current.duration,
+                            current and current.resolver,
+                            current and current.stream_url,
+                            current and current.acodec,
+                            checkpoint.offset,
+                            checkpoint.updated_at,
+                        ),
+                    )
+                    await db.executemany(
+                        "INSERT INTO playback_queue "
+                        "(guild_id, position, source_url, title, duration, resolver, stream_url, acodec) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (guild_id, position, t.source_url, t.title, t.duration, t.resolver, t.stream_url, t.acodec)
+                            for position, t in enumerate(checkpoint.queue)
+                        ],
+                    )
+                    self.rows_written += 1 + len(checkpoint.queue)
+                for guild_id, offset in positions:
+                    cursor = await db.execute(
+                        "UPDATE playback_sessions SET offset = ?, updated_at = ? WHERE guild_id = ?",
+                        (offset, time(), guild_id),
+                    )
+                    if cursor.rowcount:
+                        self.rows_written += 1
+                    else:
+                        # Never checkpointed in full yet, so the next flush writes all of it.
+                        self.dirty.add(guild_id)
+                await db.commit()
+            self.flushes += 1
+        except Exception as e:
+            logger.warning("Failed to checkpoint playback sessions: %s", e)
+            self.dirty |= guild_ids
+            self.moved |= moved
+
+    async def restore(self, guild_id: int) -> Checkpoint | None:
+        if not self._loaded or not self.db_path:
+            return None
+        async with connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT source_url, title, duration, resolver, stream_url, acodec, offset, updated_at "
+                "FROM playback_sessions WHERE guild_id = ?",
+                (guild_id,),
+            ) as cursor:
+                if (row := await cursor.fetchone()) is None:
+                    return None
+            async with db.execute(
+                "SELECT source_url, title, duration, resolver, stream_url, acodec FROM playback_queue "
+                "WHERE guild_id = ? ORDER BY position",
+                (guild_id,),
+            ) as cursor:
+                queue = [SavedTrack(*r) async for r in cursor]
+        if time() - row[7] > self.max_age:
+            logger.info("Dropping the stale checkpoint of guild %s", guild_id)
+            await self.delete(guild_id)
+            return None
+        current = SavedTrack(*row[:6]) if row[0] else None
+        return Checkpoint(guild_id, current, row[6], queue, row[7])
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        await self.flush()
+
+
+def get_session_store(bot: "Sakamoto") -> SessionStore:
+    store = getattr(bot, "_session_store", None)
+    if store is None:
+        store = SessionStore(getattr(bot, "db_path", None))
+        setattr(bot, "_session_store", store)
+    return store
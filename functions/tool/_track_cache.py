@@ -0,0 +1,188 @@
+import logging
+from asyncio import Task, get_running_loop
+from collections import OrderedDict
+from dataclasses import astuple, dataclass
+from os import makedirs, path
+from time import time
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qs, urlparse
+
+from aiosqlite import connect
+
+if TYPE_CHECKING:
+    from main import Sakamoto
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedTrack:
+    webpage_url: str
+    title: str
+    duration: str
+    stream_url: str | None
+    expires_at: float | None
+    updated_at: float
+    acodec: str | None = None
+
+
+def stream_expiry(stream_url: str | None) -> float | None:
+    """Return the UNIX expiry embedded in a signed stream URL (`?expire=` or `/expire/<ts>/`), if any."""
+    if not stream_url:
+        return None
+    parsed = urlparse(stream_url)
+    if values := parse_qs(parsed.query).get("expire"):
+        raw = values[0]
+    else:
+        segments = parsed.path.split("/")
+        if "expire" not in segments or (index := segments.index("expire") + 1) >= len(segments):
+            return None
+        raw = segments[index]
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+class TrackCache:
+    """Resolved track metadata and signed stream URLs, persisted to SQLite for warm restarts."""
+
+    def __init__(
+        self,
+        db_path: str | None,
+        maxsize: int = 2048,
+        refresh_margin: float = 300.0,
+        unsigned_ttl: float = 1800.0,
+        max_age: float = 30 * 86400,
+        prune_every: int = 256,
+    ):
+        self.db_path = db_path
+        self.maxsize = maxsize
+        self.refresh_margin = refresh_margin
+        self.unsigned_ttl = unsigned_ttl
+        # Rows untouched for `max_age` or beyond the newest `maxsize` are deleted on load and every `prune_every` stores.
+        self.max_age = max_age
+        self.prune_every = prune_every
+        self._tracks: OrderedDict[str, CachedTrack] = OrderedDict()
+        self._tasks: set[Task] = set()
+        self._stores = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        if self._loaded or not self.db_path:
+            return
+        self._loaded = True
+        makedirs(path.dirname(self.db_path), exist_ok=True)
+        async with connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS track_cache (
+                    webpage_url TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    duration TEXT NOT NULL,
+                    stream_url TEXT,
+                    expires_at REAL,
+                    updated_at REAL NOT NULL,
+                    acodec TEXT
+                )
+            """)
+            async with db.execute("PRAGMA table_info(track_cache)") as cursor:
+                if "acodec" not in {row[1] for row in await cursor.fetchall()}:
+                    await db.execute("ALTER TABLE track_cache ADD COLUMN acodec TEXT")
+            await db.execute("CREATE INDEX IF NOT EXISTS track_cache_updated_at ON track_cache (updated_at)")
+            await self._prune(db)
+            await db.commit()
+            async with db.execute(
+                "SELECT webpage_url, title, duration, stream_url, expires_at, updated_at, acodec "
+                "FROM track_cache ORDER BY updated_at DESC LIMIT ?",
+                (self.maxsize,),
+            ) as cursor:
+                rows = await cursor.fetchall()
+        for row in reversed(rows):
+            self._tracks[row[0]] = CachedTrack(*row)
+        logger.info("Loaded %s cached tracks", len(rows))
+
+    def get(self, webpage_url: str) -> CachedTrack | None:
+        if (track := self._tracks.get(webpage_url)) is None:
+            return None
+        self._tracks.move_to_end(webpage_url)
+        return track
+
+    def fresh(self, webpage_url: str) -> CachedTrack | None:
+        """Return the cached track only while its stream URL is comfortably before expiry."""
+        track = self.get(webpage_url)
+        if track is None or not track.stream_url or self._expires_soon(track):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return track
+
+    def invalidate(self, webpage_url: str):
+        """Forget a stream URL that failed mid-playback so the next lookup re-extracts it."""
+        if (track := self._tracks.pop(webpage_url, None)) is None or not self._loaded or not self.db_path:
+            return
+        task = get_running_loop().create_task(self._delete(webpage_url, track.updated_at))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _delete(self, webpage_url: str, updated_at: float):
+        try:
+            async with connect(self.db_path) as db:
+                # A row stored again after the invalidation is newer and is left alone.
+                await db.execute(
+                    "DELETE FROM track_cache WHERE webpage_url = ? AND updated_at <= ?", (webpage_url, updated_at)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning("Failed to delete cached track %s: %s", webpage_url, e)
+
+    async def _prune(self, db):
+        now = time()
+        await db.execute("DELETE FROM track_cache WHERE updated_at < ?", (now - self.max_age,))
+        await db.execute(
+            "DELETE FROM track_cache WHERE webpage_url NOT IN "
+            "(SELECT webpage_url FROM track_cache ORDER BY updated_at DESC LIMIT ?)",
+            (self.maxsize,),
+        )
+        # Expired signed URLs are long and useless; the title and duration stay for lookups.
+        await db.execute(
+            "UPDATE track_cache SET stream_url = NULL WHERE stream_url IS NOT NULL AND expires_at < ?", (now,)
+        )
+
+    def _expires_soon(self, track: CachedTrack) -> bool:
+        expires_at = track.expires_at if track.expires_at is not None else track.updated_at + self.unsigned_ttl
+        return expires_at - time() <= self.refresh_margin
+
+    async def store(
+        self, webpage_url: str, title: str, duration: str, stream_url: str | None, acodec: str | None = None
+    ) -> CachedTrack:
+        track = CachedTrack(webpage_url, title, duration, stream_url, stream_expiry(stream_url), time(), acodec)
+        self._tracks[webpage_url] = track
+        self._tracks.move_to_end(webpage_url)
+        while len(self._tracks) > self.maxsize:
+            self._tracks.popitem(last=False)
+        if self._loaded and self.db_path:
+            try:
+                async with connect(self.db_path) as db:
+                    await db.execute(
+                        "INSERT OR REPLACE INTO track_cache "
+                        "(webpage_url, title, duration, stream_url, expires_at, updated_at, acodec) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        astuple(track),
+                    )
+                    self._stores += 1
+                    if self._stores % self.prune_every == 0:
+                        await self._prune(db)
+                    await db.commit()
+            except Exception as e:
+                logger.warning("Failed to persist cached track %s: %s", webpage_url, e)
+        return track
+
+
+def get_track_cache(bot: "Sakamoto") -> TrackCache:
+    cache = getattr(bot, "_track_cache", None)
+    if cache is None:
+        cache = TrackCache(getattr(bot, "db_path", None))
+        setattr(bot, "_track_cache", cache)
+    return cache
@@ -0,0 +1,189 @@
+from collections import deque
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from random import shuffle
+from typing import Generic, TypeVar, overload
+
+T = TypeVar("T")
+
+
+class TrackQueue(Generic[T]):
+    """Blocked list for large guild queues.
+
+    Items live in deques of at most `2 * block_size` entries, with a Fenwick tree over the block
+    lengths. Appending and popping the head are O(1) amortized. Indexing, slicing and
+    removing/moving by position cost O(log n + block_size) instead of O(n).
+    """
+
+    def __init__(self, items: Iterable[T] = (), block_size: int = 128):
+        self.block_size = block_size
+        self._blocks: list[deque[T]] = [deque()]
+        self._tree: list[int] = [0, 0]
+        self._len = 0
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator[T]:
+        for block in self._blocks:
+            yield from block
+
+    def __repr__(self) -> str:
+        return f"TrackQueue(len={self._len})"
+
+    @overload
+    def __getitem__(self, index: int) -> T: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[T]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return list(islice(self, start, stop, step))
+            return self._slice(start, stop)
+        if index == 0 and self._len:
+            return self._blocks[0][0]
+        block, offset = self._locate(index)
+        return self._blocks[block][offset]
+
+    def append(self, item: T):
+        self._blocks[-1].append(item)
+        self._len += 1
+        self._add(len(self._blocks) - 1, 1)
+        if len(self._blocks[-1]) > 2 * self.block_size:
+            self._split(len(self._blocks) - 1)
+
+    def extend(self, items: Iterable[T]):
+        """Bulk append; the index is rebuilt once at the end."""
+        last = self._blocks[-1]
+        added = 0
+        for item in items:
+            if len(last) >= 2 * self.block_size:
+                last = deque()
+                self._blocks.append(last)
+            last.append(item)
+            added += 1
+        if added:
+            self._len += added
+            self._rebuild()
+
+    def insert_many(self, index: int, items: Iterable[T]):
+        """Bulk insert at `index` (clamped to the queue bounds), keeping the given order."""
+        items = list(items)
+        if not items:
+            return
+        index = max(0, index)
+        if index >= self._len:
+            self.extend(items)
+            return
+        block, offset = self._locate(index)
+        target = self._blocks[block]
+        tail = [target.pop() for _ in range(len(target) - offset)]
+        target.extend(items)
+        target.extend(reversed(tail))
+        self._len += len(items)
+        if len(target) > 2 * self.block_size:
+            self._split(block)
+        else:
+            self._add(block, len(items))
+
+    def popleft(self) -> T:
+        if not self._len:
+            raise IndexError("pop from an empty TrackQueue")
+        item = self._blocks[0].popleft()
+        self._len -= 1
+        self._add(0, -1)
+        if not self._blocks[0] and len(self._blocks) > 1:
+            del self._blocks[0]
+            self._rebuild()
+        return item
+
+    def pop(self, index: int) -> T:
+        """Remove and return the item at `index`."""
+        if index == 0:
+            return self.popleft()
+        block, offset = self._locate(index)
+        target = self._blocks[block]
+        item = target[offset]
+        del target[offset]
+        self._len -= 1
+        if not target and len(self._blocks) > 1:
+            del self._blocks[block]
+            self._rebuild()
+        else:
+            self._add(block, -1)
+        return item
+
+    def move(self, source: int, target: int) -> T:
+        """Move the item at `source` so it ends up at position `target`."""
+        if not 0 <= target < self._len:
+            raise IndexError("TrackQueue index out of range")
+        item = self.pop(source)
+        self.insert_many(target, (item,))
+        return item
+
+    def clear(self):
+        self._blocks = [deque()]
+        self._len = 0
+        self._rebuild()
+
+    def shuffle(self):
+        items = list(self)
+        shuffle(items)
+        self.clear()
+        self.extend(items)
+
+    def _slice(self, start: int, stop: int) -> list[T]:
+        if start >= stop:
+            return []
+        block, offset = self._locate(start)
+        result: list[T] = []
+        remaining = stop - start
+        while remaining > 0 and block < len(self._blocks):
+            chunk = list(islice(self._blocks[block], offset, offset + remaining))
+            result.extend(chunk)
+            remaining -= len(chunk)
+            block += 1
+            offset = 0
+        return result
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("TrackQueue index out of range")
+        # Fenwick descent: find the block whose cumulative size first exceeds `index`.
+        position = 0
+        step = 1 << (len(self._blocks).bit_length())
+        while step:
+            if (nxt := position + step) <= len(self._blocks) and self._tree[nxt] <= index:
+                position = nxt
+                index -= self._tree[nxt]
+            step >>= 1
+        return position, index
+
+    def _add(self, block: int, delta: int):
+        block += 1
+        while block < len(self._tree):
+            self._tree[block] += delta
+            block += block & -block
+
+    def _split(self, block: int):
+        items = list(self._blocks[block])
+        chunks = [deque(items[i:i + self.block_size]) for i in range(0, len(items), self.block_size)]
+        self._blocks[block:block + 1] = chunks
+        self._rebuild()
+
+    def _rebuild(self):
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, start=1):
+            tree[i] += len(block)
+            if (parent := i + (i & -i)) <= len(self._blocks):
+                tree[parent] += tree[i]
+        self._tree = tree
@@ -1,17 +1,41 @@
-from asyncio import get_running_loop
-from collections import deque
-from random import shuffle
+import logging
+from asyncio import AbstractEventLoop, Queue, create_task, get_running_loop
+from math import ceil
+from threading import Event
+from time import perf_counter
 from typing import TYPE_CHECKING
 
 from discord import Embed, Interaction, Member, VoiceState, app_commands
 from discord.ext import commands
-from yt_dlp import YoutubeDL
 
-from ._audio_engine import get_audio_engine
+from ._audio_engine import QueueItem, ResolvedStream, format_duration, get_audio_engine, parse_duration
+from ._autocomplete import AutocompleteDebouncer
+from ._cache import get_suggestion_cache
+from ._extraction_scheduler import Priority
+from ._extractor_pool import get_extractor_pool
+from ._music_settings import MAX_QUEUE_LIMIT
+from ._track_cache import CachedTrack, get_track_cache
 
 if TYPE_CHECKING:
     from main import Sakamoto
 
+logger = logging.getLogger(__name__)
+
+# Playlist entries are handed from the listing thread to the event loop in batches of this size.
+PLAYLIST_BATCH = 50
+
+
+def entry_url(entry: dict) -> str:
+    """Best watch URL for a (possibly flat) yt-dlp entry."""
+    if value := str(entry.get("webpage_url") or "").strip():
+        return value
+    fallback = str(entry.get("url") or "").strip()
+    if fallback and "://" in fallback:
+        return fallback
+    if fallback:
+        return f"https://www.youtube.com/watch?v={fallback}"
+    return ""
+
 
 class MusicCog(commands.Cog):
     """Cog for music playback and shared audio controls."""
@@ -30,17 +54,31 @@ class MusicCog(commands.Cog):
             "source_address": "0.0.0.0",
             "extract_flat": False,
         }
+        self.extract_pool = get_extractor_pool(bot, "extract", self.ydl_opts)
+        self.search_pool = get_extractor_pool(bot, "search", {**self.ydl_opts, "extract_flat": True})
+        self.playlist_pool = get_extractor_pool(
+            bot,
+            "playlist",
+            {**self.ydl_opts, "noplaylist": False, "extract_flat": "in_playlist", "lazy_playlist": True},
+            size=2,
+        )
+        self.autocomplete = AutocompleteDebouncer(cache=get_suggestion_cache(bot), namespace="play")
+        self.track_cache = get_track_cache(bot)
+        self.engine.resolvers["track"] = self.refresh_stream_url
 
-    async def play_query_autocomplete(self, _interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
+    async def play_query_autocomplete(self, interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
         query = current.strip()
         if len(query) < 2:
             return []
 
-        try:
-            info = await get_running_loop().run_in_executor(None, self.search_source_autocomplete, query)
-        except Exception:
-            return []
+        return await self.autocomplete.complete(
+            interaction.user.id, query, lambda q: self.search_play_choices(q, interaction.guild_id)
+        )
 
+    async def search_play_choices(self, query: str, guild_id: int | None) -> list[app_commands.Choice[str]]:
+        info = await self.engine.extractor.run(
+            self.search_source_autocomplete, query, priority=Priority.AUTOCOMPLETE, guild_id=guild_id
+        )
         entries = info.get("entries") if isinstance(info, dict) else None
         if not entries:
             return []
@@ -51,13 +89,7 @@ class MusicCog(commands.Cog):
             if not isinstance(entry, dict):
                 continue
             title = str(entry.get("title") or "Unknown Title").strip()
-            value = str(entry.get("webpage_url") or "").strip()
-            if not value:
-                fallback = str(entry.get("url") or "").strip()
-                if fallback and "://" in fallback:
-                    value = fallback
-                elif fallback:
-                    value = f"https://www.youtube.com/watch?v={fallback}"
+            value = entry_url(entry)
             if not value:
                 value = title
             if len(value) > 100:
@@ -72,7 +104,8 @@ class MusicCog(commands.Cog):
 
     @app_commands.command(name="play", description="Play a song or audio. Provide a search term or URL.")
     @app_commands.autocomplete(query=play_query_autocomplete)
-    async def play(self, interaction: Interaction, query: str):
+    @app_commands.describe(playlist="Queue every track of a playlist URL instead of just one.")
+    async def play(self, interaction: Interaction, query: str, playlist: bool = False):
         if not query:
             await interaction.response.send_message(":x: You must provide a search term or URL.", ephemeral=True)
             return
@@ -93,55 +126,169 @@ class MusicCog(commands.Cog):
         if channel is None or not hasattr(channel, "send"):
             await interaction.followup.send(":x: This command must be used in a text channel.", ephemeral=True)
             return
-        self.engine.command_channels[guild_id] = channel
+        self.engine.session(guild_id).command_channel = channel
+
+        if playlist:
+            await self.import_playlist(interaction, guild_id, query)
+            return
 
         try:
-            info = await get_running_loop().run_in_executor(None, self.search_source, query)
-            if not info:
-                raise ValueError("Failed to extract information.")
-            if "entries" in info:
-                if not info["entries"]:
-                    raise ValueError("No results found.")
-                info = info["entries"][0]
-            stream_url = info.get("url")
-            if not (webpage_url := info.get("webpage_url")):
-                raise ValueError("No webpage URL found.")
+            track = await self.resolve_track(query, priority=Priority.PLAY, guild_id=guild_id)
         except Exception as e:
             await interaction.followup.send(f":x: Failed to retrieve video. Error: {e}", ephemeral=True)
             return
 
-        title = info.get("title", "Unknown Title")
-        duration = info.get("duration_string", "N/A")
         await self.engine.enqueue_or_play(
             guild_id,
-            source_url=webpage_url,
-            title=title,
-            duration=duration,
-            stream_url=stream_url,
+            source_url=track.webpage_url,
+            title=track.title,
+            duration=track.duration,
+            stream_url=track.stream_url,
             followup=interaction.followup.send,
             refresh_stream=self.refresh_stream_url,
+            acodec=track.acodec,
         )
 
-    def search_source(self, query: str):
-        with YoutubeDL(self.ydl_opts) as ydl:
-            return ydl.extract_info(query, download=False)
+    async def import_playlist(self, interaction: Interaction, guild_id: int, url: str):
+        """Queue a playlist while it is still being listed; tracks are fully extracted when they near the head."""
+        batches: Queue[list[dict] | None] = Queue()
+        stop = Event()
+        started = perf_counter()
+        listing = create_task(
+            self.engine.extractor.run(
+                self.list_playlist, url, get_running_loop(), batches, stop, priority=Priority.PLAY, guild_id=guild_id
+            )
+        )
+        queued = 0
+        full = stopped = False
+        try:
+            while (batch := await batches.get()) is not None:
+                items = [self.playlist_item(entry) for entry in batch if isinstance(entry, dict) and entry_url(entry)]
+                if not queued and items:
+                    first = items.pop(0)
+                    # The first track starts (or queues) right away, like a normal /play.
+                    await self.engine.enqueue_or_play(
+                        guild_id,
+                        source_url=first.source_url,
+                        title=first.title,
+                        duration=first.duration,
+                        stream_url=None,
+                        followup=interaction.followup.send,
+                        refresh_stream=self.refresh_stream_url,
+                        acodec=first.acodec,
+                    )
+                    queued = 1
+                added = self.engine.enqueue_many(guild_id, items)
+                queued += added
+                if added < len(items):
+                    # Nothing is accepted either once the session is gone, e.g. after /stop mid-import.
+                    if (session := self.engine.sessions.get(guild_id)) is None or session.closed:
+                        stopped = True
+                    else:
+                        full = True
+                    break
+        finally:
+            stop.set()
 
-    def search_source_autocomplete(self, query: str):
-        opts = dict(self.ydl_opts)
-        opts["extract_flat"] = True
-        with YoutubeDL(opts) as ydl:
-            return ydl.extract_info(f"ytsearch5:{query}", download=False)
+        try:
+            title = await listing
+        except Exception as e:
+            await interaction.followup.send(f":x: Failed to read playlist. Error: {e}", ephemeral=True)
+            return
+        if stopped:
+            logger.info("Playlist import in guild %s stopped after %s tracks: the session was closed", guild_id, queued)
+            return
+        if not queued:
+            await interaction.followup.send(":x: No playable tracks found in that playlist.", ephemeral=True)
+            return
+
+        elapsed = perf_counter() - started
+        logger.info("Imported %s playlist entries in guild %s in %.2fs (%.0f/s)", queued, guild_id, elapsed, queued / elapsed)
+        message = f":notebook_with_decorative_cover: Queued **{queued}** tracks from **{title or url}** in {elapsed:.1f}s."
+        if full:
+            message += " The queue limit was reached, so the rest were skipped."
+        await interaction.followup.send(message)
+
+    def list_playlist(self, url: str, loop: AbstractEventLoop, batches: Queue, stop: Event) -> str | None:
+        """Blocking: flat-list a playlist page by page, handing entries to the event loop as they arrive."""
+        batch: list[dict] = []
+        sent = 0
+
+        def flush():
+            nonlocal batch, sent
+            loop.call_soon_threadsafe(batches.put_nowait, batch)
+            sent += len(batch)
+            batch = []
+
+        try:
+            with self.playlist_pool.checkout() as ydl:
+                info = ydl.extract_info(url, download=False, process=False)
+                if info and info.get("_type") in {"url", "url_transparent"}:
+                    info = ydl.extract_info(info["url"], download=False, process=False)
+                if not info:
+                    raise ValueError("Failed to extract information.")
+                entries = info.get("entries")
+                for entry in [info] if entries is None else entries:
+                    if stop.is_set():
+                        break
+                    batch.append(entry)
+                    # The first entry goes out on its own so playback does not wait for a full page.
+                    if not sent or len(batch) >= PLAYLIST_BATCH:
+                        flush()
+                return info.get("title")
+        finally:
+            if batch:
+                flush()
+            loop.call_soon_threadsafe(batches.put_nowait, None)
+
+    def playlist_item(self, entry: dict) -> QueueItem:
+        return QueueItem(
+            entry_url(entry),
+            str(entry.get("title") or "Unknown Title"),
+            format_duration(entry.get("duration")),
+            refresh_stream=self.refresh_stream_url,
+            acodec=entry.get("acodec"),
+        )
 
-    async def refresh_stream_url(self, source_url: str) -> str | None:
-        info = await get_running_loop().run_in_executor(None, self.search_source, source_url)
+    async def resolve_track(self, query: str, *, priority: Priority, guild_id: int | None = None) -> CachedTrack:
+        if (cached := self.track_cache.fresh(query)) is not None:
+            return cached
+
+        info = await self.engine.extractor.run(self.search_source, query, priority=priority, guild_id=guild_id)
+        if not info:
+            raise ValueError("Failed to extract information.")
         if "entries" in info:
             if not info["entries"]:
-                raise ValueError("No results found while refreshing stream URL.")
+                raise ValueError("No results found.")
             info = info["entries"][0]
-        return info.get("url")
+        if not (webpage_url := info.get("webpage_url")):
+            raise ValueError("No webpage URL found.")
+        return await self.track_cache.store(
+            webpage_url,
+            info.get("title", "Unknown Title"),
+            info.get("duration_string", "N/A"),
+            info.get("url"),
+            info.get("acodec"),
+        )
+
+    def search_source(self, query: str):
+        return self.extract_pool.extract_info(query)
+
+    def search_source_autocomplete(self, query: str):
+        return self.search_pool.extract_info(f"ytsearch5:{query}")
+
+    async def refresh_stream_url(self, source_url: str) -> ResolvedStream:
+        track = await self.resolve_track(source_url, priority=Priority.PLAYBACK)
+        return ResolvedStream(track.stream_url, track.acodec)
+
+    async def cog_load(self):
+        await self.track_cache.load()
+        await self.engine.settings.load()
+        await self.engine.loudness.load()
+        await self.engine.checkpoints.load()
 
-    def cog_unload(self):
-        self.engine.unload()
+    async def cog_unload(self):
+        await self.engine.shutdown()
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: Member, before: VoiceState, after: VoiceState):
@@ -154,18 +301,18 @@ class MusicCog(commands.Cog):
             return
         if await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id) is None:
             return
-        await self.engine.disconnect_and_cleanup(guild_id)
+        # Replied to first: clearing the checkpoint may wait behind a flush in progress.
         await interaction.response.send_message(":stop_button: Stopped and disconnected.")
+        await self.engine.disconnect_and_cleanup(guild_id)
 
     @app_commands.command(name="pause", description="Pause the currently playing audio.")
     async def pause(self, interaction: Interaction):
         if (guild_id := interaction.guild_id) is None:
             await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
             return
-        if (vc := await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id)) is None:
+        if await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id) is None:
             return
-        if vc.is_playing():
-            vc.pause()
+        if self.engine.pause(guild_id):
             await interaction.response.send_message(":pause_button: Playback paused.")
         else:
             await interaction.response.send_message(":x: Nothing is currently playing.", ephemeral=True)
@@ -175,32 +322,32 @@ class MusicCog(commands.Cog):
         if (guild_id := interaction.guild_id) is None:
             await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
             return
-        if (vc := await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id)) is None:
+        if await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id) is None:
             return
-        if vc.is_paused():
-            vc.resume()
+        if self.engine.resume(guild_id):
             await interaction.response.send_message(":arrow_forward: Playback resumed.")
         else:
             await interaction.response.send_message(":x: Playback is not paused.", ephemeral=True)
 
-    @app_commands.command(name="queue", description="Show the current music queue. Displays up to 10 items and indicates if there are more.")
-    async def queue(self, interaction: Interaction):
+    @app_commands.command(name="queue", description="Show the current music queue, 10 items per page.")
+    @app_commands.describe(page="The page of the queue to show.")
+    async def queue(self, interaction: Interaction, page: app_commands.Range[int, 1] = 1):
         if (guild_id := interaction.guild_id) is None:
             await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
             return
 
-        max_display = 10
+        per_page = 10
         queue_items = []
-        if guild_id in self.engine.currently_playing:
-            _, title, duration = self.engine.currently_playing[guild_id]
-            queue_items.append(f"**Now Playing:** {title} [{duration}]")
-
-        if guild_id in self.engine.queues and self.engine.queues[guild_id]:
-            for i, item in enumerate(list(self.engine.queues[guild_id])[:max_display]):
-                queue_items.append(f"{i+1}. {item.title} [{item.duration}]")
+        pages = 1
+        if (session := self.engine.sessions.get(guild_id)) is not None:
+            if (current := session.current) is not None:
+                queue_items.append(f"**Now Playing:** {current.title} [{current.duration}]")
 
-            if len(self.engine.queues[guild_id]) > max_display:
-                queue_items.append(f"\n...and {len(self.engine.queues[guild_id]) - max_display} more.")
+            pages = max(1, ceil(len(session.queue) / per_page))
+            page = min(page, pages)
+            start = (page - 1) * per_page
+            for i, item in enumerate(session.queue[start:start + per_page], start=start + 1):
+                queue_items.append(f"{i}. {item.title} [{item.duration}]")
 
         if not queue_items:
             await interaction.response.send_message(":x: The music queue is currently empty.")
@@ -210,6 +357,8 @@ class MusicCog(commands.Cog):
                 description="\n".join(queue_items),
                 color=self.bot.color,
             )
+            if pages > 1:
+                embed.set_footer(text=f"Page {page}/{pages} · {len(session.queue)} tracks queued")
             await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="skip", description="Skip the current song.")
@@ -217,27 +366,104 @@ class MusicCog(commands.Cog):
         if (guild_id := interaction.guild_id) is None:
             await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
             return
-        if (vc := await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id)) is None:
+        if await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id) is None:
             return
-        if vc.is_playing() or vc.is_paused():
-            vc.stop()
+        if self.engine.skip(guild_id):
             await interaction.response.send_message(":track_next: Skipped.")
         else:
             await interaction.response.send_message(":x: Nothing is currently playing.", ephemeral=True)
 
+    @app_commands.command(name="seek", description="Jump to a position in the current song.")
+    @app_commands.describe(position="Timestamp such as 1:23 or 1:02:03, or a number of seconds.")
+    async def seek(self, interaction: Interaction, position: str):
+        if (guild_id := interaction.guild_id) is None:
+            await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
+            return
+        if await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id) is None:
+            return
+        if (seconds := parse_duration(position.strip())) is None:
+            await interaction.response.send_message(":x: Use a timestamp such as 1:23 or a number of seconds.", ephemeral=True)
+            return
+        if self.engine.seek(guild_id, seconds):
+            await interaction.response.send_message(f":fast_forward: Seeking to **{format_duration(seconds)}**.")
+        else:
+            await interaction.response.send_message(":x: Nothing seekable is playing, or that is past the end.", ephemeral=True)
+
+    @app_commands.command(name="volume", description="Set the playback volume for this server.")
+    @app_commands.describe(percent="Volume from 0 to 200 percent.")
+    async def volume(self, interaction: Interaction, percent: app_commands.Range[int, 0, 200]):
+        if (guild_id := interaction.guild_id) is None:
+            await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
+            return
+        if await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id) is None:
+            return
+        if self.engine.set_volume(guild_id, percent / 100):
+            await interaction.response.send_message(f":loud_sound: Volume set to **{percent}%**.")
+        else:
+            await interaction.response.send_message(f":loud_sound: Volume set to **{percent}%** from the next track.")
+
     @app_commands.command(name="shuffle", description="Shuffle the current music queue.")
     async def shuffle(self, interaction: Interaction):
         if (guild_id := interaction.guild_id) is None:
             await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
             return
-        if guild_id in self.engine.queues and self.engine.queues[guild_id]:
-            shuffled = list(self.engine.queues[guild_id])
-            shuffle(shuffled)
-            self.engine.queues[guild_id] = deque(shuffled)
+        if (session := self.engine.sessions.get(guild_id)) is not None and session.queue:
+            session.queue.shuffle()
+            self.engine.queue_changed(guild_id)
             await interaction.response.send_message(":twisted_rightwards_arrows: Queue shuffled.")
         else:
             await interaction.response.send_message(":x: The music queue is currently empty.", ephemeral=True)
 
+    @app_commands.command(name="remove", description="Remove a track from the music queue by its position.")
+    @app_commands.describe(position="The position of the track in /queue.")
+    async def remove(self, interaction: Interaction, position: app_commands.Range[int, 1]):
+        if (guild_id := interaction.guild_id) is None:
+            await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
+            return
+        if await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id) is None:
+            return
+        session = self.engine.sessions.get(guild_id)
+        if session is None or position > len(session.queue):
+            await interaction.response.send_message(":x: There is no track at that position.", ephemeral=True)
+            return
+        item = session.queue.pop(position - 1)
+        self.engine.queue_changed(guild_id)
+        await interaction.response.send_message(f":wastebasket: Removed **{item.title}** from the queue.")
+
+    @app_commands.command(name="move", description="Move a track to another position in the music queue.")
+    @app_commands.describe(source="The current position of the track.", target="The position to move it to.")
+    async def move(self, interaction: Interaction, source: app_commands.Range[int, 1], target: app_commands.Range[int, 1]):
+        if (guild_id := interaction.guild_id) is None:
+            await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
+            return
+        if await self.engine.ensure_user_in_same_voice_channel(interaction, guild_id) is None:
+            return
+        session = self.engine.sessions.get(guild_id)
+        if session is None or max(source, target) > len(session.queue):
+            await interaction.response.send_message(":x: There is no track at that position.", ephemeral=True)
+            return
+        item = session.queue.move(source - 1, target - 1)
+        self.engine.queue_changed(guild_id)
+        await interaction.response.send_message(f":arrow_right_hook: Moved **{item.title}** to position {target}.")
+
+    @app_commands.command(name="queuelimit", description="Set the maximum number of tracks in this server's music queue.")
+    @app_commands.describe(limit=f"The maximum queue length (1-{MAX_QUEUE_LIMIT}).")
+    @app_commands.guild_only()
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def queuelimit(self, interaction: Interaction, limit: app_commands.Range[int, 1, MAX_QUEUE_LIMIT]):
+        if (guild_id := interaction.guild_id) is None:
+            await interaction.response.send_message(":x: Could not determine guild ID.", ephemeral=True)
+            return
+        await self.engine.settings.set_queue_limit(guild_id, limit)
+        await interaction.response.send_message(f":white_check_mark: The music queue now holds up to {limit} tracks.", ephemeral=True)
+
+    @queuelimit.error
+    async def on_queuelimit_error(self, interaction: Interaction, error: app_commands.AppCommandError):
+        if isinstance(error, app_commands.errors.MissingPermissions):
+            await interaction.response.send_message(":x: You need Manage Server permissions to change the queue limit.", ephemeral=True)
+        else:
+            logger.error("Unexpected error in queuelimit command: %s", error)
+
 
 async def setup(bot: "Sakamoto"):
     """Add the MusicCog to the bot."""
@@ -1,5 +1,7 @@
 import logging
+from asyncio import Semaphore, Task, as_completed, create_task, shield
 from random import choice, sample
+from time import monotonic, perf_counter
 from typing import TYPE_CHECKING
 from urllib.parse import urljoin, urlparse
 
@@ -7,6 +9,11 @@ from discord import Interaction, Member, app_commands
 from discord.ext import commands
 
 from ._audio_engine import get_audio_engine
+from ._autocomplete import AutocompleteDebouncer
+from ._cache import MISSING, get_stream_url_cache, get_suggestion_cache
+from ._http import get_http_client
+from ._playback_state import Histogram
+from ._radio_catalogue import Station, fold, get_radio_catalogue
 
 if TYPE_CHECKING:
     from main import Sakamoto
@@ -18,18 +25,50 @@ class RadioCog(commands.GroupCog, group_name="radio", group_description="Play ra
     """Groupped radio based commands."""
 
     RADIO_ENDPOINT = "https://radio.garden/api"
+    BALLOON_SAMPLE = 5
+    BALLOON_CONCURRENCY = 3
+    # Resolved stream targets are served as-is for STREAM_URL_TTL, then served stale while one background probe
+    # refreshes them, until the cache entry itself expires.
+    STREAM_URL_TTL = 300.0
 
     def __init__(self, bot: "Sakamoto"):
         self.bot = bot
+        self.http = get_http_client(bot)
         self.engine = get_audio_engine(bot)
-
-    async def search_query_autocomplete(self, _interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
+        self.autocomplete = AutocompleteDebouncer(cache=get_suggestion_cache(bot), namespace="radio")
+        self.catalogue = get_radio_catalogue(bot)
+        self._catalogue_task: Task | None = None
+        self.place_latency = Histogram()
+        self.stream_urls = get_stream_url_cache(bot)
+        self._stream_lookups: dict[str, Task] = {}
+
+    async def cog_load(self):
+        await self.catalogue.load()
+        self._catalogue_task = create_task(self.catalogue.run(self.fetch_places, self.list_place_stations))
+
+    def cog_unload(self):
+        if self._catalogue_task is not None:
+            self._catalogue_task.cancel()
+
+    async def search_query_autocomplete(self, interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
         query = current.strip()
         if len(query) < 2:
             return []
 
-        payload = await self.fetch_json(f"{self.RADIO_ENDPOINT}/search", params={"q": query})
-        hits = (payload or {}).get("hits", {}).get("hits") or []
+        # Answered from the local catalogue when it has the station (or knows there is none).
+        if (stations := self.catalogue.search(query)) or self.catalogue.complete:
+            return [self.station_choice(station) for station in stations]
+        return await self.autocomplete.complete(interaction.user.id, query, self.search_station_choices)
+
+    @staticmethod
+    def station_choice(station: Station) -> app_commands.Choice[str]:
+        label = f"{station.title} ({station.subtitle})" if station.subtitle else station.title
+        return app_commands.Choice(name=label[:100] or "Unknown Station", value=station.channel_id[:100])
+
+    async def search_station_choices(self, query: str) -> list[app_commands.Choice[str]]:
+        if (payload := await self.fetch_json(f"{self.RADIO_ENDPOINT}/search", params={"q": query})) is None:
+            raise LookupError("Radio search is unavailable.")
+        hits = payload.get("hits", {}).get("hits") or []
         choices: list[app_commands.Choice[str]] = []
         seen_values: set[str] = set()
         for hit in hits:
@@ -105,7 +144,7 @@ class RadioCog(commands.GroupCog, group_name="radio", group_description="Play ra
 
         if await self.engine.get_or_connect_voice_client(guild_id, user.voice.channel, interaction) is None:
             return
-        self.engine.command_channels[guild_id] = channel
+        self.engine.session(guild_id).command_channel = channel
 
         await self.engine.enqueue_or_play(
             guild_id,
@@ -125,13 +164,22 @@ class RadioCog(commands.GroupCog, group_name="radio", group_description="Play ra
         raw = query.strip()
         if not raw:
             raise ValueError("You must provide a station query, URL, or channel ID.")
-        if channel_id := self.extract_channel_id(raw):
+        channel_id = self.extract_channel_id(raw)
+        if channel_id and (station := self.catalogue.get(channel_id)) is not None:
+            return station.channel_id, station.title
+        # While the catalogue is still being crawled only an exact title is trusted over the live lookups.
+        local = next(iter(self.catalogue.search(raw, limit=1)), None)
+        if local is not None and (self.catalogue.complete or fold(local.title) == fold(raw)):
+            return local.channel_id, local.title
+        if channel_id:
             if channel := (await self.fetch_json(f"{self.RADIO_ENDPOINT}/ara/content/channel/{channel_id}") or {}).get("data"):
                 title = channel.get("title") or "Unknown Station"
                 return channel_id, title
 
         channel = await self.search_radio_channel(raw)
         if channel is None:
+            if local is not None:
+                return local.channel_id, local.title
             raise ValueError("No radio station found for that query.")
 
         if not (channel_id := self.channel_id_from_href(channel.get("url"))):
@@ -151,47 +199,100 @@ class RadioCog(commands.GroupCog, group_name="radio", group_description="Play ra
             return RadioCog.channel_id_from_href(parsed.path)
         return raw
 
-    async def pick_random_station(self) -> tuple[str, str]:
+    async def fetch_places(self) -> list[dict]:
         places_payload = await self.fetch_json(f"{self.RADIO_ENDPOINT}/ara/content/places")
-        places = (places_payload or {}).get("data", {}).get("list") or []
+        return (places_payload or {}).get("data", {}).get("list") or []
+
+    async def pick_random_station(self) -> tuple[str, str]:
+        if (station := self.catalogue.pick()) is not None:
+            return station.channel_id, station.title
+        # The catalogue has not been crawled yet, so sample places live: the lookups run together and the
+        # first place with a playable channel wins.
+        places = await self.fetch_places()
         if not places:
             raise ValueError("No radio places available.")
 
-        for place in sample(places, k=min(len(places), 5)):
-            place_id = place.get("id")
-            if not place_id:
-                continue
-
-            channels = await self.fetch_place_channels(place_id)
-            if not channels:
-                continue
-
-            station = choice(channels)
-            if not (channel_id := self.channel_id_from_href(station.get("href") or station.get("url"))):
-                continue
-            title = station.get("title") or "Unknown Station"
-            return channel_id, title
+        semaphore = Semaphore(self.BALLOON_CONCURRENCY)
+
+        async def lookup(place_id: str) -> tuple[str, str] | None:
+            async with semaphore:
+                started = perf_counter()
+                channels = await self.fetch_place_channels(place_id)
+                self.place_latency.add(perf_counter() - started)
+            stations = [
+                (channel_id, channel.get("title") or "Unknown Station")
+                for channel in channels
+                if (channel_id := self.channel_id_from_href(channel.get("href") or channel.get("url")))
+            ]
+            return choice(stations) if stations else None
+
+        sampled = sample(places, k=min(len(places), self.BALLOON_SAMPLE))
+        tasks = [create_task(lookup(place_id)) for place in sampled if (place_id := place.get("id"))]
+        try:
+            for next_done in as_completed(tasks):
+                if (station := await next_done) is not None:
+                    return station
+        finally:
+            for task in tasks:
+                task.cancel()
 
         raise ValueError("Could not find a random radio station. Try again.")
 
     async def fetch_place_channels(self, place_id: str) -> list[dict]:
         payload = await self.fetch_json(f"{self.RADIO_ENDPOINT}/ara/content/page/{place_id}/channels")
+        return self.place_page_channels(payload)
+
+    async def list_place_stations(self, place_id: str) -> list[tuple[str, str]]:
+        """Channel IDs and titles of one place for the catalogue; raises when the page is unavailable."""
+        if (payload := await self.fetch_json(f"{self.RADIO_ENDPOINT}/ara/content/page/{place_id}/channels")) is None:
+            raise LookupError(f"Radio place {place_id} is unavailable.")
+        return [
+            (channel_id, channel.get("title") or "Unknown Station")
+            for channel in self.place_page_channels(payload)
+            if (channel_id := self.channel_id_from_href(channel.get("href") or channel.get("url")))
+        ]
+
+    @classmethod
+    def place_page_channels(cls, payload: dict | None) -> list[dict]:
         content = (payload or {}).get("data", {}).get("content") or []
         if not content:
             return []
         channels = []
         for item in content[0].get("items") or []:
-            if channel := self.radio_station_page(item):
+            if channel := cls.radio_station_page(item):
                 channels.append(channel)
         return channels
 
     async def resolve_radio_stream_url(self, channel_id: str) -> str:
+        if (cached := self.stream_urls.get(channel_id)) is not MISSING:
+            stream_url, fresh_until = cached
+            if monotonic() >= fresh_until:
+                self._stream_lookup(channel_id)
+            return stream_url
+        # Shielded so one caller giving up does not cancel the probe other guilds are waiting on.
+        return await shield(self._stream_lookup(channel_id))
+
+    def _stream_lookup(self, channel_id: str) -> Task:
+        """The in-flight probe for a channel, started if there is none, so concurrent plays share one request."""
+        if (task := self._stream_lookups.get(channel_id)) is None:
+            task = self._stream_lookups[channel_id] = create_task(self.probe_radio_stream_url(channel_id))
+            task.add_done_callback(lambda done: self._stream_lookup_done(channel_id, done))
+        return task
+
+    def _stream_lookup_done(self, channel_id: str, task: Task):
+        if self._stream_lookups.get(channel_id) is task:
+            del self._stream_lookups[channel_id]
+        # A failed refresh keeps serving the stale target; the error already reached any caller awaiting it.
+        if not task.cancelled() and task.exception() is None:
+            self.stream_urls.set(channel_id, (task.result(), monotonic() + self.STREAM_URL_TTL))
+
+    async def probe_radio_stream_url(self, channel_id: str) -> str:
         stream_api_url = f"{self.RADIO_ENDPOINT}/ara/content/listen/{channel_id}/channel.mp3"
         if self.bot.session is None:
             raise RuntimeError("HTTP session is not available.")
 
         try:
-            async with self.bot.session.get(stream_api_url, allow_redirects=False, timeout=10) as resp:
+            async with self.http.get(stream_api_url, allow_redirects=False) as resp:
                 redirect_statuses = {301, 302, 303, 307, 308}
                 if resp.status in redirect_statuses:
                     location = resp.headers.get("Location")
@@ -228,7 +329,7 @@ class RadioCog(commands.GroupCog, group_name="radio", group_description="Play ra
         if self.bot.session is None:
             raise RuntimeError("HTTP session is not available.")
         try:
-            async with self.bot.session.get(url, params=params, timeout=10) as resp:
+            async with self.http.get(url, params=params) as resp:
                 if resp.status != 200:
                     return None
                 return await resp.json(content_type=None)
@@ -8,6 +8,8 @@ from aiosqlite import connect
 from discord import Embed, Interaction, app_commands
 from discord.ext import commands
 
+from ._http import get_http_client
+
 if TYPE_CHECKING:
     from main import Sakamoto
 
@@ -23,6 +25,7 @@ class SteamCog(commands.GroupCog, group_name="steam", group_description="Steam a
     """Cog for Steam integration, linking accounts and fetching lobby information."""
     def __init__(self, bot: "Sakamoto"):
         self.bot = bot
+        self.http = get_http_client(bot)
         self.steam_api_base = "https://api.steampowered.com"
 
     async def cog_load(self):
@@ -111,7 +114,7 @@ class SteamCog(commands.GroupCog, group_name="steam", group_description="Steam a
         
         try:
             # API call to resolve vanity URL to SteamID64
-            async with self.bot.session.get(
+            async with self.http.get(
                 f"{self.steam_api_base}/ISteamUser/ResolveVanityURL/v1/",
                 params={"key": STEAM_TOKEN, "vanityurl": vanity_name, "url_type": "1"} # url_type 1 for individual profile
             ) as resp:
@@ -204,7 +207,7 @@ class SteamCog(commands.GroupCog, group_name="steam", group_description="Steam a
             return
         
         try:
-            async with self.bot.session.get(
+            async with self.http.get(
                 f"{self.steam_api_base}/ISteamUser/GetPlayerSummaries/v2/",
                 params={"key": STEAM_TOKEN, "steamids": linked_steam_id}
             ) as resp:
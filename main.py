@@ -7,6 +7,8 @@ from discord import Activity, ActivityType, Intents
 from discord.ext import commands
 from discord.utils import setup_logging
 
+from functions.tool._http import create_session
+
 setup_logging()
 logger = logging.getLogger("Sakamoto")
 
@@ -30,7 +32,7 @@ class Sakamoto(commands.AutoShardedBot):
         self.db_path = "data/sakamoto.sqlite"
 
     async def setup_hook(self):
-        self.session = ClientSession()
+        self.session = create_session()
         for functions in iglob("functions/**/*.py", recursive=True):
             filename = functions.split(sep)[-1]
             if filename.startswith("_"):
@@ -0,0 +1,251 @@
+"""Run N synthetic guilds through AudioEngine under a mixed command load and report how it scales.
+
+Each guild gets a fake voice client and runs on the real engine code. The fake client starts one
+player thread per track, reading frames every 20ms like discord.py's AudioPlayer, and honours
+stop/pause the same way. FFmpeg is replaced by a synthetic source that yields a fixed number of
+silent PCM frames. Each guild's driver task then issues a random mix of /play (enqueue), /skip
+and /shuffle, while tracks also end on their own and advance the queue through play_next.
+
+Reported figures:
+- event loop lag, from a 10ms sleep probe
+- state transitions and events per second
+- memory per session with a queue, from tracemalloc
+- peak thread count
+- recoveries, which should stay at zero since no stream ever fails
+
+Run with: pipenv run python tests/bench/bench_audio_engine.py --guilds 200 --seconds 20 --queue 50
+"""
+from argparse import ArgumentParser
+from asyncio import Event, gather, get_running_loop, run, sleep
+from collections import Counter, deque
+from pathlib import Path
+from random import Random
+from threading import Event as ThreadEvent, Thread, active_count
+from time import perf_counter, sleep as thread_sleep
+from types import SimpleNamespace
+import sys
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from discord import AudioSource
+
+from functions.tool import _audio_engine
+from functions.tool._audio_engine import AudioEngine, QueueItem, format_duration
+from functions.tool._audio_sources import FRAME_SECONDS
+
+PCM_FRAME = b"\0" * 3840
+
+
+class SyntheticSource(AudioSource):
+    def __init__(self, frames: int):
+        self.remaining = frames
+
+    def read(self) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        self.remaining -= 1
+        return PCM_FRAME
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        self.remaining = 0
+
+
+class FakePlayer(Thread):
+    """Same contract as discord.py's AudioPlayer: paced reads, `_end` set before `after` runs."""
+
+    def __init__(self, source: AudioSource, after):
+        super().__init__(daemon=True)
+        self.source = source
+        self.after = after
+        self._end = ThreadEvent()
+        self._resumed = ThreadEvent()
+        self._resumed.set()
+
+    def run(self):
+        error = None
+        try:
+            next_at = perf_counter()
+            while not self._end.is_set():
+                if not self._resumed.is_set():
+                    self._resumed.wait()
+                    next_at = perf_counter()
+                    continue
+                if not self.source.read():
+                    break
+                next_at += FRAME_SECONDS
+                if (delay := next_at - perf_counter()) > 0:
+                    thread_sleep(delay)
+        except Exception as e:
+            error = e
+        finally:
+            self._end.set()
+            self.source.cleanup()
+            self.after(error)
+
+    def is_playing(self) -> bool:
+        return self._resumed.is_set() and not self._end.is_set()
+
+    def stop(self):
+        self._end.set()
+        self._resumed.set()
+
+
+class FakeVoiceClient:
+    def __init__(self):
+        self.channel = None
+        self._player: FakePlayer | None = None
+
+    def is_connected(self) -> bool:
+        return True
+
+    def is_playing(self) -> bool:
+        return self._player is not None and self._player.is_playing()
+
+    def play(self, source: AudioSource, *, after):
+        if self.is_playing():
+            raise RuntimeError("Already playing audio.")
+        self._player = FakePlayer(source, after)
+        self._player.start()
+
+    def pause(self):
+        if self._player is not None:
+            self._player._resumed.clear()
+
+    def resume(self):
+        if self._player is not None:
+            self._player._resumed.set()
+
+    def stop(self):
+        if self._player is not None:
+            self._player.stop()
+
+    async def disconnect(self, *, force: bool = False):
+        self.stop()
+
+
+async def resolve(source_url: str) -> str:
+    return source_url
+
+
+def track(url: str, duration: str) -> QueueItem:
+    return QueueItem(url, url, duration, url, resolve)
+
+
+async def followup(*args, **kwargs):
+    pass
+
+
+async def probe(lag: deque[float], threads: list[int], stop: Event):
+    while not stop.is_set():
+        start = perf_counter()
+        await sleep(0.01)
+        lag.append(perf_counter() - start - 0.01)
+        threads[0] = max(threads[0], active_count())
+
+
+async def drive(
+    engine: AudioEngine, guild_id: int, seconds: float, interval: float, duration: str, ops: Counter, rng: Random
+):
+    deadline = perf_counter() + seconds
+    serial = 0
+    while perf_counter() < deadline:
+        await sleep(rng.uniform(0.5, 1.5) * interval)
+        roll = rng.random()
+        if roll < 0.5:
+            serial += 1
+            url = f"synthetic://{guild_id}/extra/{serial}"
+            await engine.enqueue_or_play(
+                guild_id,
+                source_url=url,
+                title=url,
+                duration=duration,
+                stream_url=url,
+                followup=followup,
+                refresh_stream=resolve,
+            )
+            ops["enqueue"] += 1
+        elif roll < 0.8:
+            ops["skip" if engine.skip(guild_id) else "skip_noop"] += 1
+        elif (session := engine.sessions.get(guild_id)) is not None and session.queue:
+            session.queue.shuffle()
+            engine.queue_changed(guild_id)
+            ops["shuffle"] += 1
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def simulate(guilds: int, seconds: float, queue: int, track_seconds: float, interval: float):
+    engine = AudioEngine(SimpleNamespace(loop=get_running_loop(), user=None))
+    frames = int(track_seconds / FRAME_SECONDS)
+    # Sources still go through the engine's create_source; only the FFmpeg process is replaced.
+    _audio_engine.FFmpegPCMAudio = lambda *args, **kwargs: SyntheticSource(frames)
+    duration = format_duration(track_seconds)
+    baseline_threads = active_count()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for guild_id in range(guilds):
+        session = engine.session(guild_id)
+        session.voice_client = FakeVoiceClient()
+        session.queue.extend(track(f"synthetic://{guild_id}/{n}", duration) for n in range(queue))
+    per_session = (tracemalloc.get_traced_memory()[0] - before) / guilds
+    tracemalloc.stop()
+
+    lag: deque[float] = deque()
+    threads = [0]
+    stop = Event()
+    prober = get_running_loop().create_task(probe(lag, threads, stop))
+    ops: Counter = Counter()
+    rng = Random(0)
+
+    start = perf_counter()
+    for guild_id in range(guilds):
+        engine.play_next(guild_id)
+    await gather(
+        *(drive(engine, guild_id, seconds, interval, duration, ops, Random(rng.random())) for guild_id in range(guilds))
+    )
+    elapsed = perf_counter() - start
+    stop.set()
+    await prober
+    await engine.shutdown()
+
+    stats = engine.state_stats()
+    transitions = sum(timing["count"] for timing in stats["transitions"].values())
+    events = stats["event_lag"]["count"]
+    started = stats["transitions"].get("draining->buffering", {}).get("count", 0)
+    print(f"guilds={guilds} queue={queue} track={track_seconds:.1f}s command interval={interval * 1000:.0f}ms")
+    print(f"run={elapsed:.1f}s  commands: {dict(ops)}  tracks started={started}")
+    print(f"transitions/s={transitions / elapsed:,.0f}  events/s={events / elapsed:,.0f}")
+    print(
+        f"loop lag p50={percentile(list(lag), 0.5) * 1000:.2f}ms p99={percentile(list(lag), 0.99) * 1000:.2f}ms "
+        f"max={max(lag, default=0) * 1000:.2f}ms  dispatch lag avg={stats['event_lag']['avg_ms']:.2f}ms "
+        f"max={stats['event_lag']['max_ms']:.2f}ms"
+    )
+    print(f"memory/session={per_session / 1024:.1f}KiB (with {queue} queued tracks)")
+    per_guild = (threads[0] - baseline_threads) / guilds
+    print(f"threads baseline={baseline_threads} peak={threads[0]} per guild={per_guild:.2f}")
+    print(f"recoveries={engine.recoveries}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10.0, help="How long each guild keeps issuing commands.")
+    parser.add_argument("--queue", type=int, default=20, help="Tracks queued per guild before the run starts.")
+    parser.add_argument("--track-seconds", type=float, default=3.0)
+    parser.add_argument("--interval-ms", type=float, default=500.0, help="Average time between commands per guild.")
+    args = parser.parse_args()
+    run(simulate(args.guilds, args.seconds, args.queue, args.track_seconds, args.interval_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
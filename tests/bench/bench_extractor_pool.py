@@ -0,0 +1,78 @@
+"""Compare /play resolution latency with and without the extractor pool.
+
+Run with: pipenv run python tests/bench/bench_extractor_pool.py
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter, sleep
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import functions.tool._extractor_pool as extractor_pool
+from functions.tool._extractor_pool import ExtractorPool
+
+
+class FakeYoutubeDL:
+    """Stand-in extractor with a fixed construction cost and a fixed network cost."""
+
+    init_cost = 0.04
+    network_cost = 0.01
+
+    def __init__(self, opts):
+        self.opts = opts
+        sleep(self.init_cost)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def extract_info(self, url, download=False):
+        sleep(self.network_cost)
+        return {"webpage_url": url, "url": f"https://stream.test/{abs(hash(url))}", "title": "Track"}
+
+    def close(self):
+        pass
+
+
+def resolve_without_pool(query: str):
+    with FakeYoutubeDL({}) as ydl:
+        return ydl.extract_info(query, download=False)
+
+
+def measure(fn, requests: int, concurrency: int) -> list[float]:
+    def timed(i: int) -> float:
+        start = perf_counter()
+        fn(f"https://youtube.test/watch?v={i}")
+        return perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed, range(requests)))
+
+
+def report(label: str, samples: list[float]):
+    cuts = quantiles(samples, n=100)
+    print(f"{label:<12} p50={cuts[49] * 1000:7.2f}ms  p95={cuts[94] * 1000:7.2f}ms  n={len(samples)}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    extractor_pool.YoutubeDL = FakeYoutubeDL
+    pool = ExtractorPool({}, size=args.pool_size)
+
+    report("no pool", measure(resolve_without_pool, args.requests, args.concurrency))
+    report("pooled", measure(pool.extract_info, args.requests, args.concurrency))
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Measure time-to-first-audio-packet for each FFmpeg profile.
+
+Pass one stream URL per profile you want to measure. For YouTube, use a direct googlevideo URL,
+for example from `yt-dlp -f bestaudio -g <url>`. Every URL is also measured with the
+"generic" profile, which was the previous one-size-fits-all setting, as a baseline.
+
+Run with: pipenv run python tests/bench/bench_ffmpeg_profiles.py --youtube URL --live URL
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from functions.tool._audio_engine import AudioEngine
+
+
+def time_to_first_packet(engine: AudioEngine, stream_url: str, profile: str) -> float:
+    start = perf_counter()
+    source = engine.create_source(0, stream_url, profile=profile)
+    try:
+        if not source.read():
+            raise RuntimeError(f"No audio received from {stream_url}")
+        return perf_counter() - start
+    finally:
+        source.cleanup()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--youtube", help="Direct YouTube audio stream URL.")
+    parser.add_argument("--live", help="Radio stream URL.")
+    parser.add_argument("--generic", help="Any other media URL or local file.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = AudioEngine(bot=None)  # type: ignore[arg-type]
+    targets = {name: url for name in ("youtube", "live", "generic") if (url := getattr(args, name))}
+    if not targets:
+        parser.error("pass at least one of --youtube, --live or --generic")
+
+    for name, url in targets.items():
+        for profile in dict.fromkeys((name, "generic")):
+            samples = sorted(time_to_first_packet(engine, url, profile) for _ in range(args.runs))
+            print(
+                f"{name:<8} profile={profile:<8} p50={median(samples) * 1000:7.1f}ms  "
+                f"max={samples[-1] * 1000:7.1f}ms  runs={args.runs}"
+            )
+
+
+if __name__ == "__main__":
+    main()
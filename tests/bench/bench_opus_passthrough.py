@@ -0,0 +1,97 @@
+"""Compare per-guild CPU time of the PCM path against Opus passthrough.
+
+Each simulated guild reads every frame of a track the way discord.py's player thread does.
+The PCM path also Opus-encodes each frame in Python, as VoiceClient would.
+CPU time is the sum of the FFmpeg child process and the reading thread.
+
+Run with: pipenv run python tests/bench/bench_opus_passthrough.py [--input track.webm]
+Without --input a 60 second Opus/WebM test tone is generated with ffmpeg.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from subprocess import run
+from tempfile import TemporaryDirectory
+from time import thread_time
+import sys
+
+from discord import opus
+from psutil import NoSuchProcess, Process
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from functions.tool._audio_engine import AudioEngine
+
+
+def generate_tone(directory: str, seconds: int) -> str:
+    target = str(Path(directory) / "tone.webm")
+    run(
+        ["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+         "-ac", "2", "-ar", "48000", "-c:a", "libopus", target],
+        check=True,
+    )
+    return target
+
+
+def sample_cpu(process: Process, previous: float) -> float:
+    try:
+        times = process.cpu_times()
+    except NoSuchProcess:
+        return previous
+    return times.user + times.system
+
+
+def play_guild(engine: AudioEngine, path: str, acodec: str | None) -> tuple[float, float, int]:
+    source = engine.create_source(0, path, acodec)
+    encoder = None if source.is_opus() or not opus.is_loaded() else opus.Encoder()
+    process = Process(source.original._process.pid)
+    start = thread_time()
+    frames = 0
+    child_cpu = 0.0
+    while data := source.read():
+        if encoder is not None:
+            encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+        frames += 1
+        if frames % 50 == 0:
+            child_cpu = sample_cpu(process, child_cpu)
+    python_cpu = thread_time() - start
+    source.cleanup()
+    return child_cpu, python_cpu, frames
+
+
+def measure(engine: AudioEngine, path: str, acodec: str | None, guilds: int):
+    with ThreadPoolExecutor(max_workers=guilds) as executor:
+        results = list(executor.map(lambda _: play_guild(engine, path, acodec), range(guilds)))
+    child = sum(r[0] for r in results) / guilds
+    python = sum(r[1] for r in results) / guilds
+    frames = results[0][2]
+    return child, python, frames
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--input", help="Local Opus/WebM file to play. Generated when omitted.")
+    parser.add_argument("--guilds", type=int, default=4)
+    parser.add_argument("--seconds", type=int, default=60)
+    args = parser.parse_args()
+
+    if not opus.is_loaded():
+        try:
+            opus._load_default()
+        except Exception:
+            print("libopus not found: Python-side encode cost of the PCM path is not measured.")
+
+    engine = AudioEngine(bot=None)  # type: ignore[arg-type]
+    engine.ffmpeg_profiles["generic"] = {"before_options": "", "options": "-vn"}
+    with TemporaryDirectory() as directory:
+        path = args.input or generate_tone(directory, args.seconds)
+        for label, acodec in (("pcm", None), ("passthrough", "opus")):
+            child, python, frames = measure(engine, path, acodec, args.guilds)
+            print(
+                f"{label:<12} ffmpeg={child:6.3f}s  python={python:6.3f}s  "
+                f"total/guild={child + python:6.3f}s  frames={frames}  guilds={args.guilds}"
+            )
+
+
+if __name__ == "__main__":
+    main()
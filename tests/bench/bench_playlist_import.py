@@ -0,0 +1,46 @@
+"""Measure playlist import throughput: time to the first entry and entries listed per second.
+
+It uses the same flat, lazy listing as `/play playlist:True`. Full extraction of each track is
+deferred until playback, so it is not part of this figure.
+
+Run with: pipenv run python tests/bench/bench_playlist_import.py --url "https://www.youtube.com/playlist?list=..."
+"""
+from argparse import ArgumentParser
+from asyncio import Queue, get_running_loop, run
+from pathlib import Path
+from threading import Event
+from time import perf_counter
+from types import SimpleNamespace
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from functions.tool.music import MusicCog
+
+
+async def measure(url: str):
+    cog = MusicCog(SimpleNamespace(loop=get_running_loop(), color=0, session=None))
+    batches: Queue = Queue()
+    start = perf_counter()
+    listing = get_running_loop().run_in_executor(None, cog.list_playlist, url, get_running_loop(), batches, Event())
+    first = None
+    entries = 0
+    while (batch := await batches.get()) is not None:
+        if first is None:
+            first = perf_counter() - start
+        entries += len(batch)
+    title = await listing
+    elapsed = perf_counter() - start
+    print(f"playlist={title!r} entries={entries}")
+    print(f"first entry={first * 1000 if first else 0:.0f}ms  total={elapsed:.2f}s  throughput={entries / elapsed:,.0f} entries/s")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--url", required=True, help="Playlist URL, ideally with 500+ entries.")
+    args = parser.parse_args()
+    run(measure(args.url))
+
+
+if __name__ == "__main__":
+    main()
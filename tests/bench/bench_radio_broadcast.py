@@ -0,0 +1,87 @@
+"""Load test: N guilds listening to one radio station, one FFmpeg per guild vs. a shared broadcast.
+
+Each simulated guild reads one frame every 20ms, like discord.py's player thread.
+Reported figures are the number of FFmpeg processes, their open sockets, and the total CPU
+time of FFmpeg plus this process.
+
+Run with: pipenv run python tests/bench/bench_radio_broadcast.py --url https://stream.example/radio.mp3 --guilds 20
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from threading import Thread
+from time import perf_counter, sleep
+import sys
+
+from psutil import NoSuchProcess, Process
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from functions.tool._audio_engine import AudioEngine
+
+FRAME = 0.02
+
+
+def listen(source, seconds: float, received: list[int]):
+    deadline = perf_counter() + seconds
+    frames = 0
+    while perf_counter() < deadline:
+        if not source.read():
+            break
+        frames += 1
+        sleep(FRAME)
+    received.append(frames)
+
+
+def ffmpeg_usage(process: Process) -> tuple[int, int, float]:
+    children = [child for child in process.children(recursive=True) if "ffmpeg" in child.name()]
+    sockets = 0
+    cpu = 0.0
+    for child in children:
+        try:
+            sockets += len(child.net_connections(kind="inet"))
+            times = child.cpu_times()
+            cpu += times.user + times.system
+        except NoSuchProcess:
+            continue
+    return len(children), sockets, cpu
+
+
+def run(engine: AudioEngine, url: str, guilds: int, seconds: float, shared: bool):
+    process = Process()
+    start_cpu = process.cpu_times()
+    key = url if shared else None
+    sources = [engine.create_source(guild_id, url, profile="live", shared_key=key) for guild_id in range(guilds)]
+    received: list[int] = []
+    threads = [Thread(target=listen, args=(source, seconds, received)) for source in sources]
+    for thread in threads:
+        thread.start()
+    sleep(min(seconds / 2, 5))
+    processes, sockets, ffmpeg_cpu = ffmpeg_usage(process)
+    for thread in threads:
+        thread.join()
+    ffmpeg_cpu = max(ffmpeg_cpu, ffmpeg_usage(process)[2])
+    own = process.cpu_times()
+    own_cpu = (own.user - start_cpu.user) + (own.system - start_cpu.system)
+    for source in sources:
+        source.cleanup()
+    label = "shared" if shared else "per-guild"
+    print(
+        f"{label:<10} guilds={guilds:<4} ffmpeg_processes={processes:<4} sockets={sockets:<4} "
+        f"cpu={ffmpeg_cpu + own_cpu:7.2f}s  min_frames={min(received)}"
+    )
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--url", required=True, help="Live radio stream URL.")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    args = parser.parse_args()
+
+    engine = AudioEngine(bot=None)  # type: ignore[arg-type]
+    run(engine, args.url, args.guilds, args.seconds, shared=False)
+    run(engine, args.url, args.guilds, args.seconds, shared=True)
+
+
+if __name__ == "__main__":
+    main()
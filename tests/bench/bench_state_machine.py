@@ -0,0 +1,161 @@
+"""Drive thousands of synthetic guilds through the playback state machine and report loop overhead.
+
+No Discord or FFmpeg is involved. Each guild gets a fake voice client and a queue of short tracks.
+One "player" thread stands in for discord.py's per-guild player threads. It reads the first frame
+of each track and fires the `after` callback when the track ends, just like the real thread.
+
+Reported figures:
+- events/s
+- event dispatch lag, from post on the player thread to handling on the loop
+- event loop lag, from a 10ms sleep probe
+- time spent in each state transition
+
+Run with: pipenv run python tests/bench/bench_state_machine.py --guilds 5000 --tracks 5 --track-ms 200
+"""
+from argparse import ArgumentParser
+from asyncio import Event, get_running_loop, run, sleep
+from collections import deque
+from heapq import heappop, heappush
+from itertools import count
+from pathlib import Path
+from random import uniform
+from threading import Condition, Thread
+from time import perf_counter
+from types import SimpleNamespace
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from discord import AudioSource
+
+from functions.tool import _audio_engine
+from functions.tool._audio_engine import AudioEngine, QueueItem
+
+
+class SyntheticPlayer(Thread):
+    """Single thread running every guild's timed callbacks in due order."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._heap: list[tuple[float, int, object]] = []
+        self._ids = count()
+        self._condition = Condition()
+
+    def call_at(self, when: float, callback):
+        with self._condition:
+            heappush(self._heap, (when, next(self._ids), callback))
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > perf_counter():
+                    self._condition.wait(None if not self._heap else self._heap[0][0] - perf_counter())
+                _, _, callback = heappop(self._heap)
+            callback()
+
+
+class SyntheticVoiceClient:
+    def __init__(self, player: SyntheticPlayer, track_seconds: float):
+        self.player = player
+        self.track_seconds = track_seconds
+        self.channel = None
+
+    def is_connected(self):
+        return True
+
+    def play(self, source, after):
+        now = perf_counter()
+        self.player.call_at(now + 0.02, source.read)
+        self.player.call_at(now + uniform(0.5, 1.5) * self.track_seconds, lambda: after(None))
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def stop(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+
+class SilentSource(AudioSource):
+    def read(self):
+        return b"\0" * 3840
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        pass
+
+
+async def probe_loop_lag(samples: deque[float], stop: Event):
+    while not stop.is_set():
+        start = perf_counter()
+        await sleep(0.01)
+        samples.append(perf_counter() - start - 0.01)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def simulate(guilds: int, tracks: int, track_seconds: float):
+    engine = AudioEngine(SimpleNamespace(loop=get_running_loop(), user=None))
+    engine.idle_timeout = 0
+    player = SyntheticPlayer()
+    player.start()
+    # Sources go through the engine's own create_source, only the FFmpeg process is replaced.
+    _audio_engine.FFmpegPCMAudio = lambda *args, **kwargs: SilentSource()
+
+    lag: deque[float] = deque()
+    stop = Event()
+    probe = get_running_loop().create_task(probe_loop_lag(lag, stop))
+
+    start = perf_counter()
+    for guild_id in range(guilds):
+        session = engine.session(guild_id)
+        session.voice_client = SyntheticVoiceClient(player, track_seconds)
+        session.queue.extend(
+            QueueItem(f"synthetic://{guild_id}/{n}", f"Track {n}", "N/A", f"synthetic://{guild_id}/{n}")
+            for n in range(1, tracks)
+        )
+        await engine.play_song(guild_id, f"synthetic://{guild_id}/0", f"synthetic://{guild_id}/0", "Track 0", "N/A")
+    setup = perf_counter() - start
+
+    while engine.sessions:
+        await sleep(0.05)
+    elapsed = perf_counter() - start
+    stop.set()
+    await probe
+
+    stats = engine.state_stats()
+    events = stats["event_lag"]["count"]
+    print(f"guilds={guilds} tracks/guild={tracks} track={track_seconds * 1000:.0f}ms")
+    print(f"setup={setup:.2f}s  total={elapsed:.2f}s  events={events}  events/s={events / elapsed:,.0f}")
+    print(
+        f"dispatch lag avg={stats['event_lag']['avg_ms']:.2f}ms max={stats['event_lag']['max_ms']:.2f}ms  "
+        f"loop lag p50={percentile(list(lag), 0.5) * 1000:.2f}ms p99={percentile(list(lag), 0.99) * 1000:.2f}ms"
+    )
+    for edge, timing in sorted(stats["transitions"].items()):
+        print(f"  {edge:<22} count={timing['count']:<8} avg={timing['avg_ms']:9.2f}ms  max={timing['max_ms']:9.2f}ms")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--tracks", type=int, default=5)
+    parser.add_argument("--track-ms", type=float, default=200.0)
+    args = parser.parse_args()
+    run(simulate(args.guilds, args.tracks, args.track_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
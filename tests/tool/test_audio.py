@@ -1,14 +1,30 @@
-from collections import deque
+import asyncio
+from contextlib import nullcontext
 from pathlib import Path
+from queue import Empty, Queue
 from types import SimpleNamespace
 import sys
+import threading
+import time
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from discord import AudioSource, app_commands
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
-from functions.tool._audio_engine import AudioEngine, QueueItem
+from functions.tool._audio_engine import AudioEngine, QueueItem, ResolvedStream, parse_duration, source_profile
+from functions.tool._autocomplete import AutocompleteDebouncer
+from functions.tool._broadcast import BroadcastHub
+from functions.tool._cache import TTLCache
+from functions.tool._extraction_scheduler import ExtractionScheduler, Priority
+from functions.tool._extractor_pool import ExtractorPool
+from functions.tool._loudness import LoudnessCache
+from functions.tool._music_settings import MusicSettings
+from functions.tool._playback_state import PlaybackState
+from functions.tool._radio_catalogue import RadioCatalogue
+from functions.tool._track_cache import TrackCache, stream_expiry
+from functions.tool._track_queue import TrackQueue
 from functions.tool.music import MusicCog
 from functions.tool.radio import RadioCog
 
@@ -30,6 +46,7 @@ def test_radio_subcommand_option_contracts():
 def test_play_option_contracts():
     assert [(param.name, param.required, bool(param.autocomplete)) for param in MusicCog.play.parameters] == [
         ("query", True, True),
+        ("playlist", False, False),
     ]
 
 
@@ -66,12 +83,25 @@ class DummyVoiceClient:
         return self._paused
 
 
-class DummyLoop:
-    def __init__(self, result):
-        self.result = result
+# One 20ms frame of 48kHz stereo 16-bit silence.
+PCM_FRAME = b"\0" * 3840
 
-    async def run_in_executor(self, _executor, _fn, _arg):
-        return self.result
+
+class DummyAudio(AudioSource):
+    def __init__(self, stream_url, **kwargs):
+        self.stream_url = stream_url
+        self.kwargs = kwargs
+        self.frames = [PCM_FRAME] * 3
+        self.cleaned_up = False
+
+    def read(self):
+        return self.frames.pop(0) if self.frames else b""
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self.cleaned_up = True
 
 
 class DummyResponse:
@@ -107,6 +137,20 @@ def _make_bot(*, session=None):
     return SimpleNamespace(loop=object(), color=0x123456, session=session)
 
 
+async def _flushed(store, flushes, timeout=5.0):
+    # Flushes run on a timer and hit SQLite, so wait for them rather than for a fixed time.
+    deadline = time.monotonic() + timeout
+    while store.flushes < flushes and time.monotonic() < deadline:
+        await asyncio.sleep(0.005)
+    assert store.flushes >= flushes
+
+
+async def _settle():
+    # Let posted events reach the dispatcher task and the tasks it spawns run.
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
 def _make_interaction(*, user, guild_id=1):
     return SimpleNamespace(
         guild_id=guild_id,
@@ -120,7 +164,7 @@ def _make_interaction(*, user, guild_id=1):
 @pytest.mark.asyncio
 async def test_play_song_returns_false_when_refreshed_stream_url_missing(monkeypatch):
     cog = AudioEngine(_make_bot())
-    cog.voice_clients[1] = DummyVoiceClient(connected=True)
+    cog.session(1).voice_client = DummyVoiceClient(connected=True)
     cog.play_next = MagicMock()
     refresh_stream = AsyncMock(return_value=None)
 
@@ -134,14 +178,15 @@ async def test_play_song_returns_false_when_refreshed_stream_url_missing(monkeyp
 async def test_play_song_starts_playback_and_tracks_current_song(monkeypatch):
     vc = DummyVoiceClient(connected=True)
     cog = AudioEngine(_make_bot())
-    cog.voice_clients[1] = vc
-    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", lambda stream_url, **_kw: f"audio:{stream_url}")
+    cog.session(1).voice_client = vc
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
 
     started = await cog.play_song(1, "https://example.test/watch", "https://stream.test", "Track", "3:00")
 
     assert started is True
-    assert cog.currently_playing[1] == ("https://example.test/watch", "Track", "3:00")
-    assert vc.play.call_args.args[0] == "audio:https://stream.test"
+    current = cog.sessions[1].current
+    assert (current.source_url, current.title, current.duration) == ("https://example.test/watch", "Track", "3:00")
+    assert vc.play.call_args.args[0].original.stream_url == "https://stream.test"
 
 
 @pytest.mark.asyncio
@@ -149,7 +194,7 @@ async def test_ensure_user_in_same_voice_channel_rejects_other_channel(monkeypat
     cog = AudioEngine(_make_bot())
     bot_channel = object()
     other_channel = object()
-    cog.voice_clients[1] = DummyVoiceClient(connected=True, channel=bot_channel)
+    cog.session(1).voice_client = DummyVoiceClient(connected=True, channel=bot_channel)
     monkeypatch.setattr("functions.tool._audio_engine.Member", DummyMember)
     interaction = _make_interaction(user=DummyMember(42, voice_channel=other_channel), guild_id=1)
 
@@ -177,11 +222,10 @@ async def test_control_commands_return_early_when_same_channel_check_fails(comma
     cog.engine.disconnect_and_cleanup.assert_not_awaited()
 
 
-def test_play_next_returns_without_voice_client(monkeypatch):
+def test_play_next_returns_without_voice_client():
     cog = AudioEngine(_make_bot())
-    monkeypatch.setattr("functions.tool._audio_engine.run_coroutine_threadsafe", lambda coro, _loop: coro.close())
     cog.play_next(123)
-    assert cog.currently_playing == {}
+    assert cog.sessions == {}
 
 
 @pytest.mark.parametrize(
@@ -348,6 +392,30 @@ async def test_pick_random_station_returns_channel_from_random_place():
     assert title == "Mataro Radio"
 
 
+@pytest.mark.asyncio
+async def test_pick_random_station_takes_first_place_with_a_channel():
+    session = DummySession([{"data": {"list": [{"id": "slow"}, {"id": "empty"}, {"id": "fast"}]}}])
+    cog = RadioCog(_make_bot(session=session))
+    slow_cancelled = asyncio.Event()
+
+    async def fetch_place_channels(place_id):
+        if place_id == "slow":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                slow_cancelled.set()
+                raise
+        await asyncio.sleep(0.01)
+        return [] if place_id == "empty" else [{"type": "channel", "title": "Fast FM", "href": "/listen/fast-fm/fast1"}]
+
+    cog.fetch_place_channels = fetch_place_channels
+
+    assert await asyncio.wait_for(cog.pick_random_station(), timeout=1) == ("fast1", "Fast FM")
+    await _settle()
+    assert slow_cancelled.is_set()
+    assert cog.place_latency.timing.count >= 1
+
+
 @pytest.mark.asyncio
 async def test_resolve_radio_stream_url_prefers_redirect_location():
     session = DummySession([DummyResponse({}, status=302, headers={"Location": "https://stream.test/live"})])
@@ -368,6 +436,29 @@ async def test_resolve_radio_stream_url_returns_api_url_on_success_status():
     assert stream_url == "https://radio.garden/api/ara/content/listen/sFtKSe5I/channel.mp3"
 
 
+@pytest.mark.asyncio
+async def test_resolve_radio_stream_url_coalesces_and_serves_stale_while_revalidating():
+    session = DummySession(
+        [
+            DummyResponse({}, status=302, headers={"Location": "https://stream.test/one"}),
+            DummyResponse({}, status=302, headers={"Location": "https://stream.test/two"}),
+        ]
+    )
+    cog = RadioCog(_make_bot(session=session))
+
+    urls = await asyncio.gather(*(cog.resolve_radio_stream_url("sFtKSe5I") for _ in range(3)))
+    assert urls == ["https://stream.test/one"] * 3
+    assert len(session.calls) == 1
+    assert await cog.resolve_radio_stream_url("sFtKSe5I") == "https://stream.test/one"
+    assert len(session.calls) == 1
+
+    cog.stream_urls.set("sFtKSe5I", ("https://stream.test/one", 0.0))
+    assert await cog.resolve_radio_stream_url("sFtKSe5I") == "https://stream.test/one"
+    await _settle()
+    assert len(session.calls) == 2
+    assert await cog.resolve_radio_stream_url("sFtKSe5I") == "https://stream.test/two"
+
+
 @pytest.mark.asyncio
 async def test_resolve_radio_stream_url_raises_when_unplayable_status():
     session = DummySession([DummyResponse({}, status=403)])
@@ -377,6 +468,93 @@ async def test_resolve_radio_stream_url_raises_when_unplayable_status():
         await cog.resolve_radio_stream_url("sFtKSe5I")
 
 
+async def _list_places():
+    return [
+        {"id": "bcn", "title": "Barcelona", "country": "Spain", "size": 30},
+        {"id": "mtr", "title": "Mataró", "country": "Spain", "size": 2},
+    ]
+
+
+async def _list_place_stations(place_id):
+    return {
+        "bcn": [("flaix1", "Flaixbac"), ("rac1", "RAC 1")],
+        "mtr": [("mataro1", "Mataró Ràdio")],
+    }[place_id]
+
+
+@pytest.mark.asyncio
+async def test_radio_catalogue_refreshes_incrementally_and_persists(tmp_path):
+    catalogue = RadioCatalogue(str(tmp_path / "sakamoto.db"), batch=1)
+    await catalogue.load()
+    list_stations = AsyncMock(side_effect=_list_place_stations)
+
+    await catalogue.refresh(_list_places, list_stations)
+    assert list_stations.await_count == 1 and not catalogue.complete
+    await catalogue.refresh(_list_places, list_stations)
+    assert list_stations.await_count == 2 and catalogue.complete
+    # Everything is fresh now, so another refresh only re-lists the places.
+    await catalogue.refresh(_list_places, list_stations)
+    assert list_stations.await_count == 2
+
+    reloaded = RadioCatalogue(catalogue.db_path)
+    await reloaded.load()
+    assert reloaded.complete
+    assert [s.channel_id for s in reloaded.search("fla")] == ["flaix1"]
+    assert [s.channel_id for s in reloaded.search("spain")] == ["rac1", "flaix1", "mataro1"]
+    assert reloaded.search("mataró ràd")[0].subtitle == "Mataró, Spain"
+    assert [s.channel_id for s in reloaded.search("ra")] == ["rac1", "mataro1"]
+    assert reloaded.search("zzz") == []
+
+
+@pytest.mark.asyncio
+async def test_radio_search_and_autocomplete_use_local_catalogue():
+    session = DummySession([])
+    cog = RadioCog(_make_bot(session=session))
+    await cog.catalogue.refresh(_list_places, _list_place_stations)
+    interaction = SimpleNamespace(user=SimpleNamespace(id=42))
+
+    choices = await cog.search_query_autocomplete(interaction, "rac")
+    assert [(c.name, c.value) for c in choices] == [("RAC 1 (Barcelona, Spain)", "rac1")]
+    assert await cog.search_query_autocomplete(interaction, "nothing like it") == []
+    assert await cog.resolve_radio_station("flaixbac") == ("flaix1", "Flaixbac")
+    assert await cog.resolve_radio_station("mataro1") == ("mataro1", "Mataró Ràdio")
+    assert session.calls == []
+
+
+@pytest.mark.asyncio
+async def test_radio_partial_match_goes_live_while_catalogue_is_incomplete():
+    live_hit = {"hits": {"hits": [{"_source": {"type": "channel", "title": "Ràdio Rac", "url": "/listen/rac/live1234"}}]}}
+    session = DummySession([{"data": None}, live_hit, {"data": None}, {"hits": {"hits": []}}])
+    cog = RadioCog(_make_bot(session=session))
+    cog.catalogue.batch = 1
+    await cog.catalogue.refresh(_list_places, _list_place_stations)
+    assert not cog.catalogue.complete
+
+    # An exact title is settled locally; a partial one may be a station the crawl has not reached yet.
+    assert await cog.resolve_radio_station("rac 1") == ("rac1", "RAC 1")
+    assert session.calls == []
+    assert await cog.resolve_radio_station("rac") == ("live1234", "Ràdio Rac")
+    assert [url.rsplit("/", 1)[-1] for url, _ in session.calls] == ["rac", "search"]
+    # Nothing found live either, so the partial local match still answers.
+    assert await cog.resolve_radio_station("rac") == ("rac1", "RAC 1")
+
+
+@pytest.mark.asyncio
+async def test_pick_random_station_uses_catalogue_once_warm():
+    session = DummySession([])
+    cog = RadioCog(_make_bot(session=session))
+    assert cog.catalogue.pick() is None
+    await cog.catalogue.refresh(_list_places, _list_place_stations)
+
+    # Every place is equally likely, so Mataró's only station wins about half the balloons.
+    picks = [(await cog.pick_random_station())[0] for _ in range(2000)]
+    assert set(picks) == {"flaix1", "rac1", "mataro1"}
+    assert 800 < picks.count("mataro1") < 1200
+    cog.catalogue.pick_mode = "station"
+    assert 500 < sum(cog.catalogue.pick().channel_id == "mataro1" for _ in range(2000)) < 850
+    assert session.calls == []
+
+
 @pytest.mark.asyncio
 async def test_radio_does_not_join_voice_when_station_resolution_fails(monkeypatch):
     connected_client = DummyVoiceClient(connected=True)
@@ -449,41 +627,105 @@ async def test_play_connects_before_enqueue(monkeypatch):
     cog = MusicCog(_make_bot())
     cog.engine.enqueue_or_play = AsyncMock()
     monkeypatch.setattr("functions.tool.music.Member", DummyMember)
-    monkeypatch.setattr(
-        "functions.tool.music.get_running_loop",
-        lambda: DummyLoop(
-            {
-                "url": "https://stream.test/live",
-                "webpage_url": "https://youtube.test/watch?v=abc",
-                "title": "Track",
-                "duration_string": "3:00",
-            }
-        ),
+    cog.engine.extractor.run = AsyncMock(
+        return_value={
+            "url": "https://stream.test/live",
+            "webpage_url": "https://youtube.test/watch?v=abc",
+            "title": "Track",
+            "duration_string": "3:00",
+        }
     )
 
     await MusicCog.play.callback(cog, interaction, query="track")
 
     voice_channel.connect.assert_awaited_once()
-    assert cog.engine.voice_clients[1] is connected_client
+    assert cog.engine.sessions[1].voice_client is connected_client
     cog.engine.enqueue_or_play.assert_awaited_once()
 
 
+class DummyPlaylistYoutubeDL:
+    def __init__(self, count):
+        self.count = count
+
+    def extract_info(self, url, download=False, process=True):
+        assert process is False
+        entries = (
+            {"_type": "url", "url": f"https://youtube.test/watch?v={n}", "title": f"Track {n}", "duration": 185}
+            for n in range(self.count)
+        )
+        return {"_type": "playlist", "title": "Mix", "entries": entries}
+
+
+def _playlist_cog(monkeypatch, count):
+    connected_client = DummyVoiceClient(connected=True)
+    voice_channel = DummyVoiceChannel(connected_client=connected_client)
+    interaction = _make_interaction(user=DummyMember(42, voice_channel=voice_channel), guild_id=1)
+    monkeypatch.setattr("functions.tool.music.Member", DummyMember)
+    cog = MusicCog(_make_bot())
+    cog.engine.enqueue_or_play = AsyncMock()
+    cog.refresh_stream_url = AsyncMock(return_value=None)
+    cog.playlist_pool = SimpleNamespace(checkout=lambda: nullcontext(DummyPlaylistYoutubeDL(count)))
+    return cog, interaction
+
+
+@pytest.mark.asyncio
+async def test_play_playlist_starts_first_track_and_streams_the_rest_into_queue(monkeypatch):
+    cog, interaction = _playlist_cog(monkeypatch, 120)
+
+    await MusicCog.play.callback(cog, interaction, query="https://youtube.test/playlist?list=abc", playlist=True)
+
+    first = cog.engine.enqueue_or_play.await_args
+    assert first.kwargs["source_url"] == "https://youtube.test/watch?v=0"
+    assert first.kwargs["duration"] == "3:05"
+    assert first.kwargs["stream_url"] is None
+    queue = cog.engine.sessions[1].queue
+    assert len(queue) == 119
+    assert queue[0].title == "Track 1" and queue[0].needs_prefetch()
+    assert queue[-1].source_url == "https://youtube.test/watch?v=119"
+    assert "Queued **120** tracks from **Mix**" in interaction.followup.send.await_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_play_playlist_stops_at_queue_limit(monkeypatch):
+    cog, interaction = _playlist_cog(monkeypatch, 500)
+    await cog.engine.settings.set_queue_limit(1, 60)
+
+    await MusicCog.play.callback(cog, interaction, query="https://youtube.test/playlist?list=abc", playlist=True)
+
+    assert len(cog.engine.sessions[1].queue) == 60
+    message = interaction.followup.send.await_args.args[0]
+    assert "Queued **61** tracks" in message
+    assert "queue limit was reached" in message
+
+
+@pytest.mark.asyncio
+async def test_play_playlist_aborts_quietly_when_stopped_mid_import(monkeypatch):
+    cog, interaction = _playlist_cog(monkeypatch, 500)
+
+    async def stop_right_away(guild_id, **kwargs):
+        await cog.engine.disconnect_and_cleanup(guild_id)
+
+    cog.engine.enqueue_or_play = AsyncMock(side_effect=stop_right_away)
+
+    await MusicCog.play.callback(cog, interaction, query="https://youtube.test/playlist?list=abc", playlist=True)
+
+    assert 1 not in cog.engine.sessions
+    interaction.followup.send.assert_not_awaited()
+
+
 @pytest.mark.asyncio
 async def test_play_query_autocomplete_returns_distinct_choices(monkeypatch):
     cog = MusicCog(_make_bot())
-    monkeypatch.setattr(
-        "functions.tool.music.get_running_loop",
-        lambda: DummyLoop(
-            {
-                "entries": [
-                    {"title": "Track", "webpage_url": "https://youtube.test/watch?v=abc"},
-                    {"title": "Track", "webpage_url": "https://youtube.test/watch?v=abc"},
-                ]
-            }
-        ),
+    cog.engine.extractor.run = AsyncMock(
+        return_value={
+            "entries": [
+                {"title": "Track", "webpage_url": "https://youtube.test/watch?v=abc"},
+                {"title": "Track", "webpage_url": "https://youtube.test/watch?v=abc"},
+            ]
+        }
     )
 
-    choices = await cog.play_query_autocomplete(SimpleNamespace(), "track")
+    choices = await cog.play_query_autocomplete(SimpleNamespace(guild_id=1, user=SimpleNamespace(id=42)), "track")
 
     assert [(choice.name, choice.value) for choice in choices] == [("Track", "https://youtube.test/watch?v=abc")]
 
@@ -491,12 +733,9 @@ async def test_play_query_autocomplete_returns_distinct_choices(monkeypatch):
 @pytest.mark.asyncio
 async def test_play_query_autocomplete_expands_video_id_to_url(monkeypatch):
     cog = MusicCog(_make_bot())
-    monkeypatch.setattr(
-        "functions.tool.music.get_running_loop",
-        lambda: DummyLoop({"entries": [{"title": "Track", "url": "abc123"}]}),
-    )
+    cog.engine.extractor.run = AsyncMock(return_value={"entries": [{"title": "Track", "url": "abc123"}]})
 
-    choices = await cog.play_query_autocomplete(SimpleNamespace(), "track")
+    choices = await cog.play_query_autocomplete(SimpleNamespace(guild_id=1, user=SimpleNamespace(id=42)), "track")
 
     assert [(choice.name, choice.value) for choice in choices] == [("Track", "https://www.youtube.com/watch?v=abc123")]
 
@@ -504,19 +743,16 @@ async def test_play_query_autocomplete_expands_video_id_to_url(monkeypatch):
 @pytest.mark.asyncio
 async def test_play_query_autocomplete_limits_to_five_choices(monkeypatch):
     cog = MusicCog(_make_bot())
-    monkeypatch.setattr(
-        "functions.tool.music.get_running_loop",
-        lambda: DummyLoop(
-            {
-                "entries": [
-                    {"title": f"Track {i}", "webpage_url": f"https://youtube.test/watch?v={i}"}
-                    for i in range(6)
-                ]
-            }
-        ),
+    cog.engine.extractor.run = AsyncMock(
+        return_value={
+            "entries": [
+                {"title": f"Track {i}", "webpage_url": f"https://youtube.test/watch?v={i}"}
+                for i in range(6)
+            ]
+        }
     )
 
-    choices = await cog.play_query_autocomplete(SimpleNamespace(), "track")
+    choices = await cog.play_query_autocomplete(SimpleNamespace(guild_id=1, user=SimpleNamespace(id=42)), "track")
 
     assert len(choices) == 5
 
@@ -547,7 +783,7 @@ async def test_search_query_autocomplete_returns_channel_choices():
     )
     cog = RadioCog(_make_bot(session=session))
 
-    choices = await cog.search_query_autocomplete(SimpleNamespace(), "flaix")
+    choices = await cog.search_query_autocomplete(SimpleNamespace(user=SimpleNamespace(id=42)), "flaix")
 
     assert [(choice.name, choice.value) for choice in choices] == [("Flaixbac (Barcelona, Spain)", "sFtKSe5I")]
 
@@ -578,7 +814,7 @@ async def test_search_query_autocomplete_limits_to_five_choices():
     )
     cog = RadioCog(_make_bot(session=session))
 
-    choices = await cog.search_query_autocomplete(SimpleNamespace(), "station")
+    choices = await cog.search_query_autocomplete(SimpleNamespace(user=SimpleNamespace(id=42)), "station")
 
     assert len(choices) == 5
 
@@ -596,7 +832,9 @@ async def test_pick_random_station_raises_when_no_places():
 async def test_enqueue_or_play_queues_when_playing():
     vc = DummyVoiceClient(connected=True, playing=True)
     cog = AudioEngine(_make_bot())
-    cog.voice_clients[1] = vc
+    session = cog.session(1)
+    session.voice_client = vc
+    session.state = PlaybackState.PLAYING
     followup = AsyncMock()
 
     await cog.enqueue_or_play(
@@ -608,7 +846,7 @@ async def test_enqueue_or_play_queues_when_playing():
         followup=followup,
     )
 
-    assert cog.queues[1][0].title == "Mataro Radio"
+    assert session.queue[0].title == "Mataro Radio"
     followup.assert_awaited_once()
 
 
@@ -616,8 +854,10 @@ async def test_enqueue_or_play_queues_when_playing():
 async def test_enqueue_or_play_rejects_when_queue_is_full():
     vc = DummyVoiceClient(connected=True, playing=True)
     cog = AudioEngine(_make_bot())
-    cog.voice_clients[1] = vc
-    cog.queues[1] = deque([QueueItem("u", "t", "d")] * 25)
+    session = cog.session(1)
+    session.voice_client = vc
+    session.queue = TrackQueue([QueueItem("u", "t", "d")] * 25)
+    await cog.settings.set_queue_limit(1, 25)
     followup = AsyncMock()
 
     await cog.enqueue_or_play(
@@ -633,14 +873,14 @@ async def test_enqueue_or_play_rejects_when_queue_is_full():
         ":x: Queue is full (25 items).",
         ephemeral=True,
     )
-    assert len(cog.queues[1]) == 25
+    assert len(session.queue) == 25
 
 
 @pytest.mark.asyncio
 async def test_queue_displays_queued_items():
     interaction = _make_interaction(user=object(), guild_id=1)
     cog = MusicCog(_make_bot())
-    cog.engine.queues[1] = deque([QueueItem("url", "Queued Track", "3:00")])
+    cog.engine.session(1).queue = TrackQueue([QueueItem("url", "Queued Track", "3:00")])
 
     await MusicCog.queue.callback(cog, interaction)
 
@@ -648,61 +888,1010 @@ async def test_queue_displays_queued_items():
     assert embed.description == "1. Queued Track [3:00]"
 
 
+@pytest.mark.asyncio
+async def test_queue_pages_through_large_queue():
+    interaction = _make_interaction(user=object(), guild_id=1)
+    cog = MusicCog(_make_bot())
+    cog.engine.session(1).queue = TrackQueue(QueueItem("url", f"Track {n}", "3:00") for n in range(1, 2501))
+
+    await MusicCog.queue.callback(cog, interaction, page=3)
+
+    embed = interaction.response.send_message.await_args.kwargs["embed"]
+    assert embed.description.splitlines()[0] == "21. Track 21 [3:00]"
+    assert len(embed.description.splitlines()) == 10
+    assert embed.footer.text == "Page 3/250 · 2500 tracks queued"
+
+
+def test_track_queue_supports_positional_and_bulk_operations():
+    queue = TrackQueue(range(10), block_size=2)
+
+    queue.append(10)
+    assert queue.popleft() == 0
+    assert queue[0] == 1 and queue[-1] == 10
+    assert queue[3:6] == [4, 5, 6]
+    assert queue.pop(4) == 5
+    assert queue.move(0, 5) == 1
+    queue.insert_many(2, ["a", "b"])
+
+    assert list(queue) == [2, 3, "a", "b", 4, 6, 7, 1, 8, 9, 10]
+    assert len(queue) == 11
+    with pytest.raises(IndexError):
+        queue.pop(11)
+
+    empty = TrackQueue(block_size=2)
+    empty.insert_many(-3, ["x"])
+    empty.insert_many(-1, ["w"])
+    assert list(empty) == ["w", "x"]
+
+
+@pytest.mark.asyncio
+async def test_music_settings_persist_queue_limit(tmp_path):
+    db_path = str(tmp_path / "data" / "sakamoto.sqlite")
+    settings = MusicSettings(db_path)
+    await settings.load()
+    await settings.set_queue_limit(1, 3000)
+
+    reloaded = MusicSettings(db_path)
+    await reloaded.load()
+
+    assert reloaded.queue_limit(1) == 3000
+    assert reloaded.queue_limit(2) == 1000
+
+
 @pytest.mark.asyncio
 async def test_disconnect_and_cleanup_clears_all_state():
     vc = DummyVoiceClient(connected=True, playing=True)
     cog = AudioEngine(_make_bot())
-    cog.voice_clients[1] = vc
-    cog.queues[1] = deque([QueueItem("u", "t", "d")])
-    cog.currently_playing[1] = ("u", "t", "d")
-    cog.command_channels[1] = object()
+    session = cog.session(1)
+    session.voice_client = vc
+    session.queue = TrackQueue([QueueItem("u", "t", "d")])
+    session.current = QueueItem("u", "t", "d")
+    session.command_channel = object()
 
     await cog.disconnect_and_cleanup(1)
 
     vc.stop.assert_called_once()
     vc.disconnect.assert_awaited_once()
-    assert cog.voice_clients == {}
-    assert cog.queues == {}
-    assert cog.currently_playing == {}
-    assert cog.command_channels == {}
+    assert cog.sessions == {}
+    assert session.closed is True
 
 
 @pytest.mark.asyncio
-async def test_play_next_pulls_from_queue(monkeypatch):
+async def test_session_checkpoint_survives_reload_and_restores_on_reconnect(tmp_path):
+    bot = SimpleNamespace(loop=asyncio.get_running_loop(), color=0, session=None, db_path=str(tmp_path / "data" / "sakamoto.sqlite"))
+    engine = AudioEngine(bot)
+    await engine.checkpoints.load()
+    resolver = AsyncMock(return_value=None)
+    engine.resolvers["track"] = resolver
+    session = engine.session(1)
+    session.voice_client = DummyVoiceClient(connected=True)
+    session.current = QueueItem(
+        "https://youtube.test/watch?v=a", "Now", "3:00", "https://stream.test/a", resolver, acodec="opus"
+    )
+    session.source = SimpleNamespace(elapsed=lambda: 83.5)
+    session.queue = TrackQueue(
+        [
+            QueueItem("https://youtube.test/watch?v=b", "Next", "4:00", refresh_stream=resolver, acodec="opus"),
+            QueueItem("https://radio.test/channel.mp3", "Radio", "LIVE", "https://stream.test/radio", acodec="mp3"),
+        ]
+    )
+
+    await engine.shutdown()
+    assert engine.sessions == {}
+
+    reloaded = AudioEngine(bot)
+    reloaded.resolvers["track"] = resolver
+    reloaded.play_next_track_and_announce = AsyncMock()
+    restored_session = reloaded.session(1)
+    restored_session.voice_client = DummyVoiceClient(connected=True)
+
+    assert await reloaded.restore_session(1) == 3
+    await _settle()
+
+    reloaded.play_next_track_and_announce.assert_awaited_once_with(
+        1, "https://youtube.test/watch?v=a", "Now", "3:00", None, resolver, "opus", 83.5
+    )
+    assert [(item.title, item.stream_url, item.refresh_stream, item.acodec) for item in restored_session.queue] == [
+        ("Next", None, resolver, "opus"),
+        ("Radio", "https://stream.test/radio", None, "mp3"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stop_clears_checkpoint(tmp_path):
+    engine = AudioEngine(SimpleNamespace(loop=None, db_path=str(tmp_path / "data" / "sakamoto.sqlite")))
+    await engine.checkpoints.load()
+    session = engine.session(1)
+    session.queue = TrackQueue([QueueItem("https://radio.test/channel.mp3", "Radio", "LIVE", "https://stream.test")])
+    engine.checkpoints.mark(1)
+    await engine.checkpoints.flush()
+    assert (await engine.checkpoints.restore(1)) is not None
+
+    # Deleted straight away, not on the next flush, so a /play right after /stop starts fresh.
+    await engine.disconnect_and_cleanup(1)
+
+    assert await engine.checkpoints.restore(1) is None
+
+
+@pytest.mark.asyncio
+async def test_playing_guilds_keep_their_checkpoint_offset_current(tmp_path):
+    engine = AudioEngine(SimpleNamespace(loop=None, db_path=str(tmp_path / "data" / "sakamoto.sqlite")))
+    engine.checkpoints.flush_interval = 0.01
+    await engine.checkpoints.load()
+    position = [10.0]
+    session = engine.session(1)
+    session.current = QueueItem("https://youtube.test/watch?v=a", "Mix", "2:00:00", "https://stream.test/a")
+    session.source = SimpleNamespace(elapsed=lambda: position[0])
+    session.queue = TrackQueue(QueueItem(f"https://youtube.test/watch?v={n}", f"Track {n}", "3:00") for n in range(1000))
+    session.state = PlaybackState.BUFFERING
+
+    engine._on_first_frame(session, 0.0)
+    await _flushed(engine.checkpoints, 1)
+    assert (await engine.checkpoints.restore(1)).offset == 10.0
+    full_write = engine.checkpoints.rows_written
+    assert full_write >= 1001
+
+    # Nothing about the queue changes, yet the stored offset follows playback, one row per flush.
+    position[0] = 3600.0
+    await _flushed(engine.checkpoints, engine.checkpoints.flushes + 2)
+    checkpoint = await engine.checkpoints.restore(1)
+    assert checkpoint.offset == 3600.0 and len(checkpoint.queue) == 1000
+    assert engine.checkpoints.rows_written - full_write < 20
+
+    await engine.disconnect_and_cleanup(1)
+    await asyncio.sleep(0.03)
+    assert await engine.checkpoints.restore(1) is None
+
+
+@pytest.mark.asyncio
+async def test_stale_checkpoints_are_dropped_instead_of_restored(tmp_path):
+    engine = AudioEngine(SimpleNamespace(loop=None, db_path=str(tmp_path / "data" / "sakamoto.sqlite")))
+    await engine.checkpoints.load()
+    session = engine.session(1)
+    session.queue = TrackQueue([QueueItem("https://radio.test/channel.mp3", "Radio", "LIVE", "https://stream.test")])
+    engine.checkpoints.mark(1)
+    await engine.checkpoints.flush()
+
+    max_age, engine.checkpoints.max_age = engine.checkpoints.max_age, -1.0
+    assert await engine.checkpoints.restore(1) is None
+    # The stale row was deleted, not just skipped.
+    engine.checkpoints.max_age = max_age
+    assert await engine.checkpoints.restore(1) is None
+
+
+@pytest.mark.asyncio
+async def test_music_cog_unload_waits_for_the_final_checkpoint():
+    cog = MusicCog(_make_bot())
+    cog.engine.shutdown = AsyncMock()
+
+    await cog.cog_unload()
+
+    cog.engine.shutdown.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_play_next_pulls_from_queue():
     cog = AudioEngine(_make_bot())
-    cog.voice_clients[1] = DummyVoiceClient(connected=True)
-    cog.queues[1] = deque([QueueItem("url", "title", "3:00")])
+    session = cog.session(1)
+    session.voice_client = DummyVoiceClient(connected=True)
+    session.queue = TrackQueue([QueueItem("url", "title", "3:00")])
     cog.play_next_track_and_announce = AsyncMock()
-    scheduled = []
 
-    def fake_run(coro, _loop):
-        scheduled.append(coro)
+    cog.play_next(1)
+    await asyncio.sleep(0)
+
+    cog.play_next_track_and_announce.assert_awaited_once_with(1, "url", "title", "3:00", None, None, None, 0.0)
+    assert len(session.queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_play_next_cleans_state_when_voice_disconnected():
+    cog = AudioEngine(_make_bot())
+    session = cog.session(1)
+    session.voice_client = DummyVoiceClient(connected=False)
+    session.queue = TrackQueue([QueueItem("u", "t", "d")])
+    session.current = QueueItem("u", "t", "d")
+    session.command_channel = object()
 
-    monkeypatch.setattr("functions.tool._audio_engine.run_coroutine_threadsafe", fake_run)
     cog.play_next(1)
-    await scheduled[0]
+    await asyncio.sleep(0)
 
-    cog.play_next_track_and_announce.assert_awaited_once_with(1, "url", "title", "3:00", None, None)
-    assert cog.queues[1] == deque()
+    assert cog.sessions == {}
 
 
 @pytest.mark.asyncio
-async def test_play_next_cleans_state_when_voice_disconnected(monkeypatch):
+async def test_after_callback_from_player_thread_is_marshalled_onto_loop(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
     cog = AudioEngine(_make_bot())
-    cog.voice_clients[1] = DummyVoiceClient(connected=False)
-    cog.queues[1] = deque([QueueItem("u", "t", "d")])
-    cog.currently_playing[1] = ("u", "t", "d")
-    cog.command_channels[1] = object()
-    scheduled = []
+    session = cog.session(1)
+    session.voice_client = vc
+    session.queue = TrackQueue([QueueItem("url", "Next", "3:00", "https://stream.test/next")])
+    cog.play_next_track_and_announce = AsyncMock()
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    await cog.play_song(1, "https://example.test/watch", "https://stream.test", "Track", "3:00")
 
-    def fake_run(coro, _loop):
-        scheduled.append(coro)
+    # The whole track was sent, so this is a natural end rather than a dropped stream.
+    session.source.frames = 9000
+    after = vc.play.call_args.kwargs["after"]
+    player = threading.Thread(target=after, args=(None,))
+    player.start()
+    player.join()
 
-    monkeypatch.setattr("functions.tool._audio_engine.run_coroutine_threadsafe", fake_run)
-    cog.play_next(1)
-    await scheduled[0]
+    assert len(session.queue) == 1
+    await _settle()
+    assert len(session.queue) == 0
+    cog.play_next_track_and_announce.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_after_callback_of_disconnected_session_is_ignored(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    cog = AudioEngine(_make_bot())
+    cog.session(1).voice_client = vc
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    await cog.play_song(1, "https://example.test/watch", "https://stream.test", "Track", "3:00")
+    after = vc.play.call_args.kwargs["after"]
+    await cog.disconnect_and_cleanup(1)
+
+    replacement = cog.session(1)
+    replacement.voice_client = DummyVoiceClient(connected=True)
+    replacement.queue = TrackQueue([QueueItem("url", "Next", "3:00")])
+    after(None)
+    await _settle()
+
+    assert len(replacement.queue) == 1
+
+
+@pytest.mark.asyncio
+async def test_playback_state_machine_lifecycle_records_transition_timings(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(_make_bot())
+    engine.idle_timeout = 0
+    session = engine.session(1)
+    session.voice_client = vc
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    refresh_stream = AsyncMock(return_value=ResolvedStream("https://stream.test"))
+
+    await engine.play_song(1, "https://example.test/watch", None, "Track", "3:00", refresh_stream)
+    assert session.state is PlaybackState.BUFFERING
+    vc.play.call_args.args[0].read()
+    await _settle()
+    assert session.state is PlaybackState.PLAYING
+
+    assert engine.resume(1) is False
+    assert engine.pause(1) is True
+    vc.pause.assert_called_once()
+    assert session.state is PlaybackState.PAUSED
+    assert engine.resume(1) is True
+    assert session.state is PlaybackState.PLAYING
+
+    session.source.frames = 9000
+    vc.play.call_args.kwargs["after"](None)
+    await _settle()
+
+    assert engine.sessions == {}
+    assert session.state is PlaybackState.IDLE
+    stats = engine.state_stats()
+    assert set(stats["transitions"]) == {
+        "idle->resolving",
+        "resolving->buffering",
+        "buffering->playing",
+        "playing->paused",
+        "paused->playing",
+        "playing->idle",
+    }
+    assert stats["event_lag"]["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_empty_queue_idles_connected_until_grace_period_expires(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(_make_bot())
+    engine.idle_timeout = 0.02
+    session = engine.session(1)
+    session.voice_client = vc
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+
+    await engine.play_song(1, "https://example.test/watch", "https://stream.test", "Track", "N/A")
+    engine.play_next(1)
+    await _settle()
+    assert engine.sessions[1] is session
+    assert session.state is PlaybackState.IDLE
+    assert engine.connection_stats()["idle"] == 1
+
+    # Playing again inside the grace period reuses the connection and cancels the disconnect.
+    await engine.play_song(1, "https://example.test/watch", "https://stream.test", "Again", "N/A")
+    await asyncio.sleep(0.03)
+    assert engine.sessions[1] is session
+    vc.disconnect.assert_not_awaited()
+
+    engine.play_next(1)
+    await asyncio.sleep(0.03)
+    await _settle()
+    assert engine.sessions == {}
+    vc.disconnect.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_dropped_voice_connection_rejoins_and_resumes_queue(monkeypatch):
+    channel = SimpleNamespace()
+    old = DummyVoiceClient(connected=False, channel=channel)
+    new = DummyVoiceClient(connected=True, channel=channel)
+    channel.connect = AsyncMock(return_value=new)
+    engine = AudioEngine(_make_bot())
+    engine.reconnect_timeout = 0
+    session = engine.session(1)
+    session.voice_client = old
+    session.queue = TrackQueue([QueueItem("url", "Next", "3:00", "https://stream.test/next")])
+    engine.play_next_track_and_announce = AsyncMock()
+
+    engine.play_next(1)
+    await _settle()
+
+    channel.connect.assert_awaited_once_with(self_deaf=True)
+    old.disconnect.assert_awaited_once_with(force=True)
+    assert engine.sessions[1].voice_client is new
+    engine.play_next_track_and_announce.assert_awaited_once()
+    stats = engine.connection_stats()
+    assert (stats["lost"], stats["reconnected"], stats["latency"]["reconnect"]["count"]) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_rejoin_ignores_the_bots_own_leave_event():
+    channel = SimpleNamespace()
+    old = DummyVoiceClient(connected=False, channel=channel)
+    new = DummyVoiceClient(connected=True, channel=channel)
+    channel.connect = AsyncMock(return_value=new)
+    bot = _make_bot()
+    bot.user = SimpleNamespace(id=99)
+    engine = AudioEngine(bot)
+    engine.reconnect_timeout = 0
+    me = SimpleNamespace(id=99, bot=True, guild=SimpleNamespace(id=1))
+
+    async def disconnect(*, force=False):
+        # discord.py dispatches the bot's own VOICE_STATE_UPDATE (channel=None) before returning.
+        await engine.handle_voice_state_update(me, SimpleNamespace(channel=channel), SimpleNamespace(channel=None))
+
+    old.disconnect = AsyncMock(side_effect=disconnect)
+    session = engine.session(1)
+    session.voice_client = old
+    session.queue = TrackQueue([QueueItem("url", "Next", "3:00", "https://stream.test/next")])
+    engine.play_next_track_and_announce = AsyncMock()
+
+    engine.play_next(1)
+    await _settle()
+
+    assert engine.sessions[1] is session
+    assert session.voice_client is new
+    engine.play_next_track_and_announce.assert_awaited_once()
+
+    # Outside a rejoin the same event still means the bot was disconnected on purpose.
+    await engine.handle_voice_state_update(me, SimpleNamespace(channel=channel), SimpleNamespace(channel=None))
+    assert engine.sessions == {}
+
+
+@pytest.mark.asyncio
+async def test_voice_lost_while_resolving_resumes_after_rejoin():
+    channel = SimpleNamespace()
+    old = DummyVoiceClient(connected=False, channel=channel)
+    new = DummyVoiceClient(connected=True, channel=channel)
+    channel.connect = AsyncMock(return_value=new)
+    engine = AudioEngine(_make_bot())
+    engine.reconnect_timeout = 0
+    session = engine.session(1)
+    session.voice_client = old
+    engine.play_next_track_and_announce = AsyncMock()
+
+    # A recovery re-resolves the stream, and voice is found dropped right after.
+    refresh = AsyncMock(return_value=ResolvedStream("https://stream.test/fresh"))
+    assert not await engine.play_song(1, "url", None, "Track", "3:00", refresh_stream=refresh, start_at=42.0)
+    await _settle()
+
+    assert session.voice_client is new
+    engine.play_next_track_and_announce.assert_awaited_once()
+    assert engine.play_next_track_and_announce.await_args.args[-1] == 42.0
+    assert not session.queue
+
+
+class DummyYoutubeDL:
+    instances: list["DummyYoutubeDL"] = []
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.closed = False
+        DummyYoutubeDL.instances.append(self)
+
+    def extract_info(self, url, download=False):
+        return {"url": url, "extract_flat": self.opts.get("extract_flat")}
+
+    def close(self):
+        self.closed = True
+
+
+def test_extractor_pool_reuses_instances(monkeypatch):
+    DummyYoutubeDL.instances = []
+    monkeypatch.setattr("functions.tool._extractor_pool.YoutubeDL", DummyYoutubeDL)
+    pool = ExtractorPool({"extract_flat": True}, size=2)
+
+    for _ in range(5):
+        assert pool.extract_info("ytsearch5:track") == {"url": "ytsearch5:track", "extract_flat": True}
+
+    assert len(DummyYoutubeDL.instances) == 1
+    pool.close()
+    assert DummyYoutubeDL.instances[0].closed is True
+
+
+def test_music_cog_uses_separate_search_and_extract_pools(monkeypatch):
+    monkeypatch.setattr("functions.tool._extractor_pool.YoutubeDL", DummyYoutubeDL)
+    bot = _make_bot()
+    cog = MusicCog(bot)
+
+    assert cog.search_source("https://youtube.test/watch?v=abc")["extract_flat"] is False
+    assert cog.search_source_autocomplete("track")["extract_flat"] is True
+    assert MusicCog(bot).extract_pool is cog.extract_pool
+
+
+@pytest.mark.asyncio
+async def test_extraction_scheduler_runs_playback_before_autocomplete():
+    scheduler = ExtractionScheduler(max_workers=1)
+    order: list[str] = []
+    gate = threading.Event()
+
+    def work(label):
+        if label == "blocker":
+            gate.wait(timeout=5)
+        order.append(label)
+        return label
+
+    blocker = asyncio.ensure_future(scheduler.run(work, "blocker", priority=Priority.PLAY, guild_id=1))
+    await asyncio.sleep(0)
+    autocomplete = asyncio.ensure_future(scheduler.run(work, "autocomplete", priority=Priority.AUTOCOMPLETE, guild_id=2))
+    playback = asyncio.ensure_future(scheduler.run(work, "playback", priority=Priority.PLAYBACK))
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth() == {"playback": 1, "play": 0, "autocomplete": 1}
+
+    gate.set()
+    await asyncio.gather(blocker, autocomplete, playback)
+
+    assert order == ["blocker", "playback", "autocomplete"]
+    scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_extraction_scheduler_caps_concurrency_per_guild():
+    scheduler = ExtractionScheduler(max_workers=4, per_guild_limit=1)
+    gate = threading.Event()
+    blocker = asyncio.ensure_future(scheduler.run(gate.wait, 5, guild_id=1))
+    same_guild = asyncio.ensure_future(scheduler.run(lambda: "same", guild_id=1))
+    other_guild = asyncio.ensure_future(scheduler.run(lambda: "other", guild_id=2))
+
+    assert await other_guild == "other"
+    assert not same_guild.done()
+    assert scheduler.queue_depth()["play"] == 1
+
+    gate.set()
+    assert await same_guild == "same"
+    await blocker
+    scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_extraction_scheduler_keeps_a_worker_for_playback_under_playlist_imports():
+    scheduler = ExtractionScheduler(max_workers=4)
+    gate = threading.Event()
+    imports = [asyncio.ensure_future(scheduler.run(gate.wait, 5, guild_id=guild_id)) for guild_id in range(5)]
+    await asyncio.sleep(0)
+    assert scheduler.stats()["running"] == 3
+    assert scheduler.queue_depth()["play"] == 2
+
+    playback = scheduler.run(lambda: "refreshed", priority=Priority.PLAYBACK, guild_id=9)
+    assert await asyncio.wait_for(playback, timeout=1) == "refreshed"
+
+    gate.set()
+    await asyncio.gather(*imports)
+    scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_debouncer_cancels_superseded_search():
+    debouncer = AutocompleteDebouncer(delay=0.05)
+    fetch = AsyncMock(side_effect=lambda q: [app_commands.Choice(name=q, value=q)])
+
+    first = asyncio.ensure_future(debouncer.complete(42, "nev", fetch))
+    await asyncio.sleep(0)
+    second = await debouncer.complete(42, "never", fetch)
+
+    assert await first == []
+    assert [choice.value for choice in second] == ["never"]
+    fetch.assert_awaited_once_with("never")
+    assert debouncer.stats() == {"upstream_searches": 1, "searches_saved": 1}
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_debouncer_answers_prefix_extension_from_previous_results():
+    debouncer = AutocompleteDebouncer(delay=0)
+    results = [
+        app_commands.Choice(name="Never Gonna Give You Up", value="a"),
+        app_commands.Choice(name="Never Enough", value="b"),
+    ]
+    fetch = AsyncMock(return_value=results)
+
+    await debouncer.complete(42, "never", fetch)
+    narrowed = await debouncer.complete(42, "never gon", fetch)
+
+    assert [choice.value for choice in narrowed] == ["a"]
+    fetch.assert_awaited_once()
+    assert debouncer.searches_saved == 1
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expires_negative_entries(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("functions.tool._cache.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=60, negative_ttl=5)
+
+    cache.set("a", ["A"])
+    cache.set("b", [])
+    assert cache.get("a") == ["A"]
+    cache.set("c", ["C"])
+    assert cache.get("b", None) is None
+    assert cache.evictions == 1
+
+    cache.set("b", [])
+    now[0] = 10.0
+    assert cache.get("b", None) is None
+    assert cache.get("c") == ["C"]
+    assert cache.stats() == {"size": 1, "hits": 2, "misses": 2, "evictions": 2, "expirations": 1}
+
+
+@pytest.mark.asyncio
+async def test_play_and_radio_autocomplete_share_suggestion_cache_per_namespace():
+    bot = _make_bot()
+    music = MusicCog(bot)
+    music.autocomplete.delay = 0
+    music.search_play_choices = AsyncMock(return_value=[app_commands.Choice(name="Track", value="abc")])
+    radio = RadioCog(bot)
+
+    first = await music.play_query_autocomplete(SimpleNamespace(guild_id=1, user=SimpleNamespace(id=1)), "Track ")
+    second = await music.play_query_autocomplete(SimpleNamespace(guild_id=2, user=SimpleNamespace(id=2)), "track")
+
+    assert first == second
+    music.search_play_choices.assert_awaited_once()
+    assert radio.autocomplete.cache is music.autocomplete.cache
+    assert radio.autocomplete.cache.get(("radio", "track"), None) is None
+
+
+@pytest.mark.parametrize(
+    "stream_url, expected",
+    [
+        ("https://rr1.googlevideo.test/videoplayback?expire=1700000000&itag=251", 1700000000.0),
+        ("https://manifest.googlevideo.test/api/manifest/hls/expire/1700000500/id/abc", 1700000500.0),
+        ("https://stream.test/live", None),
+        (None, None),
+    ],
+)
+def test_stream_expiry(stream_url, expected):
+    assert stream_expiry(stream_url) == expected
+
+
+@pytest.mark.asyncio
+async def test_track_cache_persists_and_skips_extraction_until_near_expiry(monkeypatch, tmp_path):
+    now = [1_000_000.0]
+    monkeypatch.setattr("functions.tool._track_cache.time", lambda: now[0])
+    db_path = str(tmp_path / "data" / "sakamoto.sqlite")
+    cache = TrackCache(db_path, refresh_margin=300)
+    await cache.load()
+    stream_url = "https://rr1.googlevideo.test/videoplayback?expire=1003600"
+    await cache.store("https://youtube.test/watch?v=abc", "Track", "3:00", stream_url)
+
+    restored = TrackCache(db_path, refresh_margin=300)
+    await restored.load()
+    assert restored.fresh("https://youtube.test/watch?v=abc").stream_url == stream_url
+
+    now[0] = 1003400.0
+    assert restored.fresh("https://youtube.test/watch?v=abc") is None
+    assert restored.get("https://youtube.test/watch?v=abc").title == "Track"
+
+
+@pytest.mark.asyncio
+async def test_track_cache_prunes_old_rows_and_deletes_invalidated_ones(monkeypatch, tmp_path):
+    now = [1_000_000.0]
+    monkeypatch.setattr("functions.tool._track_cache.time", lambda: now[0])
+    db_path = str(tmp_path / "data" / "sakamoto.sqlite")
+    cache = TrackCache(db_path, maxsize=2, prune_every=1)
+    await cache.load()
+    for n in range(3):
+        now[0] += 1
+        await cache.store(f"https://youtube.test/watch?v={n}", f"Track {n}", "3:00", f"https://stream.test/{n}?expire=1003600")
+
+    cache.invalidate("https://youtube.test/watch?v=2")
+    await asyncio.gather(*cache._tasks)
+
+    # The oldest row went over maxsize and the invalidated one is gone from SQLite too.
+    restored = TrackCache(db_path, maxsize=10)
+    await restored.load()
+    assert restored.get("https://youtube.test/watch?v=0") is None
+    assert restored.get("https://youtube.test/watch?v=1").stream_url == "https://stream.test/1?expire=1003600"
+    assert restored.get("https://youtube.test/watch?v=2") is None
+
+    # Expired signed URLs are dropped on load, and rows past max_age are deleted.
+    now[0] = 1_004_000.0
+    expired = TrackCache(db_path)
+    await expired.load()
+    assert expired.get("https://youtube.test/watch?v=1").stream_url is None
+    now[0] += 31 * 86400
+    aged = TrackCache(db_path)
+    await aged.load()
+    assert aged.get("https://youtube.test/watch?v=1") is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_stream_url_uses_cached_track_without_extraction():
+    cog = MusicCog(_make_bot())
+    cog.engine.extractor.run = AsyncMock()
+    cog.track_cache.fresh = MagicMock(
+        return_value=SimpleNamespace(stream_url="https://stream.test/cached", acodec="opus")
+    )
+
+    assert await cog.refresh_stream_url("https://youtube.test/watch?v=abc") == ("https://stream.test/cached", "opus")
+    cog.engine.extractor.run.assert_not_awaited()
+
+
+def test_playlist_item_keeps_entry_codec():
+    cog = MusicCog(_make_bot())
+
+    item = cog.playlist_item({"url": "https://youtube.test/watch?v=abc", "title": "Track", "duration": 65, "acodec": "opus"})
+
+    assert (item.title, item.duration, item.acodec) == ("Track", "1:05", "opus")
+
+
+@pytest.mark.asyncio
+async def test_enqueue_prefetches_stream_url_for_queue_head():
+    vc = DummyVoiceClient(connected=True, playing=True)
+    engine = AudioEngine(_make_bot())
+    engine.session(1).voice_client = vc
+    engine.sessions[1].state = PlaybackState.PLAYING
+    refresh_stream = AsyncMock(return_value=ResolvedStream("https://stream.test/next"))
+
+    await engine.enqueue_or_play(
+        1,
+        source_url="https://youtube.test/watch?v=abc",
+        title="Track",
+        duration="3:00",
+        stream_url=None,
+        followup=AsyncMock(),
+        refresh_stream=refresh_stream,
+    )
+    session = engine.sessions[1]
+    await session.prefetch_task
+
+    refresh_stream.assert_awaited_once_with("https://youtube.test/watch?v=abc")
+    assert session.queue[0].stream_url == "https://stream.test/next"
+    assert session.queue[0].needs_prefetch() is False
+    assert session.prefetch_task is None
+
+
+@pytest.mark.asyncio
+async def test_play_song_re_resolves_expired_prefetched_stream(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(_make_bot())
+    engine.session(1).voice_client = vc
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    refresh_stream = AsyncMock(return_value=ResolvedStream("https://stream.test/fresh", "mp4a.40.2"))
+
+    started = await engine.play_song(
+        1, "https://youtube.test/watch?v=abc", "https://stream.test/old?expire=1000", "Track", "3:00", refresh_stream, "opus"
+    )
+
+    assert started is True
+    assert vc.play.call_args.args[0].original.stream_url == "https://stream.test/fresh"
+    # The codec follows the refreshed URL, so the new format is not passed through as Opus.
+    assert engine.sessions[1].current.acodec == "mp4a.40.2"
+    assert isinstance(vc.play.call_args.args[0].original, DummyAudio)
+
+
+@pytest.mark.asyncio
+async def test_prewarmed_source_is_handed_to_voice_client_and_gap_recorded(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(_make_bot())
+    session = engine.session(1)
+    session.voice_client = vc
+    engine.prewarm_enabled = True
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    item = QueueItem("https://youtube.test/watch?v=next", "Next", "3:00", "https://stream.test/next")
+    session.queue = TrackQueue([item])
+
+    engine._start_prewarm(1)
+    await session.prewarm_task
+    warmed = session.prewarmed[1]
+    assert warmed.original.frames == []
+
+    session.queue.popleft()
+    session.track_ended_at = 0.0
+    started = await engine.play_song(1, item.source_url, item.stream_url, item.title, item.duration)
+
+    source = vc.play.call_args.args[0]
+    assert started is True
+    assert source is warmed
+    assert source.read() == PCM_FRAME
+    await _settle()
+    assert engine.transition_gap_stats(1)["samples"] == 1
+    session.prewarm_handle.cancel()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("start_at, expected_delay", [(0.0, 165.0), (100.0, 65.0), (170.0, 0.0)])
+async def test_prewarm_is_timed_from_the_seek_position(monkeypatch, start_at, expected_delay):
+    engine = AudioEngine(_make_bot())
+    engine.prewarm_enabled = True
+    session = engine.session(1)
+    session.voice_client = DummyVoiceClient(connected=True)
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    loop = asyncio.get_running_loop()
+
+    # /seek, a restored checkpoint and a recovery all restart the track through play_song with start_at.
+    await engine.play_song(1, "https://youtube.test/watch?v=a", "https://stream.test/a", "Track", "3:00", start_at=start_at)
+
+    assert session.prewarm_handle.when() - loop.time() == pytest.approx(expected_delay, abs=0.5)
+    session.prewarm_handle.cancel()
+
+
+@pytest.mark.asyncio
+async def test_seek_restarts_current_track_with_input_seek(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(_make_bot())
+    session = engine.session(1)
+    session.voice_client = vc
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    await engine.play_song(1, "https://www.youtube.com/watch?v=abc", "https://stream.test", "Mix", "2:00:00")
+    first = vc.play.call_args.args[0]
+    first.read()
+    first.read()
+    assert session.elapsed() == pytest.approx(0.04)
+
+    assert engine.seek(1, 7200) is False
+    assert engine.seek(1, 3723.5) is True
+    vc.stop.assert_called_once()
+    vc.play.call_args.kwargs["after"](None)
+    await _settle()
+
+    resumed = vc.play.call_args.args[0]
+    assert resumed is not first
+    assert resumed.original.kwargs["before_options"].endswith(" -ss 3723.50")
+    assert session.elapsed() == pytest.approx(3723.5)
+    resumed.read()
+    assert session.elapsed() == pytest.approx(3723.52)
+    assert len(session.queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_cut_off_mid_track_resumes_from_last_position(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(_make_bot())
+    engine.recovery_backoff = 0
+    session = engine.session(1)
+    session.voice_client = vc
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    refresh_stream = AsyncMock(side_effect=[ResolvedStream("https://stream.test/old"), ResolvedStream("https://stream.test/new")])
+    await engine.play_song(1, "https://www.youtube.com/watch?v=abc", None, "Mix", "1:00:00", refresh_stream)
+    first = vc.play.call_args.args[0]
+    first.read()
+    session.source.frames = 60_000
+
+    # The expired URL makes FFmpeg stop 20 minutes into an hour-long track.
+    vc.play.call_args.kwargs["after"](None)
+    await _settle()
+    await asyncio.sleep(0.01)
+    await _settle()
+
+    assert refresh_stream.await_count == 2
+    resumed = vc.play.call_args.args[0]
+    assert resumed.original.stream_url == "https://stream.test/new"
+    assert resumed.original.kwargs["before_options"].endswith(" -ss 1200.00")
+    resumed.read()
+    await _settle()
+    assert session.state is PlaybackState.PLAYING
+    assert engine.recoveries == {"attempts": 1, "recovered": 1, "dropped": 0}
+
+    # Skipping stops the player on purpose, which is not a failure.
+    engine.skip(1)
+    vc.play.call_args.kwargs["after"](None)
+    await _settle()
+    assert engine.recoveries["attempts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_failures_are_dropped_after_bounded_retries(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(_make_bot())
+    engine.recovery_backoff = 0
+    engine.max_recoveries = 2
+    session = engine.session(1)
+    session.voice_client = vc
+    session.queue = TrackQueue([QueueItem("url", "Next", "3:00", "https://stream.test/next")])
+    engine.play_next_track_and_announce = AsyncMock()
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    await engine.play_song(1, "https://example.test/watch", "https://stream.test", "Track", "3:00")
+
+    for _ in range(3):
+        vc.play.call_args.kwargs["after"](RuntimeError("403 Forbidden"))
+        await _settle()
+        await asyncio.sleep(0.01)
+        await _settle()
+
+    assert vc.play.call_count == 3
+    assert engine.recoveries == {"attempts": 2, "recovered": 0, "dropped": 1}
+    engine.play_next_track_and_announce.assert_awaited_once()
+    assert len(session.queue) == 0
+
+
+def test_parse_duration():
+    assert parse_duration("1:02:03") == 3723.0
+    assert parse_duration("3:00") == 180.0
+    assert parse_duration("LIVE") is None
+
+
+@pytest.mark.parametrize("acodec, expected", [("opus", "opus"), ("mp4a.40.2", "pcm"), (None, "pcm")])
+def test_create_source_uses_opus_passthrough_for_opus_streams(monkeypatch, acodec, expected):
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    monkeypatch.setattr(
+        "functions.tool._audio_engine.FFmpegOpusAudio",
+        lambda stream_url, **kwargs: SimpleNamespace(
+            stream_url=stream_url, kwargs=kwargs, cleanup=lambda: None, is_opus=lambda: True
+        ),
+    )
+    engine = AudioEngine(_make_bot())
+
+    source = engine.create_source(1, "https://stream.test", acodec)
+
+    kind = "pcm" if isinstance(source.original, DummyAudio) else "opus"
+    assert kind == expected
+    if kind == "opus":
+        assert source.original.kwargs["codec"] == "copy"
+        assert source.set_volume(0.5) is False
+
+
+@pytest.mark.asyncio
+async def test_measured_gain_and_volume_apply_without_restarting_ffmpeg(monkeypatch, tmp_path):
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+    measure = MagicMock(return_value={"integrated": -9.0, "true_peak": 0.5})
+    monkeypatch.setattr("functions.tool._loudness.measure_loudness", measure)
+    bot = _make_bot()
+    bot.db_path = str(tmp_path / "sakamoto.db")
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(bot)
+    await engine.loudness.load()
+    session = engine.session(1)
+    session.voice_client = vc
+    url = "https://www.youtube.com/watch?v=loud"
+
+    # First play: no filter yet, the track is measured in the background.
+    await engine.play_song(1, url, "https://stream.test", "Loud", "3:00")
+    await asyncio.gather(*engine.loudness._tasks)
+    assert "-af" not in vc.play.call_args.args[0].original.kwargs["options"]
+    assert measure.call_count == 1
+    assert engine.loudness.gains[url] == -7.0
+
+    # Later plays (here after a reload from SQLite) use the cached gain, even for Opus tracks.
+    engine.loudness.gains.clear()
+    engine.loudness._loaded = False
+    await engine.loudness.load()
+    await engine.play_song(1, url, "https://stream.test", "Loud", "3:00", acodec="opus")
+    source = vc.play.call_args.args[0]
+    assert source.original.kwargs["options"].endswith(" -af volume=-7.00dB")
+    assert measure.call_count == 1
+
+    assert engine.set_volume(1, 0.5) is True
+    assert source.volume.volume == 0.5
+    vc.stop.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_loudness_backlog_is_bounded_and_skips_stale_urls(monkeypatch, tmp_path):
+    measured: list[str] = []
+
+    def measure(stream_url, before_options=""):
+        measured.append(stream_url)
+        if "broken" in stream_url:
+            raise RuntimeError("no audio")
+        return {"integrated": -20.0, "true_peak": -6.0}
+
+    monkeypatch.setattr("functions.tool._loudness.measure_loudness", measure)
+    cache = LoudnessCache(str(tmp_path / "sakamoto.db"), max_pending=3)
+    await cache.load()
+    expiring = f"https://rr1.googlevideo.test/videoplayback?expire={int(time.time()) + 60}"
+
+    # Queued synchronously, before the worker gets to run: the oldest track is dropped past max_pending.
+    for name, stream_url in [
+        ("dropped", "https://stream.test/dropped"),
+        ("expiring", expiring),
+        ("broken", "https://stream.test/broken"),
+        ("ok", "https://stream.test/ok"),
+    ]:
+        cache.analyse(f"https://youtube.test/watch?v={name}", stream_url)
+    await asyncio.gather(*cache._tasks)
+
+    assert measured == ["https://stream.test/broken", "https://stream.test/ok"]
+    assert set(cache.gains) == {"https://youtube.test/watch?v=ok"}
+    assert (cache.dropped, cache.skipped, cache.failed) == (1, 1, 1)
+
+    # Failures are remembered for a while; dropped and skipped tracks are simply queued again.
+    cache.analyse("https://youtube.test/watch?v=broken", "https://stream.test/broken")
+    cache.analyse("https://youtube.test/watch?v=dropped", "https://stream.test/dropped")
+    await asyncio.gather(*cache._tasks)
+    assert measured[2:] == ["https://stream.test/dropped"]
+
+
+@pytest.mark.parametrize(
+    "source_url, duration, expected",
+    [
+        ("https://www.youtube.com/watch?v=abc", "3:00", "youtube"),
+        ("https://youtu.be/abc", "3:00", "youtube"),
+        ("https://radio.garden/api/ara/content/listen/sFtKSe5I/channel.mp3", "LIVE", "live"),
+        ("https://soundcloud.test/track", "3:00", "generic"),
+    ],
+)
+def test_source_profile(source_url, duration, expected):
+    assert source_profile(source_url, duration) == expected
+
+
+@pytest.mark.asyncio
+async def test_play_song_uses_profile_for_source_type(monkeypatch):
+    vc = DummyVoiceClient(connected=True)
+    engine = AudioEngine(_make_bot())
+    engine.session(1).voice_client = vc
+    monkeypatch.setattr("functions.tool._audio_engine.FFmpegPCMAudio", DummyAudio)
+
+    await engine.play_song(1, "https://www.youtube.com/watch?v=abc", "https://stream.test", "Track", "3:00")
+
+    assert vc.play.call_args.args[0].original.kwargs == engine.ffmpeg_profiles["youtube"]
+
+
+class DummyLiveSource:
+    def __init__(self):
+        self.frames = Queue()
+        self.cleaned_up = threading.Event()
+
+    def read(self):
+        while not self.cleaned_up.is_set():
+            try:
+                return self.frames.get(timeout=0.05)
+            except Empty:
+                continue
+        return b""
+
+    def cleanup(self):
+        self.cleaned_up.set()
+
+
+def test_broadcast_hub_shares_one_source_per_station_and_tears_down_with_last_listener():
+    sources: list[DummyLiveSource] = []
+
+    def factory(_stream_url):
+        sources.append(DummyLiveSource())
+        return sources[-1]
+
+    hub = BroadcastHub(factory)
+    first = hub.listen("station", "https://stream.test/a", 1)
+    second = hub.listen("station", "https://stream.test/b", 2)
+    sources[0].frames.put(b"opus")
+
+    assert len(sources) == 1
+    assert first.read() == b"opus"
+    assert second.read() == b"opus"
+    assert hub.stats() == {"station": 2}
+
+    first.cleanup()
+    assert not sources[0].cleaned_up.is_set()
+    second.cleanup()
+    assert sources[0].cleaned_up.wait(timeout=1)
+    assert hub.stats() == {}
+
+
+def test_live_tracks_play_through_shared_broadcast():
+    engine = AudioEngine(_make_bot())
+    engine.broadcasts.listen = MagicMock()
+
+    source = engine.source_for(1, "https://radio.garden/api/listen/abc/channel.mp3", "https://stream.test", "LIVE", None)
 
-    assert cog.voice_clients == {}
-    assert cog.queues == {}
-    assert cog.currently_playing == {}
-    assert cog.command_channels == {}
+    assert source.original is engine.broadcasts.listen.return_value
+    engine.broadcasts.listen.assert_called_once_with("https://radio.garden/api/listen/abc/channel.mp3", "https://stream.test", 1)
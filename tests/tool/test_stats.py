@@ -0,0 +1,52 @@
+from pathlib import Path
+from types import SimpleNamespace
+import sys
+from unittest.mock import AsyncMock
+
+import pytest
+from discord import app_commands
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from functions.system.stats import StatsCog, format_stats, is_bot_owner
+from functions.tool._audio_engine import get_audio_engine
+
+
+def test_format_stats_renders_nested_and_float_values():
+    assert format_stats({"hits": 3, "avg_ms": 12.345, "queued": {"high": 0, "low": 2}, "empty": {}}) == (
+        "hits=3 avg_ms=12.3 queued={high=0 low=2} empty=-"
+    )
+
+
+@pytest.mark.asyncio
+async def test_stats_embed_surfaces_engine_cache_and_http_metrics():
+    autocomplete = SimpleNamespace(stats=lambda: {"upstream_searches": 4, "searches_saved": 9})
+    music = SimpleNamespace(autocomplete=autocomplete)
+    bot = SimpleNamespace(loop=None, color=0x123456, session=None, get_cog={"MusicCog": music}.get)
+    session = get_audio_engine(bot).session(1)
+    session.transition_gaps.extend([0.02, 0.04])
+    interaction = SimpleNamespace(guild_id=1, response=SimpleNamespace(send_message=AsyncMock()))
+
+    await StatsCog.stats.callback(StatsCog(bot), interaction)
+
+    embed = interaction.response.send_message.await_args.kwargs["embed"]
+    fields = {field.name: field.value for field in embed.fields}
+    assert list(fields) == ["Playback", "Voice", "Extraction", "Autocomplete", "Caches", "HTTP"]
+    assert "transition gap here samples=2 last_ms=40.0 avg_ms=30.0" in fields["Playback"]
+    assert fields["Autocomplete"] == "MusicCog upstream_searches=4 searches_saved=9"
+    assert "suggestions size=0" in fields["Caches"]
+    assert fields["HTTP"] == "-"
+    assert interaction.response.send_message.await_args.kwargs["ephemeral"] is True
+
+
+@pytest.mark.asyncio
+async def test_stats_is_limited_to_the_bot_owner():
+    client = SimpleNamespace(is_owner=AsyncMock(side_effect=lambda user: user.id == 1))
+
+    assert await is_bot_owner(SimpleNamespace(client=client, user=SimpleNamespace(id=1)))
+    assert not await is_bot_owner(SimpleNamespace(client=client, user=SimpleNamespace(id=2)))
+    assert is_bot_owner in StatsCog.stats.checks
+
+    interaction = SimpleNamespace(response=SimpleNamespace(send_message=AsyncMock()))
+    await StatsCog.on_stats_error(StatsCog(SimpleNamespace()), interaction, app_commands.CheckFailure())
+    assert interaction.response.send_message.await_args.args[0] == ":x: Only the bot owner can view the bot's stats."
@@ -3,6 +3,7 @@ from types import SimpleNamespace
 import sys
 from unittest.mock import AsyncMock
 
+from aiohttp import ClientConnectionError
 import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
@@ -305,3 +306,22 @@ async def test_get_lobby_success_sends_embed_with_redirect_url(monkeypatch, tmp_
     embed = interaction.followup.send.await_args.kwargs["embed"]
     assert "Steam Lobby Invite for user-44" == embed.title
     assert "steam://joinlobby/570/1234567890/76561198000000044" in embed.fields[0].value
+
+
+@pytest.mark.asyncio
+async def test_resolve_steam_id_retries_transient_failures(monkeypatch, tmp_path):
+    monkeypatch.setattr("functions.tool.steam.STEAM_TOKEN", "token")
+    session = DummySession(
+        [
+            ClientConnectionError("reset"),
+            DummyResponse(503, {}),
+            DummyResponse(200, {"response": {"success": 1, "steamid": "76561198000000123"}}),
+        ]
+    )
+    cog = SteamCog(DummyBot(db_path=tmp_path / "steam.db", session=session))
+    cog.http.backoff = 0
+
+    assert await cog._resolve_steam_id("my-vanity-name") == ("76561198000000123", None)
+    assert len(session.calls) == 3
+    stats = cog.http.stats()["api.steampowered.com"]
+    assert (stats["requests"], stats["errors"], stats["retries"]) == (3, 2, 2)